@@ -0,0 +1,71 @@
+# benchmarks/bench_alerts.py
+"""
+Проверка оповещений на потоке тиков: отсортированный индекс AlertEngine
+против линейного прохода по всем оповещениям.
+
+Запуск: python -m benchmarks.bench_alerts --alerts 1000000 --ticks 200000
+"""
+import argparse
+import random
+import time
+from config import SUPPORTED_CRYPTOS
+from services.alert_service import AlertEngine, ABOVE, BELOW
+
+START_PRICE = 50_000.0
+
+def populate(engine, count, cryptos):
+    random.seed(1)
+    for i in range(count):
+        threshold = START_PRICE * random.uniform(0.5, 1.5)
+        direction = ABOVE if threshold > START_PRICE else BELOW
+        engine.add(i, random.choice(cryptos), threshold, direction)
+
+def tick_stream(count, cryptos):
+    """Случайное блуждание цены, ~0.01% за тик"""
+    prices = {crypto: START_PRICE for crypto in cryptos}
+    for _ in range(count):
+        crypto = random.choice(cryptos)
+        prices[crypto] *= 1 + random.gauss(0, 0.0001)
+        yield crypto, prices[crypto]
+
+def linear_check(alerts, crypto, price):
+    fired = [a for a in alerts.values() if a.crypto == crypto and
+             (price >= a.threshold if a.direction == ABOVE else price <= a.threshold)]
+    for alert in fired:
+        del alerts[alert.alert_id]
+    return fired
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alerts", type=int, default=1_000_000)
+    parser.add_argument("--ticks", type=int, default=200_000)
+    parser.add_argument("--linear-ticks", type=int, default=20, help="тиков для линейного прохода (он медленный)")
+    args = parser.parse_args()
+    cryptos = list(SUPPORTED_CRYPTOS)
+
+    engine = AlertEngine()
+    started = time.perf_counter()
+    populate(engine, args.alerts, cryptos)
+    for crypto in cryptos:
+        engine.check(crypto, START_PRICE)  # первая проверка досортировывает индекс
+    print(f"{args.alerts:,} alerts indexed in {time.perf_counter() - started:.1f}s")
+
+    random.seed(2)
+    fired = 0
+    started = time.perf_counter()
+    for crypto, price in tick_stream(args.ticks, cryptos):
+        fired += len(engine.check(crypto, price))
+    elapsed = time.perf_counter() - started
+    print(f"sorted index: {args.ticks / elapsed:12,.0f} ticks/s ({fired:,} alerts fired)")
+
+    linear = AlertEngine()
+    populate(linear, args.alerts, cryptos)
+    random.seed(2)
+    started = time.perf_counter()
+    for crypto, price in tick_stream(args.linear_ticks, cryptos):
+        linear_check(linear.alerts, crypto, price)
+    elapsed = time.perf_counter() - started
+    print(f"linear scan:  {args.linear_ticks / elapsed:12,.0f} ticks/s")
+
+if __name__ == "__main__":
+    main()
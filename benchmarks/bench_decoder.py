@@ -0,0 +1,54 @@
+# benchmarks/bench_decoder.py
+"""
+Скорость декодирования кадров Binance: кадров в секунду для каждого доступного
+декодера (json, orjson, msgspec, разбор по полям) и каждого типа потока.
+
+Запуск: python -m benchmarks.bench_decoder --frames 200000
+"""
+import argparse
+import json
+import random
+import time
+from benchmarks.fake_binance import stream_frame
+from services.decode_service import TICKER_STREAMS, available_decoders, get_decoder
+
+def sample_messages(stream_type, count, pairs=200):
+    """Сообщения combined stream для синтетических пар"""
+    messages = []
+    for i in range(count):
+        stream = f"pair{i % pairs}eur@{stream_type}"
+        messages.append(json.dumps({"stream": stream, "data": stream_frame(stream, random.uniform(1, 50000))},
+                                   separators=(",", ":")))
+    return messages
+
+def frames_per_second(decode, messages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in messages:
+            decode(message)
+        best = min(best, time.perf_counter() - started)
+    return len(messages) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    names = available_decoders()
+    print(f"{args.frames:,} combined-stream frames, best of {args.repeat}")
+    print(f"{'stream':>12}{'bytes':>7}" + "".join(f"{name:>12}" for name in names) + "   (frames/s)")
+    for stream_type in TICKER_STREAMS:
+        messages = sample_messages(stream_type, args.frames)
+        decoders = [get_decoder(name, stream_type) for name in names]
+        # Все декодеры должны давать одинаковый результат
+        expected = decoders[0].combined(messages[0])
+        for decoder in decoders[1:]:
+            assert decoder.combined(messages[0]) == expected, (decoder.name, decoder.combined(messages[0]), expected)
+        rates = [frames_per_second(decoder.combined, messages, args.repeat) for decoder in decoders]
+        size = sum(map(len, messages)) // len(messages)
+        print(f"{stream_type:>12}{size:>7}" + "".join(f"{rate:>12,.0f}" for rate in rates))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/bench_delivery.py
+"""
+Очередь доставки на фейковой сессии Bot API: достигнутая пропускная способность,
+слитые/отброшенные правки и задержка ответов на команды под нагрузкой.
+
+Запуск: python -m benchmarks.bench_delivery --chats 2000 --duration 10
+"""
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import time
+from aiogram import Bot
+from config import SUPPORTED_CRYPTOS
+from handlers import update_handlers
+from services import delivery_service, user_service
+from services.crypto_service import price_data
+from benchmarks.fake_telegram import FakeSession
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+async def run(args):
+    session = FakeSession(latency=args.latency, retry_after_rate=args.retry_after_rate)
+    bot = Bot(token="123456:TEST", session=session)
+    queue = delivery_service.init_delivery(bot)
+    update_handlers.init_bot(bot)
+    queue.start()
+
+    cryptos = list(SUPPORTED_CRYPTOS)
+    for chat_id in range(1, args.chats + 1):
+        user_service.set_crypto(chat_id, random.choice(cryptos))
+        user_data = user_service.activate_user(chat_id)
+        user_data.message_id = chat_id
+
+    command_latency = []
+
+    async def command_replies():
+        # Ответы на команды идут с высоким приоритетом через тот же лимитер
+        while True:
+            started = time.monotonic()
+            await bot.send_message(chat_id=random.randint(1, args.chats), text="/status")
+            command_latency.append(time.monotonic() - started)
+            await asyncio.sleep(1 / args.commands)
+
+    async def ticks():
+        while True:
+            for crypto in cryptos:
+                price_data[crypto]["price"] = random.uniform(1, 50000)
+                price_data[crypto]["last_update"] = time.time()
+            await update_handlers.update_all_users(set(cryptos))
+            await asyncio.sleep(args.cycle)
+
+    tasks = [asyncio.create_task(ticks()), asyncio.create_task(command_replies())]
+    await asyncio.sleep(args.duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await queue.stop()
+
+    edits = sum(1 for _, name, _ in session.calls if name == "EditMessageText")
+    stats = delivery_service.delivery_stats
+    print(f"{args.chats} chats, {args.duration:.0f}s, fan-out every {args.cycle}s")
+    print(f"API calls/s:           {len(session.calls) / args.duration:,.1f}")
+    print(f"price edits delivered: {edits:,}")
+    print(f"merged stale edits:    {stats['merged']:,}")
+    print(f"dropped (queue full):  {stats['dropped']:,}")
+    print(f"429 injected/retried:  {session.retry_after_count:,}/{stats['retry_after']:,}")
+    print(f"queued at end:         {len(queue):,}")
+    print(f"command reply p50/p99: {statistics.median(command_latency) * 1000:.0f} / "
+          f"{percentile(command_latency, 0.99) * 1000:.0f} ms ({len(command_latency)} replies)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--cycle", type=float, default=1.0, help="период рассылки, сек")
+    parser.add_argument("--latency", type=float, default=0.02, help="задержка фейкового API, сек")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--commands", type=float, default=5, help="ответов на команды в секунду")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
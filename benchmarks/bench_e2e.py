@@ -0,0 +1,183 @@
+# benchmarks/bench_e2e.py
+"""
+Сквозные сценарии: настоящий main.py в отдельном процессе против фейкового WebSocket
+Binance и фейкового HTTP Bot API с 1k/10k/100k синтетическими пользователями.
+
+Отчет по каждому сценарию: тики/с, правки/с, сквозная задержка от отправки тика до
+запроса к Bot API (p50/p95/p99), загрузка CPU и RSS процесса бота. --save сохраняет
+результаты в JSON; --compare сравнивает с сохраненными и завершается с кодом 1, если
+правки/с, p99 или RSS ухудшились больше чем на --tolerance.
+
+Запуск: python -m benchmarks.bench_e2e --users 1000 10000 100000 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+import aiohttp
+from config import SUPPORTED_CRYPTOS
+from services.storage_service import UserStore
+from benchmarks.fake_binance import FakeBinanceServer, load_recorded_frames
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.bench_delivery import percentile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def cpu_seconds(pid):
+    """utime + stime процесса из /proc/<pid>/stat"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def create_users_db(path, users):
+    """База с users активными пользователями, равномерно по криптовалютам"""
+    cryptos = list(SUPPORTED_CRYPTOS)
+    store = UserStore(path)
+    store.write({chat_id: {"crypto": cryptos[chat_id % len(cryptos)], "active": True}
+                 for chat_id in range(1, users + 1)})
+    store.close()
+
+async def scrape_ticks(session, url):
+    async with session.get(url) as response:
+        text = await response.text()
+    return sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+               if line.startswith("cryptobot_ticks_total{"))
+
+async def wait_ready(session, url, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.returncode is not None:
+            raise RuntimeError(f"bot exited with code {process.returncode}")
+        try:
+            return await scrape_ticks(session, url)
+        except aiohttp.ClientError:
+            await asyncio.sleep(0.2)
+    raise TimeoutError("bot did not start")
+
+async def run_scenario(users, args, workdir):
+    db_path = os.path.join(workdir, f"users-{users}.db")
+    create_users_db(db_path, users)
+
+    replay = load_recorded_frames(args.replay) if args.replay else None
+    binance = await FakeBinanceServer(rate=args.tick_rate, replay=replay, track_latency=True).start()
+    telegram = await FakeTelegramServer(latency=args.api_latency, retry_after_rate=args.retry_after_rate,
+                                        binance=binance).start()
+    metrics_port = free_port()
+    env = dict(os.environ, BOT_TOKEN="123456:TEST", TELEGRAM_API_URL=telegram.url,
+               BINANCE_WS_BASE=binance.url, USERS_DB_FILE=db_path, METRICS_PORT=str(metrics_port),
+               TELEGRAM_GLOBAL_RATE=str(args.global_rate), UPDATE_MODE="polling", RESTORE_RAMP_SECONDS="0",
+               EXCHANGE_INFO_MAX_AGE="0", ENABLED_CRYPTOS_FILE=os.path.join(workdir, "enabled_cryptos.json"))
+    with open(os.path.join(workdir, f"bot-{users}.log"), "w") as log:
+        process = await asyncio.create_subprocess_exec(sys.executable, "main.py", cwd=REPO_ROOT, env=env,
+                                                       stdout=log, stderr=log)
+    metrics_url = f"http://127.0.0.1:{metrics_port}/metrics"
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_ready(session, metrics_url, process)
+            await asyncio.sleep(args.warmup)
+
+            ticks_start = await scrape_ticks(session, metrics_url)
+            calls_start, latencies_start = len(telegram.calls), len(telegram.latencies)
+            cpu_start, started = cpu_seconds(process.pid), time.monotonic()
+            await asyncio.sleep(args.duration)
+            elapsed = time.monotonic() - started
+            ticks = await scrape_ticks(session, metrics_url) - ticks_start
+            cpu = cpu_seconds(process.pid) - cpu_start
+            rss = rss_mb(process.pid)
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 15)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        await telegram.stop()
+        await binance.stop()
+
+    edits = sum(1 for _, method, _ in telegram.calls[calls_start:] if method in ("sendMessage", "editMessageText"))
+    latencies = telegram.latencies[latencies_start:]
+    return {
+        "ticks_per_s": ticks / elapsed,
+        "edits_per_s": edits / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "cpu_percent": cpu / elapsed * 100,
+        "rss_mb": rss,
+    }
+
+def compare(results, baseline, tolerance):
+    """Список регрессий относительно сохраненного прогона"""
+    regressions = []
+    for users, current in results.items():
+        base = baseline.get(users)
+        if base is None:
+            continue
+        if current["edits_per_s"] < base["edits_per_s"] * (1 - tolerance):
+            regressions.append(f"{users} users: edits/s {base['edits_per_s']:.0f} -> {current['edits_per_s']:.0f}")
+        for key in ("p99_ms", "rss_mb"):
+            if current[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{users} users: {key} {base[key]:.1f} -> {current[key]:.1f}")
+    return regressions
+
+async def run(args):
+    results = {}
+    print(f"{'users':>8}{'ticks/s':>10}{'edits/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'CPU %':>8}{'RSS MB':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for users in args.users:
+            r = results[str(users)] = await run_scenario(users, args, workdir)
+            print(f"{users:>8,}{r['ticks_per_s']:>10,.0f}{r['edits_per_s']:>10,.0f}{r['p50_ms']:>9.1f}"
+                  f"{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['cpu_percent']:>8.0f}{r['rss_mb']:>9.1f}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--tick-rate", type=float, default=10, help="кадров в секунду на пару")
+    parser.add_argument("--replay", help="записанные кадры combined stream (JSON Lines или лог тиков TICK_RECORD_FILE)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка фейкового Bot API, сек")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--global-rate", type=float, default=1000, help="TELEGRAM_GLOBAL_RATE бота")
+    parser.add_argument("--save", help="сохранить результаты в JSON")
+    parser.add_argument("--compare", help="сравнить с сохраненными результатами")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    # Бот обрывает соединения при остановке - это не ошибка фейкового API
+    logging.getLogger("aiohttp.server").setLevel(logging.CRITICAL)
+
+    results = asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
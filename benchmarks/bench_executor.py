@@ -0,0 +1,101 @@
+# benchmarks/bench_executor.py
+"""
+Блокирующая работа в event loop против пулов executor_service: отчет по всем
+портфелям (/admin_stats) и пакетная запись пользователей в SQLite. Пока идут
+операции, проба каждую миллисекунду замеряет задержку event loop - столько ждали
+бы чтение WebSocket и прием команд.
+
+Отчет: время операции и наибольшая задержка event loop за время прогона. Отчет по
+портфелям считается в пуле процессов, если задан CPU_EXECUTOR_WORKERS, иначе в пуле потоков.
+
+Запуск: python -m benchmarks.bench_executor --portfolios 1000000 --users 20000
+        CPU_EXECUTOR_WORKERS=2 python -m benchmarks.bench_executor
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from config import SUPPORTED_CRYPTOS, CPU_EXECUTOR_WORKERS
+from services.portfolio_service import PortfolioMatrix, portfolio_report
+from services.storage_service import UserStore
+from services.executor_service import run_io, run_cpu, shutdown_executors
+
+async def measure(operation, repeat):
+    """(мс на операцию, наибольшая задержка event loop в мс)"""
+    lags = []
+    running = True
+
+    async def probe():
+        while running:
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            lags.append(time.perf_counter() - expected)
+
+    # Первый вызов не замеряется: он создает пул (и процессы пула)
+    await operation()
+    task = asyncio.create_task(probe())
+    elapsed = 0.0
+    for _ in range(repeat):
+        # Между операциями loop свободен, поэтому задержка пробы - вклад одной операции
+        await asyncio.sleep(0.01)
+        started = time.perf_counter()
+        await operation()
+        elapsed += time.perf_counter() - started
+    running = False
+    await task
+    return elapsed / repeat * 1000, max(lags) * 1000
+
+def build_matrix(portfolios):
+    cryptos = list(SUPPORTED_CRYPTOS)
+    matrix = PortfolioMatrix(capacity=portfolios)
+    random.seed(1)
+    for chat_id in range(portfolios):
+        matrix.set_holding(chat_id, random.choice(cryptos), random.uniform(0.1, 10))
+    for crypto in cryptos:
+        matrix.set_price(crypto, random.uniform(1, 50000))
+    return matrix
+
+async def run(args):
+    matrix = build_matrix(args.portfolios)
+    report_args = matrix.report_args()
+    records = {chat_id: {"active": True, "crypto": "BTC", "portfolio": {"ETH": 1.5}} for chat_id in range(args.users)}
+    cpu_pool = f"{CPU_EXECUTOR_WORKERS} processes" if CPU_EXECUTOR_WORKERS else "thread"
+
+    async def report_inline():
+        portfolio_report(*report_args)
+
+    async def report_offloaded():
+        await run_cpu(portfolio_report, *report_args)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        store = UserStore(os.path.join(workdir, "users.db"))
+
+        async def write_inline():
+            store.write(records)
+
+        async def write_offloaded():
+            await run_io(store.write, records)
+
+        print(f"{args.portfolios:,} portfolios, {args.users:,} users per write")
+        print(f"{'operation':<42}{'ms/op':>9}{'max loop lag ms':>17}")
+        for name, operation in (("portfolio report, inline", report_inline),
+                                (f"portfolio report, run_cpu ({cpu_pool})", report_offloaded),
+                                ("user store write, inline", write_inline),
+                                ("user store write, run_io", write_offloaded)):
+            ms, lag = await measure(operation, args.repeat)
+            print(f"{name:<42}{ms:>9.1f}{lag:>17.1f}")
+        store.close()
+    shutdown_executors()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--portfolios", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=20_000, help="записей в одной пакетной записи")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_keyboard_flow.py
+"""
+Стоимость сессии "выбрать монету и включить обновления": текстовые команды
+(/select_crypto, /eth, /start_updates) против inline-клавиатуры (/select_crypto и
+две кнопки). Для каждого пользователя считаются входящие апдейты, вызовы Bot API
+(всего и привязанные к чату), созданные сообщения и время обработки диспетчером.
+
+Запуск: python -m benchmarks.bench_keyboard_flow --users 2000
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime
+from aiogram import Bot
+from aiogram.types import Update, Message, CallbackQuery, Chat, User
+from services import delivery_service
+from services.crypto_service import update_price
+from services.keyboard_service import CryptoChoice, UpdatesToggle
+from handlers import update_handlers
+from benchmarks.fake_telegram import FakeSession
+from main import create_dispatcher
+
+class Updates:
+    """Фабрика входящих апдейтов одного пользователя"""
+
+    def __init__(self, chat_id):
+        self.chat = Chat(id=chat_id, type="private")
+        self.user = User(id=chat_id, is_bot=False, first_name="bench")
+        self.update_id = 0
+
+    def _next_id(self):
+        self.update_id += 1
+        return self.update_id
+
+    def command(self, text):
+        message = Message(message_id=self._next_id(), date=datetime.now(), chat=self.chat,
+                          from_user=self.user, text=text)
+        return Update(update_id=self.update_id, message=message)
+
+    def button(self, data, message_id):
+        message = Message(message_id=message_id, date=datetime.now(), chat=self.chat, text="")
+        query = CallbackQuery(id=str(self._next_id()), from_user=self.user, chat_instance="bench",
+                              message=message, data=data.pack())
+        return Update(update_id=self.update_id, callback_query=query)
+
+async def run_flow(flow, users, dp, bot, session):
+    calls_before = len(session.calls)
+    updates = 0
+    started = time.perf_counter()
+    for chat_id in range(1, users + 1):
+        factory = Updates(chat_id + (0 if flow == "commands" else users))
+        await dp.feed_update(bot, factory.command("/select_crypto"))
+        if flow == "commands":
+            session_updates = [factory.command("/eth"), factory.command("/start_updates")]
+        else:
+            # Кнопки нажимаются на сообщении с клавиатурой, которое прислал /select_crypto
+            menu_id = session.calls[-1][3]
+            session_updates = [factory.button(CryptoChoice(code="ETH"), menu_id),
+                               factory.button(UpdatesToggle(on=True), menu_id)]
+        for update in session_updates:
+            await dp.feed_update(bot, update)
+        updates += 1 + len(session_updates)
+    elapsed = time.perf_counter() - started
+    calls = session.calls[calls_before:]
+    # answerCallbackQuery не привязан к чату и не расходует поканальный лимит сообщений
+    chat_calls = sum(1 for call in calls if call[2] is not None)
+    created = sum(1 for call in calls if call[1] == "SendMessage")
+    return updates / users, len(calls) / users, chat_calls / users, created / users, elapsed / users * 1000
+
+class CountingSession(FakeSession):
+    """FakeSession, запоминающая еще и message_id созданных сообщений"""
+
+    async def make_request(self, bot, method, timeout=None):
+        result = await super().make_request(bot, method, timeout)
+        moment, name, chat_id = self.calls[-1]
+        self.calls[-1] = (moment, name, chat_id, getattr(result, "message_id", None))
+        return result
+
+async def run(args):
+    session = CountingSession(latency=0)
+    bot = Bot("123456:TEST", session=session)
+    # Без лимитов доставки: считаются вызовы, а не ожидание поканального лимита
+    delivery_service.delivery_queue = delivery_service.DeliveryQueue()
+    delivery_service.delivery_queue.start()
+    update_handlers.init_bot(bot)
+    dp = create_dispatcher()
+    # С известной ценой /start_updates отправляет сообщение с ценой сразу, без ожидания тика
+    update_price("ETH", 2000.0, time.time())
+    print(f"{args.users:,} sessions")
+    print(f"{'flow':<10}{'updates':>10}{'API calls':>11}{'chat calls':>12}{'messages':>10}{'ms/session':>12}")
+    for flow in ("commands", "keyboard"):
+        updates, calls, chat_calls, created, ms = await run_flow(flow, args.users, dp, bot, session)
+        print(f"{flow:<10}{updates:>10.1f}{calls:>11.1f}{chat_calls:>12.1f}{created:>10.1f}{ms:>12.2f}")
+    await delivery_service.delivery_queue.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
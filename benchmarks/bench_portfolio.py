@@ -0,0 +1,66 @@
+# benchmarks/bench_portfolio.py
+"""
+Оценка всех портфелей на каждом тике: матрица PortfolioMatrix (одно умножение
+матрицы на вектор цен) против прохода по словарям портфелей.
+
+Запуск: python -m benchmarks.bench_portfolio --portfolios 1000000 --ticks 100
+"""
+import argparse
+import random
+import time
+from config import SUPPORTED_CRYPTOS
+from services.portfolio_service import PortfolioMatrix
+
+START_PRICE = 50_000.0
+
+def make_portfolios(count, cryptos):
+    random.seed(1)
+    return {chat_id: {crypto: round(random.uniform(0.01, 10), 4)
+                      for crypto in random.sample(cryptos, random.randint(1, 3))}
+            for chat_id in range(1, count + 1)}
+
+def dict_values(portfolios, prices):
+    return {chat_id: sum(amount * prices[crypto] for crypto, amount in portfolio.items())
+            for chat_id, portfolio in portfolios.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--portfolios", type=int, default=1_000_000)
+    parser.add_argument("--ticks", type=int, default=100)
+    parser.add_argument("--dict-ticks", type=int, default=3, help="тиков для прохода по словарям (он медленный)")
+    args = parser.parse_args()
+    cryptos = list(SUPPORTED_CRYPTOS)
+    portfolios = make_portfolios(args.portfolios, cryptos)
+
+    matrix = PortfolioMatrix()
+    started = time.perf_counter()
+    for chat_id, portfolio in portfolios.items():
+        matrix.set_portfolio(chat_id, portfolio)
+    print(f"{args.portfolios:,} portfolios × {len(cryptos)} cryptos loaded in {time.perf_counter() - started:.1f}s "
+          f"({matrix.holdings.nbytes / 1024 / 1024:.0f} MB matrix)")
+
+    random.seed(2)
+    prices = {crypto: START_PRICE for crypto in cryptos}
+    for crypto in cryptos:
+        matrix.set_price(crypto, START_PRICE)
+
+    timings = []
+    for _ in range(args.ticks):
+        crypto = random.choice(cryptos)
+        prices[crypto] *= 1 + random.gauss(0, 0.0001)
+        started = time.perf_counter()
+        matrix.set_price(crypto, prices[crypto])
+        matrix.values()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"matrix:  p50 {timings[len(timings) // 2] * 1000:8.2f} ms/tick, "
+          f"max {timings[-1] * 1000:8.2f} ms/tick, total €{matrix.total():,.0f}")
+
+    started = time.perf_counter()
+    for _ in range(args.dict_ticks):
+        values = dict_values(portfolios, prices)
+    elapsed = (time.perf_counter() - started) / args.dict_ticks
+    print(f"dicts:   {elapsed * 1000:8.2f} ms/tick, total €{sum(values.values()):,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_quotes.py
+"""
+Цены в нескольких валютах: число потоков Binance при отдельной паре на каждую
+монету и валюту против одной котировки на монету и курсов валют к хабу
+(services/quote_service.py), и стоимость рассылки, когда подписчики смотрят цены
+в разных валютах.
+
+Отчет: потоков при --coins монетах и всех валютах из CURRENCIES; время цикла
+рассылки update_all_users по всем монетам, когда все пользователи в QUOTE_ASSET и
+когда валюты распределены поровну; время тика курса QUOTE_ASSET (он меняет все
+множители) вместе с пересчетом цен пользователей всех валют.
+
+Запуск: python -m benchmarks.bench_quotes --users 100000 --coins 200
+"""
+import argparse
+import asyncio
+import logging
+import time
+import timeit
+from aiogram import Bot
+from config import SUPPORTED_CRYPTOS, CURRENCIES, QUOTE_ASSET
+from services import delivery_service
+from services.crypto_service import update_price, add_price_listener
+from services.quote_service import quote_engine
+from services.user_service import set_crypto, activate_user, set_currency, get_user
+from handlers import update_handlers
+from handlers.update_handlers import update_all_users, update_currency_users, mark_currency_changed
+from benchmarks.fake_telegram import FakeSession
+
+def populate(users):
+    cryptos = list(SUPPORTED_CRYPTOS)
+    for chat_id in range(1, users + 1):
+        set_crypto(chat_id, cryptos[chat_id % len(cryptos)])
+        activate_user(chat_id)
+        get_user(chat_id).message_id = chat_id
+
+def assign_currencies(users, currencies):
+    for chat_id in range(1, users + 1):
+        currency = currencies[chat_id % len(currencies)]
+        set_currency(chat_id, None if currency == QUOTE_ASSET else currency)
+
+def fanout_ms(repeat):
+    cryptos = list(SUPPORTED_CRYPTOS)
+
+    def cycle():
+        delivery_service.delivery_queue = delivery_service.DeliveryQueue()
+        asyncio.run(update_all_users(cryptos))
+    return min(timeit.repeat(cycle, number=1, repeat=repeat)) * 1000
+
+def rate_tick_ms(repeat):
+    base_pair = quote_engine.conversion[QUOTE_ASSET]
+
+    def tick():
+        delivery_service.delivery_queue = delivery_service.DeliveryQueue()
+        update_handlers.dirty_currencies.clear()
+        update_price(base_pair, 1.08, time.time())
+        update_currency_users(set(update_handlers.dirty_currencies))
+    return min(timeit.repeat(tick, number=1, repeat=repeat)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--coins", type=int, default=200, help="монет для подсчета потоков")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    conversion_streams = len(quote_engine.pairs)
+    print(f"{args.coins} coins × {len(CURRENCIES)} currencies ({', '.join(CURRENCIES)})")
+    print(f"{'streams per pair and currency':<32}{args.coins * len(CURRENCIES):>8,}")
+    print(f"{'streams with derived rates':<32}{args.coins + conversion_streams:>8,}")
+
+    update_handlers.init_bot(Bot("123456:TEST", session=FakeSession(latency=0)))
+    add_price_listener(quote_engine.on_tick)
+    quote_engine.add_listener(mark_currency_changed)
+    now = time.time()
+    for crypto in SUPPORTED_CRYPTOS:
+        update_price(crypto, 50_000.0, now)
+    for code in quote_engine.pairs:
+        update_price(code, 1.0 + len(code) / 10, now)
+
+    populate(args.users)
+    print(f"\n{args.users:,} active users, {len(SUPPORTED_CRYPTOS)} coins ticking")
+    print(f"{'scenario':<32}{'ms':>8}")
+    print(f"{'fan-out, all in ' + QUOTE_ASSET:<32}{fanout_ms(args.repeat):>8.1f}")
+    assign_currencies(args.users, list(CURRENCIES))
+    print(f"{'fan-out, currencies mixed':<32}{fanout_ms(args.repeat):>8.1f}")
+    print(f"{QUOTE_ASSET + ' rate tick, all currencies':<32}{rate_tick_ms(args.repeat):>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_read_commands.py
+"""
+Команды чтения под спамом: /checkCrypto, /status и /portfolio с кэшем ответов и
+сворачиванием повторов и без них. Чаты работают параллельно: в каждом раунде чат
+отправляет каждую команду --burst раз подряд, раунды идут с паузой --gap (больше окна
+сворачивания, но меньше TTL кэша), а тик по --tick-crypto раз в --gap сбрасывает ответы
+его подписчиков. Отчет: вызовы Bot API на команду, процессорное время на команду,
+попадания и промахи кэша, свернутые повторы.
+
+Запуск: python -m benchmarks.bench_read_commands --chats 20 --rounds 4 --burst 3
+"""
+import argparse
+import asyncio
+import logging
+import time
+from aiogram import Bot
+from config import SUPPORTED_CRYPTOS, COMMAND_DEBOUNCE_WINDOW
+from services import delivery_service
+from services.crypto_service import update_price
+from services.user_service import set_crypto, add_holding
+from services.response_service import response_cache, response_stats, CommandDebounceMiddleware
+from handlers import update_handlers
+from benchmarks.fake_telegram import FakeSession
+from benchmarks.bench_keyboard_flow import Updates
+from main import create_dispatcher
+
+COMMANDS = ("/checkCrypto", "/status", "/portfolio")
+
+async def run_mode(mode, args, dp, bot, session):
+    debounce = [middleware for middleware in dp.message.outer_middleware
+                if isinstance(middleware, CommandDebounceMiddleware)]
+    for middleware in debounce:
+        middleware.window = COMMAND_DEBOUNCE_WINDOW if mode == "on" else 0
+    response_cache.clear()
+    response_cache.ttl = args.ttl if mode == "on" else 0
+    for key in response_stats:
+        response_stats[key] = 0
+
+    cryptos = list(SUPPORTED_CRYPTOS)
+    offset = 0 if mode == "on" else args.chats
+    factories = [Updates(offset + i + 1) for i in range(args.chats)]
+    for i, factory in enumerate(factories):
+        set_crypto(factory.chat.id, cryptos[i % len(cryptos)])
+        add_holding(factory.chat.id, cryptos[(i + 1) % len(cryptos)], 1.0)
+
+    async def chat(factory):
+        for round_index in range(args.rounds):
+            if round_index:
+                await asyncio.sleep(args.gap)
+            for command in COMMANDS:
+                # Поллинг обрабатывает апдейты пачки параллельно, как и здесь
+                await asyncio.gather(*(dp.feed_update(bot, factory.command(command)) for _ in range(args.burst)))
+
+    async def ticker():
+        for round_index in range(1, args.rounds):
+            await asyncio.sleep(args.gap)
+            update_price(args.tick_crypto, 50_000.0 + round_index, time.time())
+
+    calls_before, cpu_before = len(session.calls), time.process_time()
+    await asyncio.gather(ticker(), *(chat(factory) for factory in factories))
+    commands = args.chats * args.rounds * len(COMMANDS) * args.burst
+    calls = len(session.calls) - calls_before
+    return calls / commands, (time.process_time() - cpu_before) / commands * 1e6, dict(response_stats)
+
+async def run(args):
+    session = FakeSession(latency=0)
+    bot = Bot("123456:TEST", session=session)
+    # Без лимитов доставки: считаются вызовы, а не ожидание поканального лимита
+    delivery_service.delivery_queue = delivery_service.DeliveryQueue()
+    delivery_service.delivery_queue.start()
+    update_handlers.init_bot(bot)
+    dp = create_dispatcher()
+    for crypto in SUPPORTED_CRYPTOS:
+        update_price(crypto, 50_000.0, time.time())
+
+    print(f"{args.chats:,} chats × {len(COMMANDS)} commands × {args.burst} repeats × {args.rounds} rounds, "
+          f"tick on {args.tick_crypto} between rounds")
+    print(f"{'mode':<6}{'calls/cmd':>11}{'CPU µs/cmd':>12}{'hit':>8}{'miss':>8}{'collapsed':>11}")
+    for mode in ("off", "on"):
+        calls, micros, stats = await run_mode(mode, args, dp, bot, session)
+        print(f"{mode:<6}{calls:>11.2f}{micros:>12.0f}{stats['hit']:>8,}{stats['miss']:>8,}{stats['collapsed']:>11,}")
+    await delivery_service.delivery_queue.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--burst", type=int, default=3, help="одинаковых команд подряд")
+    parser.add_argument("--gap", type=float, default=1.2, help="секунд между раундами")
+    parser.add_argument("--ttl", type=float, default=2.0, help="TTL кэша ответов")
+    parser.add_argument("--tick-crypto", default="BTC")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
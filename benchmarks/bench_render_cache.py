@@ -0,0 +1,51 @@
+# benchmarks/bench_render_cache.py
+"""
+Время рендера текстов за один цикл рассылки: форматирование на каждого подписчика
+против кэша render_price_text (один рендер на криптовалюту за тик).
+
+Запуск: python -m benchmarks.bench_render_cache --subscribers 50000
+"""
+import argparse
+import random
+import time
+import timeit
+from datetime import datetime
+from config import SUPPORTED_CRYPTOS
+from services.crypto_service import price_data
+from services.render_service import render_price_text
+
+def render_inline(crypto):
+    formatted_price = f"{price_data[crypto]['price']:,.2f}"
+    update_time = datetime.fromtimestamp(price_data[crypto]["last_update"]).strftime("%H:%M:%S")
+    return f"💰 <b>{crypto}/EUR</b>: €{formatted_price}\n🔄 Обновлено: {update_time} (Реальное время)"
+
+def tick():
+    for crypto in SUPPORTED_CRYPTOS:
+        price_data[crypto]["price"] = random.uniform(1, 50000)
+        price_data[crypto]["last_update"] = time.time()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=50_000)
+    parser.add_argument("--cycles", type=int, default=10)
+    args = parser.parse_args()
+
+    cryptos = list(SUPPORTED_CRYPTOS)
+    recipients = [random.choice(cryptos) for _ in range(args.subscribers)]
+
+    def cycle(render):
+        tick()
+        for crypto in recipients:
+            render(crypto)
+
+    tick()
+    assert all(render_inline(c) == render_price_text(c) for c in cryptos)
+    inline = min(timeit.repeat(lambda: cycle(render_inline), number=1, repeat=args.cycles))
+    cached = min(timeit.repeat(lambda: cycle(render_price_text), number=1, repeat=args.cycles))
+
+    print(f"{args.subscribers:,} subscribers, {len(cryptos)} cryptos")
+    print(f"per-user render:  {inline * 1000:8.1f} ms per cycle")
+    print(f"render cache:     {cached * 1000:8.1f} ms per cycle")
+
+if __name__ == "__main__":
+    main()
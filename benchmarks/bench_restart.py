@@ -0,0 +1,144 @@
+# benchmarks/bench_restart.py
+"""
+Перезапуск бота с большой базой: настоящий main.py против фейковых Binance и Bot API.
+
+Сценарии:
+- cold      - message_id не сохранены, все живые сообщения подключаются сразу (RESTORE_RAMP_SECONDS=0):
+              каждому активному пользователю отправляется новое сообщение
+- persisted - message_id сохранены, без растяжки: старые сообщения правятся, но все одновременно
+- ramped    - message_id сохранены, подключение растянуто на --ramp секунд
+
+Отчет: время от запуска процесса до первого getUpdates (бот принимает команды) и до
+первого сообщения с ценой (time-to-first-update), время, за которое сообщение получили
+все активные пользователи, наибольшее число пользователей, получивших первое после
+перезапуска сообщение за одну секунду (размер всплеска), и сколько первых сообщений
+были отправками новых, а сколько правками старых.
+
+Запуск: python -m benchmarks.bench_restart --users 100000 --ramp 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import tempfile
+import time
+from config import SUPPORTED_CRYPTOS
+from services.storage_service import UserStore
+from benchmarks.fake_binance import FakeBinanceServer
+from benchmarks.fake_telegram import FakeTelegramServer
+from benchmarks.bench_e2e import REPO_ROOT, free_port
+
+SCENARIOS = {
+    # название: (message_id сохранены, растяжка включена)
+    "cold": (False, False),
+    "persisted": (True, False),
+    "ramped": (True, True),
+}
+
+def create_users_db(path, users, active_share, persisted):
+    """База с users пользователями, из них active_share активных; message_id по желанию"""
+    cryptos = list(SUPPORTED_CRYPTOS)
+    active = max(1, int(users * active_share))
+    store = UserStore(path)
+    records = {chat_id: {"crypto": cryptos[chat_id % len(cryptos)], "active": chat_id <= active}
+               for chat_id in range(1, users + 1)}
+    messages = {chat_id: (chat_id, None) for chat_id in range(1, active + 1)} if persisted else None
+    store.write(records, messages)
+    store.close()
+    return active
+
+def peak_per_second(moments):
+    """Наибольшее число событий в любом окне длиной в секунду"""
+    peak, start = 0, 0
+    for end, moment in enumerate(moments):
+        while moment - moments[start] >= 1:
+            start += 1
+        peak = max(peak, end - start + 1)
+    return peak
+
+async def run_scenario(name, args, workdir):
+    persisted, ramped = SCENARIOS[name]
+    db_path = os.path.join(workdir, f"users-{name}.db")
+    active = create_users_db(db_path, args.users, args.active_share, persisted)
+    ramp = args.ramp if ramped else 0
+
+    binance = await FakeBinanceServer(rate=args.tick_rate).start()
+    telegram = await FakeTelegramServer(latency=args.api_latency).start()
+    env = dict(os.environ, BOT_TOKEN="123456:TEST", TELEGRAM_API_URL=telegram.url,
+               BINANCE_WS_BASE=binance.url, USERS_DB_FILE=db_path, METRICS_PORT=str(free_port()),
+               TELEGRAM_GLOBAL_RATE=str(args.global_rate), UPDATE_MODE="polling", RESTORE_RAMP_SECONDS=str(ramp),
+               EXCHANGE_INFO_MAX_AGE="0", ENABLED_CRYPTOS_FILE=os.path.join(workdir, "enabled_cryptos.json"))
+    started = time.monotonic()
+    with open(os.path.join(workdir, f"bot-{name}.log"), "w") as log:
+        process = await asyncio.create_subprocess_exec(sys.executable, "main.py", cwd=REPO_ROOT, env=env,
+                                                       stdout=log, stderr=log)
+    # Ждем, пока сообщение получат все активные пользователи, но не дольше ramp + --timeout
+    reached = set()
+    deadline = started + ramp + args.timeout
+    try:
+        while time.monotonic() < deadline and len(reached) < active:
+            if process.returncode is not None:
+                raise RuntimeError(f"bot exited with code {process.returncode}")
+            await asyncio.sleep(0.2)
+            reached.update(chat_id for _, method, chat_id in telegram.calls
+                           if method in ("sendMessage", "editMessageText"))
+    finally:
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 15)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        await telegram.stop()
+        await binance.stop()
+
+    messages = [(moment, method, chat_id) for moment, method, chat_id in telegram.calls
+                if method in ("sendMessage", "editMessageText")]
+    first_seen = {}
+    for moment, _, chat_id in messages:
+        first_seen.setdefault(chat_id, moment)
+    # Первое сообщение каждого пользователя - отправка или правка существующего
+    first_methods = {}
+    for _, method, chat_id in messages:
+        first_methods.setdefault(chat_id, method)
+    return {
+        "active": active,
+        "poll_s": telegram.first_poll - started if telegram.first_poll else float("nan"),
+        "first_update_s": messages[0][0] - started if messages else float("nan"),
+        "all_users_s": max(first_seen.values()) - started if len(first_seen) >= active else float("nan"),
+        "reached": len(first_seen),
+        "burst_per_s": peak_per_second(sorted(first_seen.values())),
+        "sends": sum(1 for method in first_methods.values() if method == "sendMessage"),
+        "edits": sum(1 for method in first_methods.values() if method == "editMessageText"),
+    }
+
+async def run(args):
+    print(f"{args.users:,} users, {args.active_share:.0%} active, ramp {args.ramp:g}s")
+    print(f"{'scenario':<11}{'poll s':>8}{'first s':>9}{'all s':>8}{'reached':>9}{'burst/s':>9}{'sends':>8}{'edits':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.scenarios:
+            r = await run_scenario(name, args, workdir)
+            print(f"{name:<11}{r['poll_s']:>8.2f}{r['first_update_s']:>9.2f}{r['all_users_s']:>8.1f}"
+                  f"{r['reached']:>9,}{r['burst_per_s']:>9,}{r['sends']:>8,}{r['edits']:>8,}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--active-share", type=float, default=0.1, help="доля активных пользователей")
+    parser.add_argument("--ramp", type=float, default=20, help="RESTORE_RAMP_SECONDS сценария ramped")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--tick-rate", type=float, default=10, help="кадров в секунду на пару")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка фейкового Bot API, сек")
+    parser.add_argument("--global-rate", type=float, default=1000, help="TELEGRAM_GLOBAL_RATE бота")
+    parser.add_argument("--timeout", type=float, default=30, help="секунд ожидания после растяжки")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    # Бот обрывает соединения при остановке - это не ошибка фейкового API
+    logging.getLogger("aiohttp.server").setLevel(logging.CRITICAL)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
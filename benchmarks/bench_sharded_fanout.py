@@ -0,0 +1,93 @@
+# benchmarks/bench_sharded_fanout.py
+"""
+Нагрузочный тест многопроцессного режима: процесс-публикатор шлет тики через
+UnixSocketBroker, N воркеров доставки (run_delivery_worker) с фейковой сессией
+Bot API обновляют сообщения своих шардов. Показывает рост пропускной
+способности рассылки с числом воркеров.
+
+Запуск: python -m benchmarks.bench_sharded_fanout --users 20000 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from aiogram import Bot
+from config import SUPPORTED_CRYPTOS
+from services import user_service
+from services.broker_service import UnixSocketBroker
+from benchmarks.fake_telegram import FakeSession
+
+def worker_process(index, workers, users, socket_path, duration, latency, result_queue):
+    import launcher
+
+    async def run():
+        # Синтетический шард пользователей с уже отправленными сообщениями
+        cryptos = list(SUPPORTED_CRYPTOS)
+        for chat_id in range(index, users, workers):
+            user_service.set_crypto(chat_id, cryptos[chat_id % len(cryptos)])
+            user_service.activate_user(chat_id).message_id = chat_id
+
+        session = FakeSession(latency=latency)
+        bot = Bot(token="123456:TEST", session=session)
+        task = asyncio.create_task(launcher.run_delivery_worker(
+            index, workers, broker=UnixSocketBroker(socket_path), bot=bot, global_rate=1e9, load_users=False))
+        await asyncio.sleep(2)  # прогрев: подключение и первый цикл
+        start_count = len(session.calls)
+        await asyncio.sleep(duration)
+        result_queue.put(len(session.calls) - start_count)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(run())
+
+async def publish_ticks(broker, seconds, rate):
+    cryptos = list(SUPPORTED_CRYPTOS)
+    prices = {crypto: random.uniform(1, 50000) for crypto in cryptos}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for crypto in cryptos:
+            prices[crypto] *= random.uniform(0.99, 1.01)
+            broker.publish({"type": "tick", "crypto": crypto, "price": prices[crypto], "t": time.time()})
+        await asyncio.sleep(1 / rate)
+
+async def run_scenario(workers, args, socket_path):
+    broker = await UnixSocketBroker(socket_path).start()
+    result_queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker_process,
+                                         args=(i, workers, args.users, socket_path, args.duration, args.latency, result_queue))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    await publish_ticks(broker, args.duration + 4, args.tick_rate)
+    edits = sum(result_queue.get() for _ in processes)
+    for process in processes:
+        process.join()
+    await broker.close()
+    return edits / args.duration
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка фейкового API, сек")
+    parser.add_argument("--tick-rate", type=float, default=10, help="тиков в секунду на криптовалюту")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "ticks.sock")
+    print(f"{args.users:,} active users, {args.duration:.0f}s per scenario")
+    print(f"{'workers':>8}{'edits/s':>12}{'speedup':>10}")
+    baseline = None
+    for workers in args.workers:
+        rate = asyncio.run(run_scenario(workers, args, socket_path))
+        baseline = baseline or rate
+        print(f"{workers:>8}{rate:>12,.0f}{rate / baseline:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# benchmarks/bench_stream_manager.py
+"""
+Сравнение N отдельных WebSocket-соединений (по одному на пару, как до StreamManager) и
+мультиплексированного StreamManager на локальном фейковом сервере Binance.
+
+Запуск: python -m benchmarks.bench_stream_manager --pairs 200 --duration 10
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import time
+import tracemalloc
+import websockets
+from services import crypto_service
+from services.decode_service import ticker_decoder
+from services.symbol_service import symbol_registry
+from benchmarks.fake_binance import FakeBinanceServer
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+def register_synthetic_pairs(count):
+    """Синтетические пары в каталоге реестра (как из exchangeInfo), все включены"""
+    codes = [f"C{i:04d}" for i in range(count)]
+    symbol_registry.load_exchange_info({"symbols": [
+        {"symbol": f"{code}EUR", "status": "TRADING", "baseAsset": code, "quoteAsset": "EUR"} for code in codes
+    ]})
+    for code in codes:
+        symbol_registry.enable(code)
+    return codes
+
+async def separate_stream(crypto, update_callback, base_url):
+    """Базовый вариант для сравнения: отдельный WebSocket /ws/<stream> на одну пару"""
+    while True:
+        try:
+            async with websockets.connect(f"{base_url}/ws/{crypto_service.stream_name(crypto)}") as websocket:
+                async for message in websocket:
+                    price = ticker_decoder.frame(message)
+                    if price is not None:
+                        crypto_service.update_price(crypto, price, time.time())
+                        update_callback(crypto)
+        except (OSError, websockets.exceptions.ConnectionClosed) as e:
+            logging.warning(f"WebSocket {crypto}: {e}. Reconnecting...")
+            await asyncio.sleep(1)
+
+def serve(port_queue, rate):
+    async def run():
+        server = await FakeBinanceServer(rate=rate).start()
+        port_queue.put(server.port)
+        await asyncio.Future()
+    asyncio.run(run())
+
+async def measure(mode, codes, base_url, duration):
+    received = 0
+
+    def on_tick(crypto):
+        nonlocal received
+        received += 1
+
+    tracemalloc.start()
+    rss_before = rss_mb()
+    if mode == "separate":
+        tasks = [asyncio.create_task(separate_stream(code, on_tick, base_url)) for code in codes]
+        stop = None
+    else:
+        manager = crypto_service.StreamManager(on_tick, base_url)
+        for code in codes:
+            manager.subscribe(code)
+        manager.start()
+        tasks = []
+        stop = manager.stop
+
+    await asyncio.sleep(1)  # прогрев: подключения и TLS-рукопожатия
+    start_count, start_time = received, time.perf_counter()
+    await asyncio.sleep(duration)
+    rate = (received - start_count) / (time.perf_counter() - start_time)
+    current, peak = tracemalloc.get_traced_memory()
+    rss = rss_mb() - rss_before
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if stop:
+        await stop()
+    tracemalloc.stop()
+    return rate, current / 1024 / 1024, peak / 1024 / 1024, rss
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--rate", type=float, default=10, help="кадров в секунду на поток (0 - без ограничения)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(port_queue, args.rate or None), daemon=True)
+    server.start()
+    base_url = f"ws://127.0.0.1:{port_queue.get()}"
+    codes = register_synthetic_pairs(args.pairs)
+
+    print(f"{args.pairs} pairs, {args.duration:.0f}s, {args.rate or 'max'} frames/s per stream")
+    print(f"{'mode':<12}{'msg/s':>12}{'heap MB':>10}{'peak MB':>10}{'RSS +MB':>10}")
+    for mode in ("separate", "multiplexed"):
+        rate, current, peak, rss = asyncio.run(measure(mode, codes, base_url, args.duration))
+        print(f"{mode:<12}{rate:>12,.0f}{current:>10.2f}{peak:>10.2f}{rss:>10.2f}")
+
+    server.terminate()
+
+if __name__ == "__main__":
+    main()
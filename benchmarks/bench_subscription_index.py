@@ -0,0 +1,60 @@
+# benchmarks/bench_subscription_index.py
+"""
+Поиск подписчиков и статистика: полный проход по active_users против обратного индекса.
+
+Запуск: python -m benchmarks.bench_subscription_index --users 100000
+"""
+import argparse
+import random
+import timeit
+from config import SUPPORTED_CRYPTOS
+from services import user_service
+
+def populate(count, active_share):
+    cryptos = list(SUPPORTED_CRYPTOS)
+    random.seed(1)
+    for chat_id in range(count):
+        user_service.set_crypto(chat_id, random.choice(cryptos))
+        if random.random() < active_share:
+            user_service.activate_user(chat_id)
+
+def scan_fanout(crypto):
+    return [chat_id for chat_id, data in user_service.active_users.items()
+            if data.active and data.crypto == crypto]
+
+def index_fanout(crypto):
+    return list(user_service.get_subscribers(crypto))
+
+def scan_stats():
+    active = len([u for u in user_service.active_users.values() if u.active])
+    per_crypto = {}
+    for user_data in user_service.active_users.values():
+        if user_data.active:
+            per_crypto[user_data.crypto] = per_crypto.get(user_data.crypto, 0) + 1
+    return active, per_crypto
+
+def index_stats():
+    return user_service.get_active_count(), user_service.get_crypto_counts()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--active-share", type=float, default=0.3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    populate(args.users, args.active_share)
+    assert sorted(scan_fanout("BTC")) == sorted(index_fanout("BTC"))
+    assert scan_stats() == index_stats()
+
+    print(f"{args.users:,} users, {user_service.get_active_count():,} active")
+    print(f"{'operation':<28}{'scan ms':>10}{'index ms':>10}")
+    for name, scan, index in (("fan-out list (BTC)", lambda: scan_fanout("BTC"), lambda: index_fanout("BTC")),
+                              ("/admin_stats counters", scan_stats, index_stats),
+                              ("/status active count", lambda: scan_stats()[0], user_service.get_active_count)):
+        scan_ms = min(timeit.repeat(scan, number=1, repeat=args.repeat)) * 1000
+        index_ms = min(timeit.repeat(index, number=1, repeat=args.repeat)) * 1000
+        print(f"{name:<28}{scan_ms:>10.3f}{index_ms:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_tick_log.py
+"""
+Лог тиков (services/tick_log_service.py): цена записи кадров из чтения сокета,
+размер файла, чтение через mmap и проигрывание вместо WebSocket Binance.
+
+Отчет: мкс на record() в горячем пути и байт на кадр против JSON Lines; кадров в
+секунду при чтении лога, заполнении истории (backfill_history) и проигрывании
+ReplayStreamManager на максимальной скорости через update_price и обработчики тиков;
+точность темпа: время проигрывания записи с ускорением --speed против ожидаемого.
+
+Запуск: python -m benchmarks.bench_tick_log --frames 200000 --speed 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from config import SUPPORTED_CRYPTOS
+from services.crypto_service import ReplayStreamManager, stream_name, add_price_listener
+from services.history_service import record_tick
+from services.executor_service import shutdown_executors
+from services.tick_log_service import TickRecorder, read_tick_log, backfill_history
+from benchmarks.fake_binance import stream_frame
+
+def build_messages(frames):
+    """Сообщения combined stream по всем включенным парам, как их присылает Binance"""
+    streams = [stream_name(crypto) for crypto in SUPPORTED_CRYPTOS]
+    prices = {stream: random.uniform(1, 50000) for stream in streams}
+    messages = []
+    for i in range(frames):
+        stream = streams[i % len(streams)]
+        prices[stream] *= random.uniform(0.999, 1.001)
+        messages.append(json.dumps({"stream": stream, "data": stream_frame(stream, prices[stream])}, separators=(",", ":")))
+    return messages
+
+async def write_log(path, messages, rate, started_at):
+    """Запись лога с интервалом 1/rate секунд между кадрами, блок на секунду записи, как при
+    TICK_RECORD_FLUSH_INTERVAL = 1; (мкс на record(), размер файла)"""
+    recorder = TickRecorder(path)
+    block = max(1, int(rate))
+    elapsed = 0.0
+    for i, message in enumerate(messages):
+        t = time.perf_counter()
+        recorder.record(started_at + i / rate, message)
+        elapsed += time.perf_counter() - t
+        if (i + 1) % block == 0:
+            await recorder.flush()
+    await recorder.flush()
+    return elapsed / len(messages) * 1e6, os.path.getsize(path)
+
+async def replay(path, speed):
+    """(кадров передано в update_price, секунд на проигрывание)"""
+    manager = ReplayStreamManager(lambda crypto: None, path, speed=speed, loop=False)
+    for crypto in SUPPORTED_CRYPTOS:
+        manager.subscribe(crypto, pinned=True)
+    started = time.perf_counter()
+    manager.start()
+    await manager._task
+    elapsed = time.perf_counter() - started
+    await manager.stop()
+    return manager.frames, elapsed
+
+async def run(args):
+    random.seed(1)
+    messages = build_messages(args.frames)
+    jsonl_bytes = sum(len(message.encode()) + 1 for message in messages)
+    add_price_listener(record_tick)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "ticks.bin")
+        started_at = time.time() - args.frames / args.rate
+        record_us, size = await write_log(path, messages, args.rate, started_at)
+        print(f"{args.frames:,} frames, {len(SUPPORTED_CRYPTOS)} pairs")
+        print(f"{'record() in read loop':<36}{record_us:>10.2f} µs/frame")
+        print(f"{'tick log size':<36}{size / args.frames:>10.1f} B/frame ({size / 2**20:.1f} MiB)")
+        print(f"{'JSON Lines size':<36}{jsonl_bytes / args.frames:>10.1f} B/frame")
+
+        started = time.perf_counter()
+        count = sum(1 for _ in read_tick_log(path))
+        print(f"{'read via mmap':<36}{count / (time.perf_counter() - started):>10,.0f} frames/s")
+
+        started = time.perf_counter()
+        _, count = backfill_history(path)
+        print(f"{'backfill_history':<36}{count / (time.perf_counter() - started):>10,.0f} frames/s")
+
+        # Заголовки блоков: записи старше since пропускаются без распаковки
+        cutoff = started_at + args.frames / args.rate * 0.9
+        started = time.perf_counter()
+        _, count = backfill_history(path, since=cutoff)
+        print(f"{'backfill_history, newest 10%':<36}{(time.perf_counter() - started) * 1000:>10.1f} ms ({count:,} frames)")
+
+        frames, elapsed = await replay(path, speed=0)
+        print(f"{'replay, max speed':<36}{frames / elapsed:>10,.0f} frames/s")
+
+        paced = os.path.join(workdir, "paced.bin")
+        await write_log(paced, messages[:args.pace_frames], args.rate, time.time())
+        expected = (args.pace_frames - 1) / args.rate / args.speed
+        frames, elapsed = await replay(paced, speed=args.speed)
+        print(f"{f'replay at {args.speed:g}x':<36}{elapsed:>10.2f} s (recorded {(args.pace_frames - 1) / args.rate:.0f} s, "
+              f"expected {expected:.2f} s, {frames:,} frames)")
+    shutdown_executors()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=200_000)
+    parser.add_argument("--rate", type=float, default=50, help="кадров в секунду в записи")
+    parser.add_argument("--speed", type=float, default=20, help="ускорение для проверки темпа")
+    parser.add_argument("--pace-frames", type=int, default=3000, help="кадров в записи для проверки темпа")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
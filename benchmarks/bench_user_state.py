@@ -0,0 +1,61 @@
+# benchmarks/bench_user_state.py
+"""
+Память и скорость доступа: пользователи в виде словарей против UserState (__slots__).
+
+Запуск: python -m benchmarks.bench_user_state --users 500000
+"""
+import argparse
+import random
+import timeit
+import tracemalloc
+from config import SUPPORTED_CRYPTOS
+from services.user_service import UserState
+
+def make_dict_users(count, cryptos):
+    random.seed(1)
+    users = {}
+    for chat_id in range(count):
+        portfolio = {random.choice(cryptos): 1.5} if random.random() < 0.1 else {}
+        # Код криптовалюты приходит из JSON отдельной строкой, как при загрузке файла
+        users[chat_id] = {"message_id": None, "active": random.random() < 0.3,
+                          "crypto": "".join(random.choice(cryptos)), "last_price": None,
+                          "portfolio": portfolio}
+    return users
+
+def make_slotted_users(count, cryptos):
+    random.seed(1)
+    users = {}
+    for chat_id in range(count):
+        portfolio = {random.choice(cryptos): 1.5} if random.random() < 0.1 else None
+        users[chat_id] = UserState(crypto="".join(random.choice(cryptos)), active=random.random() < 0.3,
+                                   portfolio=portfolio)
+    return users
+
+def measure(factory, count, cryptos):
+    tracemalloc.start()
+    users = factory(count, cryptos)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return users, size / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500_000)
+    args = parser.parse_args()
+    cryptos = list(SUPPORTED_CRYPTOS)
+
+    dict_users, dict_mb = measure(make_dict_users, args.users, cryptos)
+    slotted_users, slotted_mb = measure(make_slotted_users, args.users, cryptos)
+
+    dict_time = min(timeit.repeat(lambda: [u["crypto"] for u in dict_users.values() if u.get("active")],
+                                  number=1, repeat=5))
+    slotted_time = min(timeit.repeat(lambda: [u.crypto for u in slotted_users.values() if u.active],
+                                     number=1, repeat=5))
+
+    print(f"{args.users:,} users")
+    print(f"{'form':<10}{'MB':>10}{'B/user':>10}{'scan ms':>10}")
+    print(f"{'dict':<10}{dict_mb:>10.1f}{dict_mb * 1024 * 1024 / args.users:>10.0f}{dict_time * 1000:>10.1f}")
+    print(f"{'slotted':<10}{slotted_mb:>10.1f}{slotted_mb * 1024 * 1024 / args.users:>10.0f}{slotted_time * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# benchmarks/bench_webhook.py
+"""
+Задержка обработки команд при long polling и через вебхук: одни и те же записанные
+Update проигрываются с заданной частотой, измеряется время от появления обновления
+на стороне Telegram до вызова ответа ботом (p50/p99).
+
+Сетевая задержка Telegram <-> бот моделируется параметром --network-latency (в одну
+сторону). Записанные обновления можно передать файлом JSON Lines (--updates); chat_id
+в них переназначаются, чтобы сопоставлять ответы с обновлениями.
+
+Запуск: python -m benchmarks.bench_webhook --updates-count 2000 --rate 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+import aiohttp
+from aiohttp import web
+from aiogram import Bot
+from aiogram.methods import GetMe, GetUpdates
+from aiogram.types import Update, User
+from config import SUPPORTED_CRYPTOS, WEBHOOK_PATH
+from main import create_dispatcher
+from services.crypto_service import price_data
+from services.webhook_service import create_webhook_app
+from benchmarks.fake_telegram import FakeSession
+from benchmarks.bench_delivery import percentile
+
+COMMANDS = ["/checkCrypto", "/checkCrypto ETH", "/portfolio", "/alert_list", "/history", "/start"]
+SECRET = "bench-secret"
+
+def recorded_updates(count, path=None):
+    """Записанные обновления из файла или синтетические сообщения с командами"""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            source = [json.loads(line) for line in f if line.strip()]
+    else:
+        source = [{"message": {"text": random.choice(COMMANDS)}} for _ in range(count)]
+
+    updates = []
+    for i in range(count):
+        message = dict(source[i % len(source)].get("message") or {"text": "/start"})
+        chat_id = 10_000_000 + i
+        command = message.get("text", "").split()[0]
+        message.update({
+            "message_id": i + 1,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": "Bench"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(command)}],
+        })
+        updates.append({"update_id": i + 1, "message": message})
+    return updates
+
+class PollingSession(FakeSession):
+    """Фейковый Bot API с long polling: getUpdates ждет появления обновлений"""
+
+    def __init__(self, network_latency):
+        super().__init__(latency=0)
+        self.network_latency = network_latency
+        self.pending = asyncio.Queue()
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, GetMe):
+            return User(id=1, is_bot=True, first_name="Bench", username="bench_bot")
+        if isinstance(method, GetUpdates):
+            await asyncio.sleep(self.network_latency)  # запрос идет до Telegram
+            updates = [await self.pending.get()]
+            while not self.pending.empty():
+                updates.append(self.pending.get_nowait())
+            await asyncio.sleep(self.network_latency)  # ответ идет обратно
+            return [Update.model_validate(update, context={"bot": bot}) for update in updates]
+        return await super().make_request(bot, method, timeout)
+
+def reply_latencies(session, injected):
+    replied = {}
+    for called, _, chat_id in session.calls:
+        replied.setdefault(chat_id, called)
+    return [replied[chat_id] - started for chat_id, started in injected.items() if chat_id in replied]
+
+async def replay(updates, rate, deliver):
+    """Проигрывание обновлений с частотой rate; возвращает {chat_id: время появления}"""
+    injected = {}
+    started = time.monotonic()
+    for i, update in enumerate(updates):
+        delay = started + i / rate - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        injected[update["message"]["chat"]["id"]] = time.monotonic()
+        deliver(update)
+    return injected
+
+async def run_polling(dp, updates, args):
+    session = PollingSession(args.network_latency)
+    bot = Bot(token="123456:TEST", session=session)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False))
+    injected = await replay(updates, args.rate, session.pending.put_nowait)
+    await asyncio.sleep(1)
+    await dp.stop_polling()
+    await asyncio.gather(polling, return_exceptions=True)
+    return reply_latencies(session, injected)
+
+async def run_webhook(dp, updates, args):
+    session = FakeSession(latency=0)
+    bot = Bot(token="123456:TEST", session=session)
+    app = create_webhook_app(dp, bot, secret_token=SECRET)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    # Как и Telegram, клиент держит keep-alive соединения (до max_connections)
+    client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=40))
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    requests = set()
+
+    async def post(update):
+        await asyncio.sleep(args.network_latency)
+        async with client.post(f"http://127.0.0.1:{port}{WEBHOOK_PATH}", json=update, headers=headers) as response:
+            assert response.status == 200, response.status
+
+    def deliver(update):
+        task = asyncio.create_task(post(update))
+        requests.add(task)
+        task.add_done_callback(requests.discard)
+
+    injected = await replay(updates, args.rate, deliver)
+    await asyncio.gather(*requests)
+    await asyncio.sleep(1)
+    await client.close()
+    await runner.cleanup()
+    return reply_latencies(session, injected)
+
+def report(name, latencies, total):
+    print(f"{name:>8}{len(latencies):>10,}/{total:<8,}"
+          f"{statistics.median(latencies) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates-count", type=int, default=2000)
+    parser.add_argument("--updates", help="файл JSON Lines с записанными Update")
+    parser.add_argument("--rate", type=float, default=200, help="обновлений в секунду")
+    parser.add_argument("--network-latency", type=float, default=0.02, help="задержка сети в одну сторону, сек")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    for crypto in SUPPORTED_CRYPTOS:
+        price_data[crypto]["price"] = random.uniform(1, 50000)
+        price_data[crypto]["last_update"] = time.time()
+
+    print(f"{args.updates_count:,} updates at {args.rate:.0f}/s, network latency {args.network_latency * 1000:.0f} ms")
+    print(f"{'mode':>8}{'replied':>19}{'p50 ms':>10}{'p99 ms':>10}")
+    dp = create_dispatcher()  # роутеры модульные, диспетчер один на процесс
+    for name, scenario in (("polling", run_polling), ("webhook", run_webhook)):
+        updates = recorded_updates(args.updates_count, args.updates)
+        report(name, asyncio.run(scenario(dp, updates, args)), len(updates))
+
+if __name__ == "__main__":
+    main()
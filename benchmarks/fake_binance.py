@@ -0,0 +1,146 @@
+# benchmarks/fake_binance.py
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import defaultdict
+from urllib.parse import urlparse, parse_qs
+import websockets
+from services.tick_log_service import MAGIC, read_tick_log
+
+def ticker_frame(pair, price):
+    """Кадр 24hr-тикера в формате Binance (@ticker)"""
+    now = int(time.time() * 1000)
+    return {
+        "e": "24hrTicker", "E": now, "s": pair.upper(),
+        "p": "12.30", "P": "0.021", "w": f"{price:.2f}", "x": f"{price:.2f}",
+        "c": f"{price:.2f}", "Q": "0.01", "b": f"{price - 0.01:.2f}", "B": "1.5",
+        "a": f"{price + 0.01:.2f}", "A": "2.1", "o": f"{price * 0.99:.2f}",
+        "h": f"{price * 1.01:.2f}", "l": f"{price * 0.98:.2f}", "v": "1234.5",
+        "q": "56789012.3", "O": now - 86400000, "C": now, "F": 1, "L": 100000, "n": 100000
+    }
+
+def mini_ticker_frame(pair, price):
+    """Кадр @miniTicker"""
+    now = int(time.time() * 1000)
+    return {
+        "e": "24hrMiniTicker", "E": now, "s": pair.upper(), "c": f"{price:.2f}",
+        "o": f"{price * 0.99:.2f}", "h": f"{price * 1.01:.2f}", "l": f"{price * 0.98:.2f}",
+        "v": "1234.5", "q": "56789012.3"
+    }
+
+def book_ticker_frame(pair, price):
+    """Кадр @bookTicker (лучшие bid/ask)"""
+    return {"u": 400900217, "s": pair.upper(), "b": f"{price - 0.01:.2f}", "B": "1.5",
+            "a": f"{price + 0.01:.2f}", "A": "2.1"}
+
+FRAME_BUILDERS = {"ticker": ticker_frame, "miniTicker": mini_ticker_frame, "bookTicker": book_ticker_frame}
+
+def stream_frame(stream, price):
+    """Кадр для потока вида btceur@ticker / btceur@miniTicker / btceur@bookTicker"""
+    pair, _, kind = stream.partition("@")
+    return FRAME_BUILDERS.get(kind, ticker_frame)(pair, price)
+
+def load_recorded_frames(path):
+    """Записанные сообщения combined stream по потокам: JSON Lines ({"stream", "data"} на строку)
+    или лог тиков TICK_RECORD_FILE"""
+    frames = defaultdict(list)
+
+    def add(message):
+        payload = json.loads(message)
+        frames[payload["stream"]].append(payload["data"])
+
+    with open(path, "rb") as f:
+        binary = f.read(len(MAGIC)) == MAGIC
+    if binary:
+        for _, message in read_tick_log(path):
+            add(message)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    add(line)
+    return frames
+
+class FakeBinanceServer:
+    """Локальный WebSocket-сервер, имитирующий /ws/<stream> и /stream?streams=...
+
+    replay - записанные кадры {поток: [data]}, проигрываются по кругу; потоки без записи
+    синтезируются. С track_latency время отправки каждой цены запоминается в sent_at
+    {(КОД, "12,345.67"): time.time()} для измерения сквозной задержки.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, rate=None, replay=None, track_latency=False):
+        self.host = host
+        self.port = port
+        self.rate = rate  # кадров в секунду на поток; None - максимально быстро
+        self.replay = replay or {}
+        self.track_latency = track_latency
+        self.sent_at = {}
+        self.frames_sent = 0
+        self.paused = False  # True - соединения остаются открытыми, но кадры не идут (зависание)
+        self.server = None
+        self.connections = 0
+
+    async def start(self):
+        self.server = await websockets.serve(self._handle, self.host, self.port, max_queue=None)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def _handle(self, websocket):
+        self.connections += 1
+        parsed = urlparse(websocket.path)
+        if parsed.path.startswith("/ws/"):
+            streams = {parsed.path[len("/ws/"):]}
+            combined = False
+        else:
+            streams = set(parse_qs(parsed.query).get("streams", [""])[0].split("/")) - {""}
+            combined = True
+
+        reader = asyncio.create_task(self._read_control(websocket, streams))
+        prices = {}
+        recorded = {stream: itertools.cycle(frames) for stream, frames in self.replay.items()}
+        delay = 1 / self.rate if self.rate else 0
+        try:
+            while True:
+                if self.paused:
+                    if websocket.closed:
+                        break
+                    await asyncio.sleep(0.1)
+                    continue
+                for stream in list(streams):
+                    pair = stream.split("@")[0]
+                    if stream in recorded:
+                        frame = next(recorded[stream])
+                    else:
+                        price = prices.get(pair, random.uniform(1, 50000)) * random.uniform(0.999, 1.001)
+                        prices[pair] = price
+                        frame = stream_frame(stream, price)
+                    if self.track_latency and "c" in frame:
+                        self.sent_at[(pair[:-3].upper(), f"{float(frame['c']):,.2f}")] = time.time()
+                    await websocket.send(json.dumps({"stream": stream, "data": frame} if combined else frame))
+                    self.frames_sent += 1
+                await asyncio.sleep(delay)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            reader.cancel()
+
+    async def _read_control(self, websocket, streams):
+        """Обработка SUBSCRIBE/UNSUBSCRIBE от клиента"""
+        async for message in websocket:
+            request = json.loads(message)
+            if request.get("method") == "SUBSCRIBE":
+                streams.update(request["params"])
+            elif request.get("method") == "UNSUBSCRIBE":
+                streams.difference_update(request["params"])
+            await websocket.send(json.dumps({"result": None, "id": request.get("id")}))
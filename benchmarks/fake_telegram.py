@@ -0,0 +1,121 @@
+# benchmarks/fake_telegram.py
+import asyncio
+import random
+import re
+import time
+from datetime import datetime
+from aiohttp import web
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage, EditMessageText
+from aiogram.types import Chat, Message
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети: записывает вызовы, добавляет задержку и 429"""
+
+    def __init__(self, latency=0.02, retry_after_rate=0.0, retry_after=1):
+        super().__init__()
+        self.latency = latency
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.calls = []  # (время, метод, chat_id)
+        self.first_poll = None  # время первого getUpdates: бот начал принимать команды
+        self.retry_after_count = 0
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        await asyncio.sleep(self.latency)
+        chat_id = getattr(method, "chat_id", None)
+        if self.retry_after_rate and random.random() < self.retry_after_rate:
+            self.retry_after_count += 1
+            raise TelegramRetryAfter(method=method, message="Too Many Requests", retry_after=self.retry_after)
+        self.calls.append((time.monotonic(), type(method).__name__, chat_id))
+        if isinstance(method, (SendMessage, EditMessageText)):
+            self._message_id += 1
+            return Message(message_id=getattr(method, "message_id", None) or self._message_id,
+                           date=datetime.now(), chat=Chat(id=chat_id, type="private"), text=method.text)
+        return True
+
+    async def close(self):
+        pass
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b""
+
+class FakeTelegramServer:
+    """HTTP-сервер, имитирующий Bot API (/bot<token>/<method>) для запуска настоящего main.py
+
+    Записывает вызовы, добавляет задержку и ответы 429. С binance (FakeBinanceServer с
+    track_latency) для каждой правки считается сквозная задержка от отправки тика.
+    """
+
+    PRICE_PATTERN = re.compile(r"<b>(\w+)/EUR</b>: €([\d,]+\.\d\d)")
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, retry_after_rate=0.0, retry_after=1, binance=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.retry_after_rate = retry_after_rate
+        self.retry_after = retry_after
+        self.binance = binance
+        self.calls = []  # (время, метод, chat_id)
+        self.first_poll = None  # время первого getUpdates: бот начал принимать команды
+        self.latencies = []  # сквозные задержки тик -> правка, сек
+        self.retry_after_count = 0
+        self._message_id = 0
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def _handle(self, request):
+        method = request.match_info["method"]
+        params = await request.post()
+        if method == "getUpdates":
+            if self.first_poll is None:
+                self.first_poll = time.monotonic()
+            # Long polling без входящих обновлений
+            await asyncio.sleep(min(float(params.get("timeout", 0)), 1))
+            return web.json_response({"ok": True, "result": []})
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}})
+
+        await asyncio.sleep(self.latency)
+        chat_id = int(params["chat_id"]) if "chat_id" in params else None
+        if chat_id is not None and self.retry_after_rate and random.random() < self.retry_after_rate:
+            self.retry_after_count += 1
+            return web.json_response({"ok": False, "error_code": 429,
+                                      "description": f"Too Many Requests: retry after {self.retry_after}",
+                                      "parameters": {"retry_after": self.retry_after}}, status=429)
+
+        now = time.time()
+        self.calls.append((time.monotonic(), method, chat_id))
+        if method not in ("sendMessage", "editMessageText"):
+            return web.json_response({"ok": True, "result": True})
+
+        text = params.get("text", "")
+        if self.binance is not None:
+            match = self.PRICE_PATTERN.search(text)
+            sent = match and self.binance.sent_at.get(match.groups())
+            if sent:
+                self.latencies.append(now - sent)
+        self._message_id += 1
+        message_id = int(params.get("message_id") or self._message_id)
+        return web.json_response({"ok": True, "result": {
+            "message_id": message_id, "date": int(now), "text": text,
+            "chat": {"id": chat_id, "type": "private"},
+        }})
@@ -6,9 +6,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TOKEN = getenv("BOT_TOKEN")
+TELEGRAM_API_URL = getenv("TELEGRAM_API_URL", "")  # свой Bot API сервер вместо https://api.telegram.org
 ADMIN_ID = getenv("ADMIN_ID", "0")
 
-# Поддерживаемые криптовалюты
+# Включенные криптовалюты: {код: {"name", "symbol", "pair"}}
+# Реестр пар (services/symbol_service.py) заполняет словарь на месте при старте и при
+# включении/выключении пар администратором; здесь - набор по умолчанию и отображаемые имена
 SUPPORTED_CRYPTOS = {
     "BTC": {"name": "Bitcoin", "symbol": "₿", "pair": "btceur"},
     "ETH": {"name": "Ethereum", "symbol": "Ξ", "pair": "etheur"},
@@ -16,7 +19,128 @@ SUPPORTED_CRYPTOS = {
     "XRP": {"name": "XRP", "symbol": "✕", "pair": "xrpeur"}
 }
 
+# Каталог пар: кэшированный снимок Binance exchangeInfo и сохраненный список включенных пар
+QUOTE_ASSET = "EUR"
+EXCHANGE_INFO_FILE = getenv("EXCHANGE_INFO_FILE", "data/exchange_info.json")  # кэш, обновляется с Binance
+EXCHANGE_INFO_FALLBACK = "data/exchange_info.sample.json"  # локальная заглушка, если кэша нет
+EXCHANGE_INFO_MAX_AGE = float(getenv("EXCHANGE_INFO_MAX_AGE", str(24 * 3600)))  # 0 - не обращаться к Binance
+ENABLED_CRYPTOS_FILE = getenv("ENABLED_CRYPTOS_FILE", "data/enabled_cryptos.json")
+
+# Валюты отображения цен (/currency): {код: (знак, пара Binance с CONVERSION_HUB или None для самого хаба)}
+# Потоки монет идут только в QUOTE_ASSET, цены в остальных валютах выводятся через курсы
+# к хабу: потоков столько, сколько монет плюс валют, а не монет × валют
+CONVERSION_HUB = "USDT"
+CURRENCIES = {
+    "EUR": ("€", "EURUSDT"),
+    "USD": ("$", "USDCUSDT"),  # доллар по курсу USDC
+    "USDT": ("₮", None),
+    "GBP": ("£", "GBPUSDT"),
+    "TRY": ("₺", "USDTTRY"),
+    "BRL": ("R$", "USDTBRL"),
+}
+
 # Константы
-USERS_DATA_FILE = "data/users_data.json"
+USERS_DATA_FILE = "data/users_data.json"  # старый формат, импортируется при первом запуске
+USERS_DB_FILE = getenv("USERS_DB_FILE", "data/users.db")
+SAVE_DEBOUNCE_DELAY = 2  # секунды между пакетными записями изменений
+USERS_DB_MMAP_SIZE = 256 * 1024 * 1024  # байт базы, читаемых через mmap
+# Старт: пользователи читаются пакетами в фоне, пока бот уже принимает команды и цены,
+# а подключение живых сообщений к рассылке растягивается на RESTORE_RAMP_SECONDS
+USERS_LOAD_BATCH = 2000
+RESTORE_RAMP_SECONDS = float(getenv("RESTORE_RAMP_SECONDS", "30"))  # 0 - все сразу
+RESTORE_STEP = 0.1  # секунды между порциями подключаемых пользователей
 RECONNECTION_DELAY = 5
 UPDATE_FREQUENCY_LIMIT = 1  # секунда между обновлениями
+PORTFOLIO_LIVE_INTERVAL = 5  # минимум секунд между правками живого портфеля одного пользователя
+MAX_ALERTS_PER_USER = 20
+CRYPTO_LIST_LIMIT = 20  # пар в списках /start и /select_crypto; остальные доступны через /select
+KEYBOARD_PAGE_SIZE = 12  # кнопок монет на странице inline-клавиатуры
+KEYBOARD_ROW_WIDTH = 3
+# Команды чтения, ответы на которые кэшируются и повторы которых сворачиваются
+HOT_READ_COMMANDS = ("checkCrypto", "status", "portfolio", "admin_stats")
+RESPONSE_CACHE_TTL = 2  # секунд жизни отрендеренного ответа (тик или изменение пользователя сбрасывают раньше)
+COMMAND_DEBOUNCE_WINDOW = 1  # секунд, в течение которых повтор той же команды из чата не обрабатывается
+
+# История цен: размер буфера тиков и интервалы свечей {название: (секунды, число свечей)}
+TICK_HISTORY_SIZE = 1024
+CANDLE_INTERVALS = {
+    "1m": (60, 1440),   # сутки
+    "5m": (300, 2016),  # неделя
+    "1h": (3600, 720),  # 30 дней
+}
+
+# Пороги правок сообщения с ценой: изменение в €, в % и минимальный интервал (сек)
+# Пользователь может переопределить их командой /threshold
+DEFAULT_EDIT_THRESHOLD = {"absolute": 0.01, "percent": 0.0, "interval": 0}
+CRYPTO_EDIT_THRESHOLDS = {
+    "BTC": {"percent": 0.01},
+    "ETH": {"percent": 0.01},
+}
+
+# WebSocket Binance
+BINANCE_WS_BASE = getenv("BINANCE_WS_BASE", "wss://stream.binance.com:9443")
+STREAMS_PER_CONNECTION = 200  # Binance допускает до 1024 потоков на одно соединение
+SUBSCRIPTION_FLUSH_INTERVAL = 0.25  # не чаще 5 управляющих сообщений в секунду на соединение
+STREAM_ON_DEMAND = False  # True - подписываться только на пары, выбранные пользователями
+# Устойчивость соединений: backoff с джиттером, сторожевые таймеры и резервные источники
+RECONNECT_BACKOFF_BASE = 1  # секунды; задержка растет как base * 2^n, но не больше max
+RECONNECT_BACKOFF_MAX = 60
+CONNECTION_STALE_AFTER = 15  # секунд без кадров - соединение считается зависшим
+STREAM_STALE_AFTER = 60  # секунд без обновления пары - поток переподписывается, цена помечается устаревшей
+CONNECTION_MAX_AGE = 23.5 * 3600  # Binance разрывает соединения через 24 часа - переподключаемся заранее
+WATCHDOG_INTERVAL = 1
+BINANCE_WS_FALLBACKS = [url for url in getenv("BINANCE_WS_FALLBACKS", "wss://data-stream.binance.vision").split(",") if url]
+ENDPOINT_FAILOVER_AFTER = 3  # неудачных подключений подряд до переключения на следующий адрес
+BINANCE_REST_BASE = getenv("BINANCE_REST_BASE", "https://api.binance.com")
+REST_SNAPSHOT_INTERVAL = 10  # секунды между REST-снимками цен пар без живого потока
+REST_TIMEOUT = 5
+
+# Лог тиков (services/tick_log_service.py): запись сырых кадров Binance на диск и их
+# проигрывание вместо WebSocket для нагрузочных тестов и разбора инцидентов
+TICK_RECORD_FILE = getenv("TICK_RECORD_FILE", "")  # пусто - не записывать
+TICK_RECORD_FLUSH_INTERVAL = 1  # секунды между пакетными записями на диск
+TICK_REPLAY_FILE = getenv("TICK_REPLAY_FILE", "")  # задан - цены читаются из лога, а не из Binance
+TICK_REPLAY_SPEED = float(getenv("TICK_REPLAY_SPEED", "1"))  # множитель скорости записи; 0 - максимально быстро
+TICK_REPLAY_LOOP = getenv("TICK_REPLAY_LOOP", "0") == "1"  # проигрывать лог по кругу
+
+# Тип потока: "ticker" (24hr, ~20 полей), "miniTicker" (легче, та же цена "c")
+# или "bookTicker" (лучшие bid/ask, цена - середина спреда)
+TICKER_STREAM = getenv("TICKER_STREAM", "ticker")
+# Декодер кадров: "auto" (msgspec, затем orjson, затем разбор по полям), "msgspec", "orjson", "fields", "json"
+JSON_DECODER = getenv("JSON_DECODER", "auto")
+
+# Лимиты Telegram Bot API и очередь исходящих сообщений
+TELEGRAM_GLOBAL_RATE = float(getenv("TELEGRAM_GLOBAL_RATE", "30"))  # сообщений в секунду на бота
+TELEGRAM_GLOBAL_BURST = 1  # без запаса токенов: за любую секунду не больше лимита (плюс один запрос)
+TELEGRAM_CHAT_RATE = 1  # сообщений в секунду в один чат
+TELEGRAM_CHAT_BURST = 3
+DELIVERY_WORKERS = 8
+DELIVERY_QUEUE_SIZE = 100_000
+DELIVERY_MAX_RETRIES = 3
+
+# Многопроцессный режим (launcher.py): канал тиков между процессом приема и воркерами доставки
+TICK_SOCKET_PATH = getenv("TICK_SOCKET_PATH", "data/ticks.sock")
+BROKER_CLIENT_BUFFER = 4 * 1024 * 1024  # байт в буфере отправки, после которых события воркеру отбрасываются
+
+# Прием обновлений: "polling" (getUpdates) или "webhook" (aiohttp-сервер)
+UPDATE_MODE = getenv("UPDATE_MODE", "polling")
+WEBHOOK_URL = getenv("WEBHOOK_URL", "")  # публичный адрес, например https://bot.example.com/webhook
+WEBHOOK_PATH = getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = getenv("WEBHOOK_SECRET", "")  # X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_HOST = getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_MAX_CONNECTIONS = 40  # параллельных соединений со стороны Telegram
+WEBHOOK_KEEPALIVE = 75  # секунд держать простаивающее соединение открытым
+WEBHOOK_SOCKET_DIR = getenv("WEBHOOK_SOCKET_DIR", "data")  # внутренние сокеты воркеров вебхука
+
+# Метрики: локальный HTTP /metrics (0 - отключить) и период замера задержки event loop
+METRICS_HOST = getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(getenv("METRICS_PORT", "9100"))
+LOOP_LAG_INTERVAL = 0.5
+# Сторож event loop: блокировка дольше порога (сек) логируется со стеком блокирующего кода; 0 - выключить
+LOOP_STALL_THRESHOLD = float(getenv("LOOP_STALL_THRESHOLD", "0.1"))
+
+# Пулы для блокирующей работы (services/executor_service.py): потоки - для SQLite и файлов,
+# процессы - для тяжелых отчетов (0 - отчеты считаются в пуле потоков)
+IO_EXECUTOR_WORKERS = 4
+CPU_EXECUTOR_WORKERS = int(getenv("CPU_EXECUTOR_WORKERS", "0"))
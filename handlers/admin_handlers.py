@@ -3,78 +3,209 @@ from aiogram import Router, html
 from aiogram.filters import Command
 from aiogram.types import Message
 from aiogram.enums import ParseMode
-from config import SUPPORTED_CRYPTOS, ADMIN_ID
-from services.user_service import active_users
-from services.crypto_service import price_data
+from config import SUPPORTED_CRYPTOS, ADMIN_ID, CRYPTO_LIST_LIMIT
+from services import user_service
+from services.user_service import active_users, get_user, get_active_count, get_crypto_counts, startup_stats
+from services import crypto_service
+from services.crypto_service import price_data, price_age, is_stale
+from services.symbol_service import symbol_registry, crypto_info
+from services.render_service import render_price_text
+from services.suppression_service import edit_stats
+from services.portfolio_service import portfolio_matrix, portfolio_report
+from services.executor_service import run_io, run_cpu
+from services.response_service import response_cache, response_stats
+from services import metrics_service as metrics
 from datetime import datetime
+import time
 
 router = Router()
 
-@router.message(Command('admin_stats'))
-async def admin_stats_handler(message: Message) -> None:
-    """Административная команда для просмотра статистики"""
-    if str(message.from_user.id) != ADMIN_ID:
-        await message.answer("❌ Недостаточно прав доступа.")
-        return
-    
+def _quantile_ms(histogram, q):
+    """Квантиль гистограммы для вывода (верхняя граница корзины)"""
+    value = histogram.quantile(q)
+    if value is None:
+        return "—"
+    if value == float("inf"):
+        return f">{histogram.buckets[-1]:g} с"
+    return f"≤{value * 1000:g} мс"
+
+def _metrics_section():
+    uptime = max(1.0, time.time() - metrics.started_at)
+    lines = ["⏱ <b>Метрики:</b>"]
+    for (crypto,), ticks in metrics.ticks_total.children.items():
+        latency = metrics.tick_to_edit_seconds.labels(crypto)
+        lines.append(f"• {crypto}: {ticks.value / uptime:.1f} тик/с, тик→сообщение p50 {_quantile_ms(latency, 0.5)}, "
+                     f"p99 {_quantile_ms(latency, 0.99)}")
+
+    results = {}
+    for (method, result), count in metrics.messages_total.children.items():
+        results[result] = results.get(result, 0) + count.value
+    lines.append(f"• Сообщения: {results.get('ok', 0)} доставлено, {results.get('error', 0)} ошибок, "
+                 f"{results.get('retry_after', 0)} 429")
+    lines.append(f"• Цикл рассылки p99: {_quantile_ms(metrics.fanout_seconds, 0.99)}")
+    lines.append(f"• Запись в базу p99: {_quantile_ms(metrics.save_seconds, 0.99)}")
+    lines.append(f"• Кэш ответов: {response_stats['hit']} попаданий, {response_stats['miss']} промахов, "
+                 f"{response_stats['collapsed']} повторов свернуто")
+    reconnects = sum(counter.value for counter in metrics.ws_reconnects_total.children.values())
+    lines.append(f"• Переподключения WebSocket: {reconnects}")
+    lines.append(f"• Задержка event loop: {metrics.loop_lag_last.value * 1000:.1f} мс, "
+                 f"p99 {_quantile_ms(metrics.loop_lag_seconds, 0.99)}")
+    return "\n".join(lines) + "\n\n"
+
+def _portfolio_section(report):
+    if report is None:
+        return ""
+    total, top = report
+    lines = ["💼 <b>Портфели:</b>",
+             f"• Пользователей с портфелем: {portfolio_matrix.count()}",
+             f"• Общая стоимость: €{total:,.2f}"]
+    for place, (chat_id, value) in enumerate(top, 1):
+        lines.append(f"{place}. {chat_id}: €{value:,.2f}")
+    return "\n".join(lines) + "\n\n"
+
+def _admin_stats_text(portfolio=None):
+    """Текст /admin_stats; portfolio - готовый portfolio_report (матрица считается вне event loop)"""
     total_users = len(active_users)
-    active_count = len([u for u in active_users.values() if u["active"]])
+    active_count = get_active_count()
     inactive_count = total_users - active_count
     
-    crypto_stats = {}
-    for user_data in active_users.values():
-        if user_data["active"]:
-            crypto = user_data.get("crypto", "BTC")
-            crypto_stats[crypto] = crypto_stats.get(crypto, 0) + 1
+    crypto_stats = get_crypto_counts()
     
     crypto_breakdown = "\n".join([f"• {crypto}: {count} пользователей" for crypto, count in crypto_stats.items()])
     
-    all_connected = all(price_data[crypto]["price"] is not None for crypto in SUPPORTED_CRYPTOS)
+    all_connected = all(price_data[crypto]["price"] is not None and not is_stale(crypto) for crypto in SUPPORTED_CRYPTOS)
     connection_status = "🟢 Все подключены" if all_connected else "🟡 Частично подключены"
     
     text = f"🔧 <b>Административная панель</b>\n\n"\
            f"👥 <b>Статистика пользователей:</b>\n"\
            f"• Всего зарегистрировано: {total_users}\n"\
            f"• Активных подписок: {active_count}\n"\
-           f"• Неактивных: {inactive_count}\n\n"\
+           f"• Неактивных: {inactive_count}\n"\
+           f"• Загружено при старте: {startup_stats['loaded']}{' (идет загрузка)' if user_service.loading else ''}, "\
+           f"восстановлено живых сообщений: {startup_stats['restored']}\n\n"\
            f"📊 <b>По криптам:</b>\n{crypto_breakdown or '• Нет активных подписок'}\n\n"\
+           f"✏️ <b>Правки сообщений:</b>\n"\
+           f"• Отправлено: {edit_stats['sent']}\n"\
+           f"• Подавлено порогами: {edit_stats['suppressed']}\n\n"\
+           f"{_portfolio_section(portfolio)}"\
+           f"{_metrics_section()}"\
            f"📡 <b>WebSocket статус:</b>\n"\
            f"• Соединения: {connection_status}\n"
     
-    for crypto, data in price_data.items():
+    manager = crypto_service.stream_manager
+    for shard in manager.shards if manager else ():
+        supervisor = shard.supervisor
+        uptime = f", {time.time() - supervisor.connected_at:.0f} с" if supervisor.state == "connected" else ""
+        text += f"• #{shard.index} {supervisor.state}{uptime}: {supervisor.url}, {len(shard.streams)} потоков, "\
+                f"переподключений {supervisor.reconnects}\n"
+    
+    for crypto in list(SUPPORTED_CRYPTOS)[:CRYPTO_LIST_LIMIT]:
+        data = price_data[crypto]
         if data["price"]:
             last_update = datetime.fromtimestamp(data["last_update"]).strftime("%H:%M:%S")
-            text += f"• {crypto}: €{data['price']:,.2f} ({last_update})\n"
+            if is_stale(crypto):
+                note = f" ⚠️ устарела, {price_age(crypto):.0f} с"
+            elif data["source"] == "rest":
+                note = " (REST)"
+            else:
+                note = ""
+            text += f"• {crypto}: €{data['price']:,.2f} ({last_update}){note}\n"
         else:
             text += f"• {crypto}: Загружается...\n"
-    
+    if len(SUPPORTED_CRYPTOS) > CRYPTO_LIST_LIMIT:
+        text += f"• ...и еще {len(SUPPORTED_CRYPTOS) - CRYPTO_LIST_LIMIT} пар\n"
+    return text
+
+@router.message(Command('admin_stats'))
+async def admin_stats_handler(message: Message) -> None:
+    """Административная команда для просмотра статистики"""
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.answer("❌ Недостаточно прав доступа.")
+        return
+
+    # Панель собирается по всем парам и метрикам: повтор в пределах RESPONSE_CACHE_TTL берется из кэша
+    text = response_cache.get(message.chat.id, "admin_stats")
+    if text is None:
+        # Стоимость всех портфелей - умножение матрицы на миллионы строк, оно идет вне event loop
+        report = await run_cpu(portfolio_report, *portfolio_matrix.report_args()) if portfolio_matrix.count() else None
+        text = response_cache.put(message.chat.id, "admin_stats", _admin_stats_text(report))
     await message.answer(text, parse_mode=ParseMode.HTML)
 
+async def _set_pair_enabled(message: Message, enabled: bool) -> None:
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.answer("❌ Недостаточно прав доступа.")
+        return
+    args = message.text.split()
+    command = "admin_enable" if enabled else "admin_disable"
+    if len(args) != 2:
+        await message.answer(f"❌ Неверный формат. Используйте: /{command} [КОД]")
+        return
+
+    crypto = args[1].upper()
+    if crypto not in symbol_registry.catalogue:
+        await message.answer(f"❌ Пары {crypto}/{symbol_registry.quote} нет в каталоге Binance.")
+        return
+    changed = symbol_registry.enable(crypto) if enabled else symbol_registry.disable(crypto)
+    if not changed:
+        await message.answer(f"ℹ️ {crypto} уже {'включена' if enabled else 'выключена'}.")
+        return
+    await run_io(symbol_registry.save_enabled, codes=list(SUPPORTED_CRYPTOS))
+    await message.answer(f"✅ {crypto} {'включена: поток подключается' if enabled else 'выключена: поток закрыт'}. "
+                         f"Включено пар: {len(SUPPORTED_CRYPTOS)} из {len(symbol_registry.catalogue)}.")
+
+@router.message(Command('admin_enable'))
+async def admin_enable_handler(message: Message) -> None:
+    """Включить пару из каталога без перезапуска"""
+    await _set_pair_enabled(message, True)
+
+@router.message(Command('admin_disable'))
+async def admin_disable_handler(message: Message) -> None:
+    """Выключить пару и закрыть ее поток"""
+    await _set_pair_enabled(message, False)
+
+@router.message(Command('admin_pairs'))
+async def admin_pairs_handler(message: Message) -> None:
+    """Поиск пар в каталоге: /admin_pairs [ПРЕФИКС]"""
+    if str(message.from_user.id) != ADMIN_ID:
+        await message.answer("❌ Недостаточно прав доступа.")
+        return
+    args = message.text.split()
+    codes = symbol_registry.search(args[1] if len(args) > 1 else "", CRYPTO_LIST_LIMIT)
+    lines = "\n".join(f"• {code} ({crypto_info(code)['pair'].upper()}) {'🟢' if code in SUPPORTED_CRYPTOS else '⚪️'}"
+                      for code in codes)
+    await message.answer(f"📚 <b>Каталог пар:</b> {len(symbol_registry.catalogue)}, включено {len(SUPPORTED_CRYPTOS)}\n\n"
+                         f"{lines or 'Ничего не найдено'}", parse_mode=ParseMode.HTML)
+
 @router.message(Command('status'))
 async def status_handler(message: Message) -> None:
     """Показать статус подписок пользователя"""
     chat_id = message.chat.id
-    user_data = active_users.get(chat_id, {})
+    text = response_cache.get(chat_id, "status")
+    if text is not None:
+        await message.answer(text, parse_mode=ParseMode.HTML)
+        return
+    user_data = get_user(chat_id)
     
-    if user_data.get("active"):
+    if user_data.active:
         status = "🔔 <b>Включены</b>"
-        message_info = f"Message ID: {user_data['message_id']}" if user_data.get('message_id') else "Сообщение еще не создано"
-        user_crypto = user_data.get("crypto", "BTC")
+        message_info = f"Message ID: {user_data.message_id}" if user_data.message_id else "Сообщение еще не создано"
+        user_crypto = user_data.crypto
     else:
         status = "🔕 <b>Отключены</b>"
         message_info = "Автообновления неактивны"
-        user_crypto = user_data.get("crypto", "BTC")
+        user_crypto = user_data.crypto
     
-    crypto_info = SUPPORTED_CRYPTOS[user_crypto]
-    total_active_users = len([u for u in active_users.values() if u.get("active")])
+    info = crypto_info(user_crypto)
+    total_active_users = get_active_count()
     
-    price_info = f"💰 Цена {user_crypto}: €{price_data[user_crypto]['price']:,.2f}" if price_data[user_crypto].get('price') else f"💰 Цена {user_crypto}: Загружается..."
+    price_info = render_price_text(user_crypto, "status", user_data.currency) if price_data[user_crypto].get('price') else f"💰 Цена {user_crypto}: Загружается..."
     
     text = f"📊 <b>Статус автообновлений:</b>\n"\
            f"Ваш статус: {status}\n"\
-           f"Выбранная крипта: <b>{user_crypto}</b> ({crypto_info['name']})\n"\
+           f"Выбранная крипта: <b>{user_crypto}</b> ({info['name']})\n"\
            f"Детали: {message_info}\n\n"\
            f"👥 Всего активных пользователей: {total_active_users}\n"\
            f"{price_info}"
     
+    response_cache.put(chat_id, "status", text, (user_crypto,), user_data.currency)
     await message.answer(text, parse_mode=ParseMode.HTML)
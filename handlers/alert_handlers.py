@@ -0,0 +1,120 @@
+# handlers/alert_handlers.py
+import logging
+import math
+from aiogram import Bot, Router
+from aiogram.filters import Command
+from aiogram.types import Message
+from aiogram.enums import ParseMode
+from config import SUPPORTED_CRYPTOS, MAX_ALERTS_PER_USER
+from services.user_service import save_user, get_user, add_alert, remove_alert
+from services.crypto_service import price_data
+from services.alert_service import alert_engine, ABOVE, BELOW
+from services import delivery_service
+
+router = Router()
+bot: Bot = None
+
+def init_bot(b: Bot):
+    global bot
+    bot = b
+
+@router.message(Command('alert_add'))
+async def alert_add_handler(message: Message) -> None:
+    """Добавить оповещение о пересечении цены"""
+    chat_id = message.chat.id
+    try:
+        args = message.text.split()
+        if len(args) != 3:
+            raise ValueError
+
+        _, crypto, threshold_str = args
+        crypto = crypto.upper()
+        direction = None
+        if threshold_str[0] in "><":
+            direction = ABOVE if threshold_str[0] == ">" else BELOW
+            threshold_str = threshold_str[1:]
+        threshold = float(threshold_str.lstrip("€"))
+        if not math.isfinite(threshold) or threshold <= 0:
+            await message.answer("❌ Цена должна быть положительным числом.")
+            return
+
+        if crypto not in SUPPORTED_CRYPTOS:
+            await message.answer(f"❌ Криптовалюта {crypto} не поддерживается.")
+            return
+
+        current_price = price_data[crypto]["price"]
+        if direction is None:
+            if current_price is None:
+                await message.answer(f"⏳ Цена {crypto} еще загружается. Укажите направление явно: "
+                                     f"/alert_add {crypto} >{threshold_str} или <{threshold_str}")
+                return
+            direction = ABOVE if threshold > current_price else BELOW
+
+        user_data = get_user(chat_id)
+        if user_data.alerts and len(user_data.alerts) >= MAX_ALERTS_PER_USER:
+            await message.answer(f"❌ Достигнут лимит оповещений ({MAX_ALERTS_PER_USER}).")
+            return
+
+        alert = add_alert(chat_id, crypto, threshold, direction)
+        save_user(chat_id)
+        await message.answer(f"🔔 Оповещение добавлено: <b>{alert.describe()}</b>", parse_mode=ParseMode.HTML)
+
+    except (ValueError, IndexError):
+        await message.answer("❌ Неверный формат. Используйте: /alert_add [КОД] [ЦЕНА]\n"
+                             "Пример: /alert_add BTC 60000 (или >60000 / <55000)")
+
+@router.message(Command('alert_list'))
+async def alert_list_handler(message: Message) -> None:
+    """Показать оповещения пользователя"""
+    user_data = get_user(message.chat.id)
+    if not user_data.alerts:
+        await message.answer("📭 У вас нет оповещений.\n\n"
+                             "Используйте /alert_add [КОД] [ЦЕНА], чтобы добавить оповещение.")
+        return
+
+    text = "🔔 <b>Ваши оповещения:</b>\n\n"
+    text += "\n".join(f"{number}. {alert.describe()}" for number, alert in enumerate(user_data.alerts, 1))
+    text += "\n\nУдалить: /alert_remove [НОМЕР]"
+    await message.answer(text, parse_mode=ParseMode.HTML)
+
+@router.message(Command('alert_remove'))
+async def alert_remove_handler(message: Message) -> None:
+    """Удалить оповещение по номеру из /alert_list"""
+    chat_id = message.chat.id
+    try:
+        args = message.text.split()
+        if len(args) != 2:
+            raise ValueError
+        number = int(args[1])
+
+        user_data = get_user(chat_id)
+        if not user_data.alerts or not 1 <= number <= len(user_data.alerts):
+            await message.answer(f"❌ Оповещение №{number} не найдено.")
+            return
+
+        alert = user_data.alerts[number - 1]
+        remove_alert(chat_id, alert)
+        save_user(chat_id)
+        await message.answer(f"✅ Оповещение {alert.describe()} удалено.")
+
+    except (ValueError, IndexError):
+        await message.answer("❌ Неверный формат. Используйте: /alert_remove [НОМЕР]\n"
+                             "Пример: /alert_remove 1")
+
+async def send_alert_notification(alert, price):
+    await bot.send_message(
+        chat_id=alert.chat_id,
+        text=f"🚨 <b>Оповещение:</b> {alert.describe()}\n💰 Текущая цена {alert.crypto}: €{price:,.2f}",
+        parse_mode=ParseMode.HTML
+    )
+
+def check_alerts(crypto, price, timestamp):
+    """Обработчик тика: снимает сработавшие оповещения и ставит уведомления в очередь"""
+    fired = alert_engine.check(crypto, price)
+    for alert in fired:
+        remove_alert(alert.chat_id, alert)
+        save_user(alert.chat_id)
+        delivery_service.delivery_queue.submit((alert.chat_id, "alert", alert.alert_id),
+                                               lambda alert=alert: send_alert_notification(alert, price))
+    if fired:
+        logging.info(f"Fired {len(fired)} {crypto} alerts at {price}")
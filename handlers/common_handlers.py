@@ -3,25 +3,34 @@ from aiogram import Router, html
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message
 from aiogram.enums import ParseMode
-from config import SUPPORTED_CRYPTOS
+from handlers.crypto_handlers import crypto_options
 
 router = Router()
 
 @router.message(CommandStart())
 async def command_start_handler(message: Message) -> None:
-    crypto_list = "\n".join([f"• {code} ({info['name']})" for code, info in SUPPORTED_CRYPTOS.items()])
     text = f"Привет, {html.bold(message.from_user.full_name)}! 👋\n\n"\
            f"🤖 <b>Crypto-check Bot</b> - твой помощник для отслеживания криптовалют!\n\n"\
-           f"💰 <b>Поддерживаемые криптовалюты:</b>\n{crypto_list}\n\n"\
+           f"💰 <b>Поддерживаемые криптовалюты:</b>\n{crypto_options()}\n\n"\
            f"📋 <b>Доступные команды:</b>\n"\
            f"• /select_crypto - выбрать криптовалюту для отслеживания\n"\
+           f"• /select [КОД] - выбрать криптовалюту по коду\n"\
            f"• /checkCrypto - получить текущую цену выбранной криптовалюты\n"\
+           f"• /history [КОД] [1m|5m|1h] - изменение за 24 ч и свечи\n"\
            f"• /start_updates - включить автообновления цены\n"\
            f"• /stop_updates - отключить автообновления\n"\
-           f"• /status - статус ваших подписок\n\n"\
+           f"• /status - статус ваших подписок\n"\
+           f"• /threshold - порог обновления сообщения с ценой\n"\
+           f"• /currency [КОД] - валюта цен (EUR, USD, GBP...)\n\n"\
            f"💼 <b>Управление портфелем:</b>\n"\
            f"• /portfolio_add [КОД] [КОЛ-ВО] - добавить актив\n"\
            f"• /portfolio_remove [КОД] - удалить актив\n"\
-           f"• /portfolio - посмотреть портфель\n\n"\
+           f"• /portfolio - посмотреть портфель\n"\
+           f"• /portfolio_live - портфель, обновляемый в реальном времени\n"\
+           f"• /portfolio_live_stop - отключить живой портфель\n\n"\
+           f"🚨 <b>Оповещения:</b>\n"\
+           f"• /alert_add [КОД] [ЦЕНА] - оповестить при пересечении цены\n"\
+           f"• /alert_list - список оповещений\n"\
+           f"• /alert_remove [НОМЕР] - удалить оповещение\n\n"\
            f"🔔 <i>Автообновления показывают цену в реальном времени!</i>"
     await message.answer(text, parse_mode=ParseMode.HTML)
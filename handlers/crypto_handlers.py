@@ -1,72 +1,158 @@
 # handlers/crypto_handlers.py
 from aiogram import Router, html
-from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.filters import Command, Filter
+from aiogram.types import Message, CallbackQuery
 from aiogram.enums import ParseMode
-from config import SUPPORTED_CRYPTOS
-from services.user_service import active_users, save_users_data, get_user
-from services.crypto_service import price_data
-from datetime import datetime
+from config import SUPPORTED_CRYPTOS, CRYPTO_LIST_LIMIT
+from services.symbol_service import symbol_registry, crypto_info
+from services.user_service import save_user, save_message_id, get_user, set_crypto, activate_user, deactivate_user
+from services.crypto_service import price_data, price_age, is_stale
+from services.render_service import render_price_text
+from services.quote_service import quote_engine
+from services.response_service import response_cache, command_name
+from services.keyboard_service import (
+    CryptoChoice, CryptoPage, UpdatesToggle, SELECTED_KEYBOARD, LIVE_PRICE_KEYBOARD, crypto_keyboard
+)
+from handlers import update_handlers
+from handlers.update_handlers import edit_in_place, queue_user_update, update_user_message
 
 router = Router()
+# Команды вида /<код> подключаются последними, чтобы код пары не перекрывал обычные команды
+code_router = Router()
+
+class CryptoCommand(Filter):
+    """Команда /<код> включенной пары; передает код в хендлер аргументом crypto"""
+
+    async def __call__(self, message: Message):
+        name = command_name(message.text)
+        if name is None:
+            return False
+        code = name.upper()
+        return {"crypto": code} if code in SUPPORTED_CRYPTOS else False
+
+def crypto_options(limit=CRYPTO_LIST_LIMIT):
+    """Список включенных пар для сообщений (не длиннее limit строк)"""
+    lines = [f"• /{code.lower()} - {info['name']} ({info['symbol']})"
+             for code, info in list(SUPPORTED_CRYPTOS.items())[:limit]]
+    if len(SUPPORTED_CRYPTOS) > limit:
+        lines.append(f"• ...и еще {len(SUPPORTED_CRYPTOS) - limit}: /select [КОД]")
+    return "\n".join(lines)
 
 @router.message(Command('select_crypto'))
 async def select_crypto_handler(message: Message) -> None:
     """Команда для выбора криптовалюты"""
     chat_id = message.chat.id
     
-    crypto_options = "\n".join([
-        f"• /{code.lower()} - {info['name']} ({info['symbol']})" 
-        for code, info in SUPPORTED_CRYPTOS.items()
-    ])
-    
     user_data = get_user(chat_id)
-    current_crypto = user_data.get("crypto", "BTC")
-    current_info = SUPPORTED_CRYPTOS[current_crypto]
+    current_crypto = user_data.crypto
+    current_info = crypto_info(current_crypto)
     
     text = f"🔍 <b>Выбор криптовалюты</b>\n\n"\
            f"📊 Текущий выбор: <b>{current_crypto}</b> ({current_info['name']})\n\n"\
-           f"💰 <b>Доступные криптовалюты:</b>\n{crypto_options}\n\n"\
-           f"💡 <i>Выберите криптовалюту, нажав на соответствующую команду</i>"
+           f"💡 <i>Выберите криптовалюту кнопкой ниже или командой /select [КОД]</i>"
     
-    await message.answer(text, parse_mode=ParseMode.HTML)
+    await message.answer(text, parse_mode=ParseMode.HTML, reply_markup=crypto_keyboard(0))
 
-# Обработчики для каждой криптовалюты
-@router.message(Command('btc'))
-async def select_btc_handler(message: Message) -> None:
-    await set_user_crypto(message, "BTC")
+@router.message(Command('select'))
+async def select_handler(message: Message) -> None:
+    """Выбор криптовалюты по коду: /select [КОД]"""
+    args = message.text.split()
+    if len(args) != 2:
+        await message.answer("❌ Неверный формат. Используйте: /select [КОД]\nПример: /select BTC")
+        return
 
-@router.message(Command('eth'))
-async def select_eth_handler(message: Message) -> None:
-    await set_user_crypto(message, "ETH")
+    crypto = args[1].upper()
+    if crypto not in SUPPORTED_CRYPTOS:
+        similar = [code for code in symbol_registry.search(crypto[:2]) if code in SUPPORTED_CRYPTOS]
+        hint = f"\nПохожие: {', '.join(similar)}" if similar else ""
+        await message.answer(f"❌ Криптовалюта {crypto} не поддерживается.{hint}")
+        return
+    await set_user_crypto(message, crypto)
 
-@router.message(Command('sol'))
-async def select_sol_handler(message: Message) -> None:
-    await set_user_crypto(message, "SOL")
+@code_router.message(CryptoCommand())
+async def select_code_handler(message: Message, crypto: str) -> None:
+    """Выбор криптовалюты командой /<код>"""
+    await set_user_crypto(message, crypto)
 
-@router.message(Command('xrp'))
-async def select_xrp_handler(message: Message) -> None:
-    await set_user_crypto(message, "XRP")
+def _selected_text(crypto, currency=None):
+    info = crypto_info(crypto)
+    return f"✅ <b>Выбрано:</b> {crypto} ({info['name']})\n"\
+           f"🔗 Торговая пара: {crypto}/{quote_engine.code(currency)}\n\n"\
+           f"💡 Теперь используйте:\n"\
+           f"• /checkCrypto - для проверки цены\n"\
+           f"• /start_updates - для автообновлений"
 
 async def set_user_crypto(message: Message, crypto: str) -> None:
     """Установить выбранную криптовалюту для пользователя"""
     chat_id = message.chat.id
-    crypto_info = SUPPORTED_CRYPTOS[crypto]
-    
-    user_data = get_user(chat_id)
-    user_data["crypto"] = crypto
-    user_data["last_price"] = None
-    user_data["message_id"] = None
-    
-    save_users_data()
-    
-    text = f"✅ <b>Выбрано:</b> {crypto} ({crypto_info['name']})\n"\
-           f"🔗 Торговая пара: {crypto}/EUR\n\n"\
-           f"💡 Теперь используйте:\n"\
-           f"• /checkCrypto - для проверки цены\n"\
-           f"• /start_updates - для автообновлений"
+    user_data = set_crypto(chat_id, crypto)
+    save_user(chat_id)
+
+    # Живое сообщение с ценой сохраняется и сразу переключается на новую монету
+    if user_data.active and user_data.message_id is not None and update_handlers.send_price_messages:
+        queue_user_update(chat_id)
     
-    await message.answer(text, parse_mode=ParseMode.HTML)
+    await message.answer(_selected_text(crypto, user_data.currency), parse_mode=ParseMode.HTML,
+                         reply_markup=SELECTED_KEYBOARD[user_data.active])
+
+async def _show_live_price(callback: CallbackQuery, user_data) -> None:
+    """Сообщение, на кнопке которого нажали, становится живым сообщением с ценой вместо отправки нового"""
+    user_data.message_id = callback.message.message_id
+    user_data.last_price = None
+    save_message_id(callback.message.chat.id)
+    if price_data[user_data.crypto]["price"] is not None:
+        await update_user_message(callback.message.chat.id)
+    else:
+        await edit_in_place(callback, "⏳ <b>Загрузка данных...</b>\nЦена появится через несколько секунд.",
+                            LIVE_PRICE_KEYBOARD)
+
+@router.callback_query(CryptoPage.filter())
+async def crypto_page_callback(callback: CallbackQuery, callback_data: CryptoPage) -> None:
+    """Страница клавиатуры выбора монеты (и возврат к выбору из других меню)"""
+    current_crypto = get_user(callback.message.chat.id).crypto
+    text = f"🔍 <b>Выбор криптовалюты</b>\n\n"\
+           f"📊 Текущий выбор: <b>{current_crypto}</b> ({crypto_info(current_crypto)['name']})"
+    await edit_in_place(callback, text, crypto_keyboard(callback_data.page))
+    await callback.answer()
+
+@router.callback_query(CryptoChoice.filter())
+async def crypto_choice_callback(callback: CallbackQuery, callback_data: CryptoChoice) -> None:
+    """Выбор монеты кнопкой: сообщение с клавиатурой правится на месте"""
+    crypto = callback_data.code
+    if crypto not in SUPPORTED_CRYPTOS:
+        await callback.answer(f"{crypto} больше не поддерживается", show_alert=True)
+        return
+
+    chat_id = callback.message.chat.id
+    user_data = set_crypto(chat_id, crypto)
+    save_user(chat_id)
+    if user_data.active and update_handlers.send_price_messages:
+        await _show_live_price(callback, user_data)
+    else:
+        await edit_in_place(callback, _selected_text(crypto, user_data.currency), SELECTED_KEYBOARD[user_data.active])
+    await callback.answer(f"Выбрано: {crypto}")
+
+@router.callback_query(UpdatesToggle.filter())
+async def updates_toggle_callback(callback: CallbackQuery, callback_data: UpdatesToggle) -> None:
+    """Включение и выключение автообновлений кнопкой"""
+    chat_id = callback.message.chat.id
+    if callback_data.on:
+        user_data = activate_user(chat_id)
+        save_user(chat_id)
+        if update_handlers.send_price_messages:
+            await _show_live_price(callback, user_data)
+        else:
+            await edit_in_place(callback, f"🔔 <b>Автообновления включены!</b>\n📊 Отслеживаем: {user_data.crypto}",
+                                SELECTED_KEYBOARD[True])
+        await callback.answer("🔔 Автообновления включены")
+    else:
+        user_data = deactivate_user(chat_id)
+        save_user(chat_id)
+        text = f"🔕 <b>Автообновления отключены</b>\n📊 Выбрано: {user_data.crypto}"
+        if price_data[user_data.crypto]["price"] is not None:
+            text += "\n" + render_price_text(user_data.crypto, "status", user_data.currency)
+        await edit_in_place(callback, text, SELECTED_KEYBOARD[False])
+        await callback.answer("🔕 Автообновления отключены")
 
 @router.message(Command('checkCrypto'))
 async def check_crypto_handler(message: Message) -> None:
@@ -74,18 +160,19 @@ async def check_crypto_handler(message: Message) -> None:
     chat_id = message.chat.id
     
     user_data = get_user(chat_id)
-    user_crypto = user_data.get("crypto", "BTC")
+    user_crypto = user_data.crypto
     
-    if price_data[user_crypto]["price"] is not None:
-        formatted_price = f"{price_data[user_crypto]['price']:,.2f}"
-        if price_data[user_crypto]["last_update"]:
-            update_time = datetime.fromtimestamp(price_data[user_crypto]["last_update"]).strftime("%H:%M:%S")
-            text = f"💰 <b>{user_crypto}/EUR</b>: €{formatted_price}\n"\
-                   f"📊 Данные получены через WebSocket Binance\n"\
-                   f"🔄 Последнее обновление: {update_time}"
-        else:
-            text = f"💰 <b>{user_crypto}/EUR</b>: €{formatted_price}\n"\
-                   f"📊 Данные получены через WebSocket Binance"
+    text = response_cache.get(chat_id, "checkCrypto")
+    if text is not None:
+        await message.answer(text, parse_mode=ParseMode.HTML)
+    elif price_data[user_crypto]["price"] is not None:
+        template = "check" if price_data[user_crypto]["last_update"] else "check_short"
+        text = render_price_text(user_crypto, template, user_data.currency)
+        if is_stale(user_crypto):
+            text += f"\n⚠️ Данные устарели: последнее обновление {price_age(user_crypto):.0f} с назад"
+        elif price_data[user_crypto]["source"] == "rest":
+            text += "\n⚠️ WebSocket недоступен, цена из REST-снимка Binance"
+        response_cache.put(chat_id, "checkCrypto", text, (user_crypto,), user_data.currency)
         await message.answer(text, parse_mode=ParseMode.HTML)
     else:
         await message.answer(f"⏳ Цена {user_crypto} еще загружается, попробуйте через несколько секунд...")
@@ -0,0 +1,57 @@
+# handlers/currency_handlers.py
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery
+from aiogram.enums import ParseMode
+from config import CURRENCIES
+from services.user_service import save_user, get_user, set_currency
+from services.quote_service import quote_engine
+from services.keyboard_service import CurrencyChoice, CURRENCY_KEYBOARD
+from handlers import update_handlers
+from handlers.update_handlers import edit_in_place, queue_user_update, mark_portfolio_changed
+
+router = Router()
+
+def _currency_text(currency):
+    return f"💱 <b>Валюта цен:</b> {quote_engine.sign(currency)} {quote_engine.code(currency)}\n\n"\
+           f"Доступно: {', '.join(CURRENCIES)}\n"\
+           f"Изменить: /currency [КОД] или кнопкой ниже"
+
+def apply_currency(chat_id, currency):
+    """Сменить валюту пользователя; живое сообщение с ценой и живой портфель пересчитываются сразу"""
+    user_data = set_currency(chat_id, currency)
+    save_user(chat_id)
+    if user_data.active and user_data.message_id is not None and update_handlers.send_price_messages:
+        queue_user_update(chat_id)
+    mark_portfolio_changed(chat_id)
+    return user_data
+
+@router.message(Command('currency'))
+async def currency_handler(message: Message) -> None:
+    """Показать или сменить валюту, в которой показываются цены и портфель"""
+    chat_id = message.chat.id
+    args = message.text.split()[1:]
+    if not args:
+        await message.answer(_currency_text(get_user(chat_id).currency), parse_mode=ParseMode.HTML,
+                             reply_markup=CURRENCY_KEYBOARD)
+        return
+
+    try:
+        currency = quote_engine.normalize(args[0])
+    except ValueError:
+        await message.answer(f"❌ Валюта {args[0].upper()} не поддерживается. Доступно: {', '.join(CURRENCIES)}")
+        return
+    user_data = apply_currency(chat_id, currency)
+    await message.answer(f"✅ <b>Цены теперь в {quote_engine.code(user_data.currency)}</b>", parse_mode=ParseMode.HTML)
+
+@router.callback_query(CurrencyChoice.filter())
+async def currency_choice_callback(callback: CallbackQuery, callback_data: CurrencyChoice) -> None:
+    """Выбор валюты кнопкой: сообщение с клавиатурой правится на месте"""
+    try:
+        currency = quote_engine.normalize(callback_data.code)
+    except ValueError:
+        await callback.answer(f"{callback_data.code} больше не поддерживается", show_alert=True)
+        return
+    user_data = apply_currency(callback.message.chat.id, currency)
+    await edit_in_place(callback, _currency_text(user_data.currency), CURRENCY_KEYBOARD)
+    await callback.answer(f"Валюта: {quote_engine.code(user_data.currency)}")
@@ -0,0 +1,52 @@
+# handlers/history_handlers.py
+import time
+from datetime import datetime
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+from aiogram.enums import ParseMode
+from config import SUPPORTED_CRYPTOS, CANDLE_INTERVALS
+from services.user_service import get_user
+from services.history_service import price_history
+
+router = Router()
+
+HISTORY_CANDLES_SHOWN = 6
+SUMMARY_WINDOW = 24 * 3600
+
+@router.message(Command('history'))
+async def history_handler(message: Message) -> None:
+    """Изменение цены за 24 часа и последние свечи выбранного интервала"""
+    args = message.text.split()[1:]
+    crypto = get_user(message.chat.id).crypto
+    interval = "1h"
+    for arg in args:
+        if arg.upper() in SUPPORTED_CRYPTOS:
+            crypto = arg.upper()
+        elif arg.lower() in CANDLE_INTERVALS:
+            interval = arg.lower()
+        else:
+            await message.answer(f"❌ Неверный формат. Используйте: /history [КОД] [{'|'.join(CANDLE_INTERVALS)}]\n"
+                                 f"Пример: /history BTC 1h")
+            return
+
+    history = price_history.get(crypto)
+    now = time.time()
+    summary = history.summary(SUMMARY_WINDOW, now) if history else None
+    if summary is None:
+        await message.answer(f"⏳ История {crypto} еще не накоплена, попробуйте позже.")
+        return
+
+    covered_hours = min(summary["covered"], SUMMARY_WINDOW) / 3600
+    sign = "📈" if summary["change"] >= 0 else "📉"
+    text = f"📊 <b>{crypto}/EUR - история</b>\n\n"\
+           f"{sign} Изменение за {covered_hours:.0f} ч: €{summary['change']:+,.2f} ({summary['change_percent']:+.2f}%)\n"\
+           f"⬆️ Максимум: €{summary['high']:,.2f}\n"\
+           f"⬇️ Минимум: €{summary['low']:,.2f}\n\n"\
+           f"🕯 <b>Свечи {interval}:</b>\n"
+
+    for start, open_, high, low, close, ticks in history.candles[interval].candles()[-HISTORY_CANDLES_SHOWN:]:
+        text += f"• {datetime.fromtimestamp(start).strftime('%H:%M')}  "\
+                f"O {open_:,.2f} H {high:,.2f} L {low:,.2f} C {close:,.2f} · {ticks} тик.\n"
+
+    await message.answer(text, parse_mode=ParseMode.HTML)
@@ -1,11 +1,16 @@
 # handlers/portfolio_handlers.py
 from aiogram import Router, html
 from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.types import Message, CallbackQuery
 from aiogram.enums import ParseMode
 from config import SUPPORTED_CRYPTOS
-from services.user_service import active_users, save_users_data, get_user
-from services.crypto_service import price_data
+from services.user_service import (
+    save_user, save_message_id, get_user, add_holding, remove_holding, enable_live_portfolio, disable_live_portfolio
+)
+from services.render_service import render_portfolio_text, portfolio_row, format_money
+from services.response_service import response_cache
+from services.keyboard_service import PortfolioAction, portfolio_keyboard
+from handlers.update_handlers import mark_portfolio_changed, edit_in_place
 
 router = Router()
 
@@ -26,13 +31,9 @@ async def portfolio_add_handler(message: Message) -> None:
             await message.answer(f"❌ Криптовалюта {crypto} не поддерживается.")
             return
 
-        user_data = get_user(chat_id)
-        
-        if "portfolio" not in user_data:
-            user_data["portfolio"] = {}
-
-        user_data["portfolio"][crypto] = user_data["portfolio"].get(crypto, 0) + amount
-        save_users_data()
+        add_holding(chat_id, crypto, amount)
+        save_user(chat_id)
+        mark_portfolio_changed(chat_id)
         
         await message.answer(f"✅ Добавлено {amount} {crypto} в ваш портфель.")
         await portfolio_handler(message)
@@ -54,12 +55,13 @@ async def portfolio_remove_handler(message: Message) -> None:
         crypto = crypto.upper()
 
         user_data = get_user(chat_id)
-        if crypto not in user_data.get("portfolio", {}):
+        if crypto not in user_data.portfolio:
             await message.answer(f"❌ Актив {crypto} не найден в вашем портфеле.")
             return
 
-        del user_data["portfolio"][crypto]
-        save_users_data()
+        remove_holding(chat_id, crypto)
+        save_user(chat_id)
+        mark_portfolio_changed(chat_id)
         
         await message.answer(f"✅ Актив {crypto} удален из вашего портфеля.")
         await portfolio_handler(message)
@@ -68,31 +70,87 @@ async def portfolio_remove_handler(message: Message) -> None:
         await message.answer("❌ Неверный формат. Используйте: /portfolio_remove [КОД]\n"
                              "Пример: /portfolio_remove BTC")
 
+def portfolio_text(user_data):
+    """Текст портфеля пользователя на текущий момент"""
+    if not user_data.portfolio:
+        return "📭 Ваш портфель пуст.\n\nИспользуйте /portfolio_add [КОД] [КОЛ-ВО], чтобы добавить актив."
+
+    currency = user_data.currency
+    rows = [portfolio_row(crypto, amount, currency) for crypto, amount in user_data.portfolio.items()]
+    text = "💼 <b>Ваш криптовалютный портфель:</b>\n\n"
+    text += "".join(f"{line}\n" for _, line in rows)
+    text += f"\n----------------------------------\n"
+    text += f"💰 <b>Общая стоимость: {format_money(sum(value for value, _ in rows), currency)}</b>"
+    return text
+
 @router.message(Command('portfolio'))
 async def portfolio_handler(message: Message) -> None:
     """Показать портфель пользователя"""
     chat_id = message.chat.id
-    
+    text = response_cache.get(chat_id, "portfolio")
     user_data = get_user(chat_id)
-    if not user_data.get("portfolio"):
-        await message.answer("📭 Ваш портфель пуст.\n\n"
-                             "Используйте /portfolio_add [КОД] [КОЛ-ВО], чтобы добавить актив.")
-        return
+    if text is None:
+        text = response_cache.put(chat_id, "portfolio", portfolio_text(user_data), user_data.portfolio,
+                                  user_data.currency)
+    await message.answer(text, parse_mode=ParseMode.HTML, reply_markup=portfolio_keyboard(tuple(user_data.portfolio)))
 
-    portfolio = user_data["portfolio"]
-    total_value = 0
-    text = "💼 <b>Ваш криптовалютный портфель:</b>\n\n"
+async def _show_portfolio(callback: CallbackQuery, user_data) -> None:
+    """Портфель в сообщении с кнопкой: живой вид, если это сообщение живого портфеля"""
+    live = user_data.live_portfolio
+    if live is not None and live.message_id == callback.message.message_id:
+        await edit_in_place(callback, render_portfolio_text(user_data.portfolio, live, user_data.currency),
+                            portfolio_keyboard(tuple(user_data.portfolio), True))
+    else:
+        await edit_in_place(callback, portfolio_text(user_data), portfolio_keyboard(tuple(user_data.portfolio)))
 
-    for crypto, amount in portfolio.items():
-        current_price = price_data[crypto].get("price")
-        if current_price:
-            value = amount * current_price
-            total_value += value
-            text += f"• <b>{crypto}</b>: {amount} ({SUPPORTED_CRYPTOS[crypto]['symbol']}) - <b>€{value:,.2f}</b>\n"
-        else:
-            text += f"• <b>{crypto}</b>: {amount} ({SUPPORTED_CRYPTOS[crypto]['symbol']}) - <i>Цена загружается...</i>\n"
-    
-    text += f"\n----------------------------------\n"
-    text += f"💰 <b>Общая стоимость: €{total_value:,.2f}</b>"
-    
-    await message.answer(text, parse_mode=ParseMode.HTML)
+@router.callback_query(PortfolioAction.filter())
+async def portfolio_action_callback(callback: CallbackQuery, callback_data: PortfolioAction) -> None:
+    """Кнопки портфеля: обновить, удалить актив, включить или выключить живой режим"""
+    chat_id = callback.message.chat.id
+    user_data = get_user(chat_id)
+    action = callback_data.action
+    notice = None
+
+    if action == "remove" and callback_data.code in user_data.portfolio:
+        remove_holding(chat_id, callback_data.code)
+        save_user(chat_id)
+        notice = f"🗑 {callback_data.code} удален"
+    elif action == "live":
+        # Живым становится это сообщение, новое не отправляется; идентификатор сохраняется до
+        # записи пользователя, чтобы в многопроцессном режиме уйти воркеру вместе с ней
+        enable_live_portfolio(chat_id).live_portfolio.message_id = callback.message.message_id
+        save_message_id(chat_id)
+        save_user(chat_id)
+        notice = "📡 Живой портфель включен"
+    elif action == "live_stop" and user_data.live_portfolio is not None:
+        disable_live_portfolio(chat_id)
+        save_user(chat_id)
+        notice = "🔕 Живой портфель отключен"
+
+    await _show_portfolio(callback, user_data)
+    await callback.answer(notice)
+
+@router.message(Command('portfolio_live'))
+async def portfolio_live_handler(message: Message) -> None:
+    """Включить живое сообщение с портфелем"""
+    chat_id = message.chat.id
+    user_data = enable_live_portfolio(chat_id)
+    save_user(chat_id)
+
+    await message.answer("📡 <b>Живой портфель включен!</b>\n"
+                         "Сообщение ниже будет обновляться при изменении цен ваших активов.\n"
+                         "Используйте /portfolio_live_stop для отключения.",
+                         parse_mode=ParseMode.HTML)
+    mark_portfolio_changed(chat_id, user_data.portfolio)
+
+@router.message(Command('portfolio_live_stop'))
+async def portfolio_live_stop_handler(message: Message) -> None:
+    """Отключить живое сообщение с портфелем"""
+    chat_id = message.chat.id
+    if get_user(chat_id).live_portfolio is None:
+        await message.answer("❌ Живой портфель не был включен.")
+        return
+
+    disable_live_portfolio(chat_id)
+    save_user(chat_id)
+    await message.answer("🔕 Живой портфель отключен.")
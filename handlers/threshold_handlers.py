@@ -0,0 +1,46 @@
+# handlers/threshold_handlers.py
+from aiogram import Router
+from aiogram.filters import Command
+from aiogram.types import Message
+from aiogram.enums import ParseMode
+from config import SUPPORTED_CRYPTOS
+from services.user_service import save_user, get_user
+from services.suppression_service import get_threshold, parse_threshold
+
+router = Router()
+
+THRESHOLD_USAGE = "❌ Неверный формат. Используйте: /threshold [КОД] [€] [%] [сек]s\n"\
+                  "Примеры:\n"\
+                  "• /threshold BTC 0.1% - обновлять при изменении на 0.1%\n"\
+                  "• /threshold 5 30s - при изменении на €5, не чаще раза в 30 секунд\n"\
+                  "• /threshold BTC reset - вернуть порог по умолчанию"
+
+@router.message(Command('threshold'))
+async def threshold_handler(message: Message) -> None:
+    """Показать или задать порог обновления сообщения с ценой"""
+    chat_id = message.chat.id
+    user_data = get_user(chat_id)
+    args = message.text.split()[1:]
+
+    crypto = user_data.crypto
+    if args and args[0].upper() in SUPPORTED_CRYPTOS:
+        crypto = args.pop(0).upper()
+
+    if not args:
+        await message.answer(f"🎚 <b>Порог обновления {crypto}:</b> {get_threshold(user_data, crypto).describe()}\n\n"
+                             f"Изменить: /threshold [КОД] [€] [%] [сек]s",
+                             parse_mode=ParseMode.HTML)
+        return
+
+    if args == ["reset"]:
+        user_data.set_threshold(crypto, None)
+    else:
+        try:
+            user_data.set_threshold(crypto, parse_threshold(args, crypto))
+        except ValueError:
+            await message.answer(THRESHOLD_USAGE)
+            return
+    save_user(chat_id)
+
+    await message.answer(f"✅ <b>Порог обновления {crypto}:</b> {get_threshold(user_data, crypto).describe()}",
+                         parse_mode=ParseMode.HTML)
@@ -4,52 +4,75 @@ import logging
 import time
 from aiogram import Bot
 from aiogram.enums import ParseMode
-from config import SUPPORTED_CRYPTOS, UPDATE_FREQUENCY_LIMIT
-from services.user_service import active_users, get_user
+from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest
+from aiogram.types import CallbackQuery
+from config import UPDATE_FREQUENCY_LIMIT, PORTFOLIO_LIVE_INTERVAL
+from services.user_service import (
+    get_user, activate_user, deactivate_user, get_subscribers, save_user, save_message_id, reset_message,
+    get_portfolio_watchers, get_currency_users
+)
 from services.crypto_service import price_data
-from datetime import datetime
+from services.symbol_service import crypto_info
+from services import delivery_service
+from services.render_service import render_price_text, render_portfolio_text
+from services.quote_service import quote_engine
+from services.keyboard_service import LIVE_PRICE_KEYBOARD, portfolio_keyboard
+from services.suppression_service import should_send_edit, record_edit_sent
+from services.metrics_service import messages_total, tick_to_edit_seconds, fanout_seconds
 
-bot: Bot
-last_message_update = 0
+bot: Bot = None
+# False в процессе приема команд многопроцессного режима: сообщения с ценой шлют воркеры доставки
+send_price_messages = True
 
-def init_bot(b: Bot):
-    global bot
+# Криптовалюты, по которым пришли тики с последнего цикла рассылки
+dirty_cryptos = set()
+# Валюты, курсы которых изменились с последнего цикла рассылки
+dirty_currencies = set()
+
+# Пользователи с изменившимся живым портфелем, ждущие своего интервала правок
+portfolio_pending = set()
+
+def init_bot(b: Bot, price_messages=True):
+    global bot, send_price_messages
     bot = b
+    send_price_messages = price_messages
 
 async def start_updates_handler(message):
     """Включить автообновления для пользователя"""
     chat_id = message.chat.id
     user_data = get_user(chat_id)
     
-    if user_data["active"]:
+    if user_data.active:
         await message.answer("✅ Автообновления уже включены!\nИспользуйте /stop_updates для отключения.")
         return
     
-    user_data["active"] = True
-    user_data["last_price"] = None
-    user_data["message_id"] = None
+    reset_message(chat_id)
+    activate_user(chat_id)
+    save_user(chat_id)
     
-    user_crypto = user_data["crypto"]
-    crypto_info = SUPPORTED_CRYPTOS[user_crypto]
+    user_crypto = user_data.crypto
+    info = crypto_info(user_crypto)
     
     await message.answer(f"🔔 <b>Автообновления включены!</b>\n"\
-                        f"📊 Отслеживаем: {user_crypto} ({crypto_info['name']})\n"\
+                        f"📊 Отслеживаем: {user_crypto} ({info['name']})\n"\
                         f"Сообщение с ценой будет обновляться в реальном времени.\n"\
                         f"Используйте /stop_updates для отключения.", 
                         parse_mode=ParseMode.HTML)
     
-    await send_initial_price_message(chat_id)
+    if send_price_messages:
+        await send_initial_price_message(chat_id)
 
 async def stop_updates_handler(message):
     """Отключить автообновления для пользователя"""
     chat_id = message.chat.id
     user_data = get_user(chat_id)
     
-    if not user_data["active"]:
+    if not user_data.active:
         await message.answer("❌ Автообновления не были включены.")
         return
     
-    user_data["active"] = False
+    deactivate_user(chat_id)
+    save_user(chat_id)
     
     await message.answer("🔕 <b>Автообновления отключены!</b>\n"\
                         "Используйте /start_updates для включения.", 
@@ -58,7 +81,7 @@ async def stop_updates_handler(message):
 async def send_initial_price_message(chat_id):
     """Отправка первого сообщения с ценой для пользователя"""
     user_data = get_user(chat_id)
-    user_crypto = user_data.get("crypto", "BTC")
+    user_crypto = user_data.crypto
     
     if price_data[user_crypto]["price"] is None:
         for _ in range(10):
@@ -73,86 +96,269 @@ async def send_initial_price_message(chat_id):
             msg = await bot.send_message(
                 chat_id=chat_id,
                 text="⏳ <b>Загрузка данных...</b>\nЦена появится через несколько секунд.",
-                parse_mode=ParseMode.HTML
+                parse_mode=ParseMode.HTML,
+                reply_markup=LIVE_PRICE_KEYBOARD
             )
-            user_data["message_id"] = msg.message_id
+            user_data.message_id = msg.message_id
+            save_message_id(chat_id)
         except Exception as e:
             logging.error(f"Error sending initial message to {chat_id}: {e}")
 
+async def edit_in_place(callback: CallbackQuery, text, reply_markup=None):
+    """Правка сообщения, на кнопке которого нажали; повторное нажатие без изменений не ошибка"""
+    try:
+        await callback.message.edit_text(text, parse_mode=ParseMode.HTML, reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e).lower():
+            raise
+
+def _factor(currency):
+    """Курс € -> валюта пользователя для абсолютного порога правок (он задан в €)"""
+    if currency is None:
+        return 1.0
+    return quote_engine.factor(currency) or 1.0
+
+def _record_delivered(user_data, crypto, price, method):
+    """Учет доставленного сообщения с ценой: порог правок и метрики"""
+    record_edit_sent(user_data, price)
+    messages_total.labels(method, "ok").inc()
+    tick_to_edit_seconds.labels(crypto).observe(time.time() - price_data[crypto]["last_update"])
+
 async def update_user_message(chat_id):
     """Обновление сообщения для конкретного пользователя"""
     user_data = get_user(chat_id)
-    if not user_data["active"]:
+    if not user_data.active:
         return
     
-    user_crypto = user_data.get("crypto", "BTC")
+    user_crypto = user_data.crypto
+    # Цена в валюте пользователя; без курса валюты сообщение ждет его первого тика
+    current_price = quote_engine.price(user_crypto, user_data.currency)
     
-    if price_data[user_crypto]["price"] is None:
+    if current_price is None:
         return
     
+    method = "send" if user_data.message_id is None else "edit"
     try:
-        formatted_price = f"{price_data[user_crypto]['price']:,.2f}"
-        update_time = datetime.fromtimestamp(price_data[user_crypto]["last_update"]).strftime("%H:%M:%S")
-        new_text = f"💰 <b>{user_crypto}/EUR</b>: €{formatted_price}\n🔄 Обновлено: {update_time} (Реальное время)"
+        new_text = render_price_text(user_crypto, currency=user_data.currency)
         
-        last_price = user_data.get("last_price", None)
-        current_price = price_data[user_crypto]["price"]
-        
-        if user_data["message_id"] is None:
+        if user_data.message_id is None:
             msg = await bot.send_message(
                 chat_id=chat_id,
                 text=new_text,
-                parse_mode=ParseMode.HTML
+                parse_mode=ParseMode.HTML,
+                reply_markup=LIVE_PRICE_KEYBOARD
             )
-            user_data["message_id"] = msg.message_id
-            user_data["last_price"] = current_price
+            user_data.message_id = msg.message_id
+            save_message_id(chat_id)
+            _record_delivered(user_data, user_crypto, current_price, method)
             logging.info(f"Sent initial price message to {chat_id}")
         else:
-            if last_price is None or abs(current_price - last_price) >= 0.01:
+            if should_send_edit(user_data, user_crypto, current_price, factor=_factor(user_data.currency)):
                 try:
                     await bot.edit_message_text(
                         chat_id=chat_id,
-                        message_id=user_data["message_id"],
+                        message_id=user_data.message_id,
                         text=new_text,
-                        parse_mode=ParseMode.HTML
+                        parse_mode=ParseMode.HTML,
+                        reply_markup=LIVE_PRICE_KEYBOARD
                     )
-                    user_data["last_price"] = current_price
+                    _record_delivered(user_data, user_crypto, current_price, method)
                     logging.debug(f"Updated price message for {chat_id}")
+                except TelegramRetryAfter:
+                    raise
                 except Exception as edit_error:
                     if "message to edit not found" in str(edit_error).lower():
+                        messages_total.labels(method, "not_found").inc()
+                        method = "send"
                         msg = await bot.send_message(
                             chat_id=chat_id,
                             text=new_text,
-                            parse_mode=ParseMode.HTML
+                            parse_mode=ParseMode.HTML,
+                            reply_markup=LIVE_PRICE_KEYBOARD
                         )
-                        user_data["message_id"] = msg.message_id
-                        user_data["last_price"] = current_price
+                        user_data.message_id = msg.message_id
+                        save_message_id(chat_id)
+                        _record_delivered(user_data, user_crypto, current_price, method)
                         logging.info(f"Sent new price message to {chat_id} (old message not found)")
-                    elif "message is not modified" not in str(edit_error).lower():
+                    elif "message is not modified" in str(edit_error).lower():
+                        messages_total.labels(method, "not_modified").inc()
+                    else:
+                        messages_total.labels(method, "error").inc()
                         logging.error(f"Error editing message for {chat_id}: {edit_error}")
             
+    except TelegramRetryAfter as e:
+        # Сообщение по-прежнему существует, следующий цикл обновит его
+        messages_total.labels(method, "retry_after").inc()
+        logging.warning(f"Giving up price update for {chat_id}: {e}")
     except Exception as e:
+        messages_total.labels(method, "error").inc()
         logging.error(f"Error updating message for {chat_id}: {e}")
-        user_data["message_id"] = None
+        user_data.message_id = None
+        save_message_id(chat_id)
 
-async def update_all_users():
-    """Обновление сообщений для всех активных пользователей"""
-    global last_message_update
-    
-    current_time = time.time()
-    
-    if current_time - last_message_update < UPDATE_FREQUENCY_LIMIT:
+def mark_price_changed(crypto):
+    """Колбэк читателя WebSocket: только помечает криптовалюту как изменившуюся"""
+    dirty_cryptos.add(crypto)
+
+def mark_currency_changed(currencies):
+    """Обработчик quote_engine: курс валют изменился, цены их пользователей пересчитаются в цикле рассылки"""
+    dirty_currencies.update(currencies)
+
+def queue_user_update(chat_id):
+    """Поставить обновление сообщения пользователя в очередь доставки
+
+    Задача рендерит текст в момент отправки, поэтому еще не отправленная правка
+    просто заменяется новой и всегда несет последнюю цену.
+    """
+    delivery_service.delivery_queue.submit((chat_id, "price"), lambda: update_user_message(chat_id))
+
+async def update_portfolio_message(chat_id):
+    """Отправка или правка живого сообщения с портфелем"""
+    user_data = get_user(chat_id)
+    live = user_data.live_portfolio
+    if live is None:
         return
-    
+
+    method = "send" if live.message_id is None else "edit"
+    try:
+        text = render_portfolio_text(user_data.portfolio, live, user_data.currency)
+        keyboard = portfolio_keyboard(tuple(user_data.portfolio), True)
+        if live.message_id is not None:
+            try:
+                await bot.edit_message_text(chat_id=chat_id, message_id=live.message_id,
+                                            text=text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+                messages_total.labels(method, "ok").inc()
+                return
+            except TelegramRetryAfter:
+                raise
+            except Exception as edit_error:
+                if "message is not modified" in str(edit_error).lower():
+                    messages_total.labels(method, "not_modified").inc()
+                    return
+                if "message to edit not found" not in str(edit_error).lower():
+                    raise
+                messages_total.labels(method, "not_found").inc()
+                method = "send"
+        msg = await bot.send_message(chat_id=chat_id, text=text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+        live.message_id = msg.message_id
+        save_message_id(chat_id)
+        messages_total.labels(method, "ok").inc()
+    except TelegramRetryAfter as e:
+        # Строки уже пересчитаны и лежат в live.rows; повтор - после интервала пользователя
+        portfolio_pending.add(chat_id)
+        messages_total.labels(method, "retry_after").inc()
+        logging.warning(f"Giving up portfolio update for {chat_id}: {e}")
+    except Exception as e:
+        messages_total.labels(method, "error").inc()
+        logging.error(f"Error updating portfolio message for {chat_id}: {e}")
+
+def queue_portfolio_update(chat_id):
+    """Поставить правку живого портфеля в очередь доставки (не чаще PORTFOLIO_LIVE_INTERVAL)"""
+    live = get_user(chat_id).live_portfolio
+    if live is None:
+        return
+    live.queued_at = time.monotonic()
+    delivery_service.delivery_queue.submit((chat_id, "portfolio"), lambda: update_portfolio_message(chat_id))
+
+def mark_portfolio_changed(chat_id, cryptos=()):
+    """Пометить активы живого портфеля как изменившиеся; правка уйдет в ближайшем цикле рассылки"""
+    live = get_user(chat_id).live_portfolio
+    if live is not None and send_price_messages:
+        live.changed.update(cryptos)
+        portfolio_pending.add(chat_id)
+
+def update_portfolio_watchers(cryptos):
+    """Правки живых портфелей, в которых есть изменившиеся криптовалюты"""
+    for crypto in cryptos:
+        for chat_id in get_portfolio_watchers(crypto):
+            get_user(chat_id).live_portfolio.changed.add(crypto)
+            portfolio_pending.add(chat_id)
+
+    # Ограничение частоты правок: пользователь ждет в portfolio_pending своего интервала
+    deadline = time.monotonic() - PORTFOLIO_LIVE_INTERVAL
+    for chat_id in list(portfolio_pending):
+        live = get_user(chat_id).live_portfolio
+        if live is None:
+            portfolio_pending.discard(chat_id)
+        elif live.queued_at <= deadline:
+            portfolio_pending.discard(chat_id)
+            queue_portfolio_update(chat_id)
+
+async def update_all_users(cryptos):
+    """Обновление сообщений активных пользователей, подписанных на изменившиеся криптовалюты"""
     if not bot:
         return
     
-    active_user_list = [chat_id for chat_id, data in active_users.items() if data.get("active")]
+    started = time.perf_counter()
+    # Пользователи, для которых изменение цены ниже их порога, в очередь не попадают
+    active_user_list = []
+    for crypto in cryptos:
+        price = price_data[crypto]["price"]
+        # Цена в каждой валюте считается один раз на криптовалюту, а не на получателя
+        prices = {None: price}
+        for chat_id in get_subscribers(crypto):
+            user_data = get_user(chat_id)
+            currency = user_data.currency
+            if currency in prices:
+                user_price = prices[currency]
+            else:
+                user_price = prices[currency] = quote_engine.convert(price, currency)
+            if user_price is None:
+                continue
+            if user_data.message_id is None or should_send_edit(user_data, crypto, user_price,
+                                                                factor=_factor(currency)):
+                active_user_list.append(chat_id)
     
-    tasks = [update_user_message(chat_id) for chat_id in active_user_list]
-    await asyncio.gather(*tasks)
+    for chat_id in active_user_list:
+        queue_user_update(chat_id)
+    fanout_seconds.observe(time.perf_counter() - started)
     
     if active_user_list:
-        logging.debug(f"Updated messages for {len(active_user_list)} active users")
+        logging.debug(f"Queued updates for {len(active_user_list)} active users ({', '.join(cryptos)})")
+
+def update_currency_users(currencies):
+    """Тик курса: сообщения с ценой и живые портфели пользователей этих валют"""
+    queued = 0
+    for currency in currencies:
+        for chat_id in get_currency_users(currency):
+            user_data = get_user(chat_id)
+            if user_data.active:
+                price = quote_engine.price(user_data.crypto, currency)
+                if price is not None and (user_data.message_id is None
+                                          or should_send_edit(user_data, user_data.crypto, price,
+                                                              factor=_factor(currency))):
+                    queue_user_update(chat_id)
+                    queued += 1
+            live = user_data.live_portfolio
+            if live is not None and user_data.portfolio:
+                live.changed.update(user_data.portfolio)
+                portfolio_pending.add(chat_id)
+    if queued:
+        logging.debug(f"Queued updates for {queued} users after rate ticks ({', '.join(currencies)})")
+
+async def run_update_scheduler():
+    """Цикл рассылки: раз в UPDATE_FREQUENCY_LIMIT секунд объединяет все тики и обновляет сообщения"""
+    global dirty_cryptos, dirty_currencies
     
-    last_message_update = current_time
+    while True:
+        cycle_start = time.monotonic()
+        changed = ()
+        if dirty_cryptos:
+            changed, dirty_cryptos = dirty_cryptos, set()
+            try:
+                await update_all_users(changed)
+            except Exception as e:
+                logging.error(f"Error in update scheduler: {e}")
+        if dirty_currencies:
+            currencies, dirty_currencies = dirty_currencies, set()
+            if bot:
+                try:
+                    update_currency_users(currencies)
+                except Exception as e:
+                    logging.error(f"Error in currency update scheduler: {e}")
+        if bot and (changed or portfolio_pending):
+            try:
+                update_portfolio_watchers(changed)
+            except Exception as e:
+                logging.error(f"Error in portfolio update scheduler: {e}")
+        await asyncio.sleep(max(0, UPDATE_FREQUENCY_LIMIT - (time.monotonic() - cycle_start)))
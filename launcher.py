@@ -0,0 +1,249 @@
+# launcher.py
+"""
+Многопроцессный запуск бота.
+
+Процесс приема (ingest) читает цены Binance, обрабатывает команды и оповещения
+и публикует тики и изменения пользователей через Unix-сокет. N воркеров доставки
+владеют шардами chat_id (chat_id % N) и обновляют сообщения с ценой.
+
+С --webhook запускаются N полноценных воркеров вебхука за одним портом (SO_REUSEPORT),
+каждый со своим шардом chat_id; обновления чужих чатов пересылаются владельцу.
+
+Запуск: python launcher.py --workers 4
+        python launcher.py --webhook --workers 4
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import sys
+from config import TOKEN, TELEGRAM_GLOBAL_RATE, TICK_SOCKET_PATH, USERS_DB_FILE, USERS_DATA_FILE
+from services.user_service import (
+    load_users_background, close_user_store, add_user_listener, get_user, serialize_user, apply_user_record, reset_message,
+    reload_users, load_user
+)
+from services.history_service import record_tick
+from services.tick_log_service import restore_history
+from services.portfolio_service import portfolio_matrix
+from services.crypto_service import init_stream_manager, add_price_listener, update_price
+from services.delivery_service import init_delivery
+from services.executor_service import run_io, shutdown_executors
+from services.broker_service import UnixSocketBroker
+from services.metrics_service import start_metrics_server, monitor_loop_lag
+from services.storage_service import UserStore
+from handlers import alert_handlers
+from handlers.update_handlers import (
+    mark_price_changed, mark_currency_changed, mark_portfolio_changed, run_update_scheduler, queue_user_update, init_bot as init_update_bot
+)
+from services.symbol_service import symbol_registry, refresh_exchange_info, load_symbol_registry, read_enabled
+from services.quote_service import quote_engine
+from main import create_bot, create_dispatcher, main as run_webhook_worker
+
+async def run_ingest(workers, broker=None):
+    """Процесс приема: WebSocket Binance, команды, оповещения, публикация событий"""
+    broker = await (broker or UnixSocketBroker(TICK_SOCKET_PATH)).start()
+
+    def publish_tick(crypto, price, timestamp):
+        broker.publish({"type": "tick", "crypto": crypto, "price": price, "t": timestamp})
+
+    # Сообщения, ставшие живым портфелем по кнопке: идентификатор уходит воркеру-владельцу
+    # вместе со следующей записью пользователя, чтобы тот правил это сообщение, а не слал новое
+    adopted = {}
+
+    def publish_user(chat_id, kind):
+        if kind == "reset":
+            broker.publish({"type": "reset", "chat_id": chat_id})
+        elif kind == "message":
+            live = get_user(chat_id).live_portfolio
+            if live is not None and live.message_id is not None:
+                adopted[chat_id] = live.message_id
+        elif kind == "state":
+            event = {"type": "user", "chat_id": chat_id, "record": serialize_user(get_user(chat_id))}
+            if chat_id in adopted:
+                event["portfolio_message_id"] = adopted.pop(chat_id)
+            broker.publish(event)
+
+    def publish_symbol(crypto, enabled):
+        broker.publish({"type": "symbol", "crypto": crypto, "enabled": enabled})
+
+    load_symbol_registry()
+    # Рассылкой занимаются воркеры, поэтому тики здесь только публикуются
+    stream_manager = init_stream_manager(lambda crypto: None)
+    # Процесс приема не шлет живых сообщений, поэтому пользователи подключаются без растяжки,
+    # а message_id в базе пишут только воркеры доставки
+    load_task = asyncio.create_task(load_users_background(ramp=0, messages=False))
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    delivery_queue = init_delivery(bot, TELEGRAM_GLOBAL_RATE / (workers + 1))
+    init_update_bot(bot, price_messages=False)
+    alert_handlers.init_bot(bot)
+    add_price_listener(alert_handlers.check_alerts)
+    add_price_listener(record_tick)
+    add_price_listener(portfolio_matrix.on_tick)
+    add_price_listener(quote_engine.on_tick)
+    add_price_listener(publish_tick)
+    add_user_listener(publish_user)
+    symbol_registry.add_listener(publish_symbol)
+
+    stream_manager.start()
+    delivery_queue.start()
+    lag_task = asyncio.create_task(monitor_loop_lag())
+    history_task = asyncio.create_task(restore_history())
+    metrics_runner = await start_metrics_server()
+    try:
+        logging.info("Starting bot polling (ingest process)...")
+        await dp.start_polling(bot)
+    finally:
+        load_task.cancel()
+        lag_task.cancel()
+        history_task.cancel()
+        await asyncio.gather(load_task, lag_task, history_task, return_exceptions=True)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await close_user_store()
+        await stream_manager.stop()
+        await delivery_queue.stop()
+        await broker.close()
+        await bot.session.close()
+        shutdown_executors()
+
+def apply_event(event, index, workers):
+    """Применение события брокера в воркере доставки"""
+    if event["type"] == "tick":
+        update_price(event["crypto"], event["price"], event["t"])
+        mark_price_changed(event["crypto"])
+        return
+    if event["type"] == "symbol":
+        if event["enabled"]:
+            symbol_registry.enable(event["crypto"])
+        else:
+            symbol_registry.disable(event["crypto"])
+        return
+
+    chat_id = event["chat_id"]
+    if chat_id % workers != index:
+        return
+    if event["type"] == "reset":
+        reset_message(chat_id)
+    else:
+        apply_user_record(chat_id, event["record"], event.get("portfolio_message_id"))
+        _refresh_user(chat_id)
+
+def _refresh_user(chat_id):
+    """Сообщения пользователя после изменения его состояния другим процессом"""
+    user_data = get_user(chat_id)
+    if user_data.active and user_data.message_id is None:
+        queue_user_update(chat_id)
+    if user_data.live_portfolio is not None:
+        mark_portfolio_changed(chat_id)
+
+async def resync_worker(index, workers):
+    """Перечитывание пар и пользователей шарда после разрыва с брокером: события за время
+    разрыва (или отброшенные медленному воркеру) потеряны"""
+    codes = await run_io(read_enabled)
+    if codes is not None:
+        symbol_registry.set_enabled(codes)
+    chat_ids = await reload_users((index, workers))
+    for chat_id in chat_ids:
+        _refresh_user(chat_id)
+    logging.info(f"Delivery worker {index}/{workers} resynced {len(chat_ids)} users after broker reconnect")
+
+async def run_delivery_worker(index, workers, broker=None, bot=None, global_rate=None, load_users=True):
+    """Воркер доставки: шард пользователей, тики из брокера, правки сообщений"""
+    broker = broker or UnixSocketBroker(TICK_SOCKET_PATH)
+    bot = bot or create_bot()
+    delivery_queue = init_delivery(bot, global_rate or TELEGRAM_GLOBAL_RATE / (workers + 1))
+    init_update_bot(bot)
+    # Курсы валют приходят тиками из брокера, как и цены монет
+    add_price_listener(quote_engine.on_tick)
+    quote_engine.add_listener(mark_currency_changed)
+
+    # Подписка до загрузки: изменения, пришедшие во время чтения базы, не теряются
+    events = await broker.subscribe()
+    if load_users:
+        load_symbol_registry()
+
+    delivery_queue.start()
+    scheduler_task = asyncio.create_task(run_update_scheduler())
+    lag_task = asyncio.create_task(monitor_loop_lag())
+    load_task = asyncio.create_task(load_users_background(shard=(index, workers))) if load_users else None
+    metrics_runner = await start_metrics_server(1 + index)
+    logging.info(f"Delivery worker {index}/{workers} started")
+    try:
+        async for event in events:
+            if event["type"] == "resync":
+                # Новые события ждут в сокете, пока шард перечитывается, и применяются поверх
+                await resync_worker(index, workers)
+                continue
+            if "chat_id" in event and event["chat_id"] % workers == index:
+                # Пользователь, до которого еще не дошла фоновая загрузка, читается вне event loop
+                await load_user(event["chat_id"])
+            apply_event(event, index, workers)
+    finally:
+        tasks = [task for task in (scheduler_task, lag_task, load_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await delivery_queue.stop()
+        await events.aclose()
+        await close_user_store()
+        await bot.session.close()
+        shutdown_executors()
+
+def _process_main(role, *args):
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [{role}] %(levelname)s %(message)s")
+    try:
+        if role == "ingest":
+            asyncio.run(run_ingest(*args))
+        elif role.startswith("webhook"):
+            asyncio.run(run_webhook_worker(shard=args))
+        else:
+            asyncio.run(run_delivery_worker(*args))
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="число воркеров доставки (или вебхука)")
+    parser.add_argument("--webhook", action="store_true", help="воркеры вебхука за одним портом вместо процесса приема")
+    args = parser.parse_args()
+
+    if not TOKEN:
+        print("BOT_TOKEN not set in environment variables")
+        sys.exit(1)
+
+    # Кэш exchangeInfo обновляется один раз, процессы только читают его
+    asyncio.run(refresh_exchange_info())
+    # Потоки пула не переживают fork: дочерние процессы создадут свои пулы
+    shutdown_executors()
+    if args.webhook:
+        # Импорт старого JSON выполняется один раз до старта воркеров, загружающих шарды
+        store = UserStore(USERS_DB_FILE)
+        if store.is_empty():
+            store.import_legacy_json(USERS_DATA_FILE)
+        store.close()
+        processes = [multiprocessing.Process(target=_process_main, args=(f"webhook-{i}", i, args.workers), name=f"webhook-{i}")
+                     for i in range(args.workers)]
+    else:
+        processes = [multiprocessing.Process(target=_process_main, args=("ingest", args.workers), name="ingest")]
+        processes += [multiprocessing.Process(target=_process_main, args=(f"worker-{i}", i, args.workers), name=f"worker-{i}")
+                      for i in range(args.workers)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("Bot stopped by user.")
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+if __name__ == "__main__":
+    main()
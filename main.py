@@ -3,55 +3,130 @@ import asyncio
 import logging
 import sys
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import Command
-from config import TOKEN, SUPPORTED_CRYPTOS
-from services.user_service import load_users_data, save_users_data
-from services.crypto_service import get_crypto_price
-from handlers import common_handlers, crypto_handlers, portfolio_handlers, update_handlers, admin_handlers
-from handlers.update_handlers import update_all_users, init_bot as init_update_bot
+from config import TOKEN, UPDATE_MODE, TELEGRAM_GLOBAL_RATE, TELEGRAM_API_URL
+from services.user_service import load_users_background, close_user_store, UserLoadMiddleware
+from services.history_service import record_tick
+from services.tick_log_service import restore_history
+from services.portfolio_service import portfolio_matrix
+from services.symbol_service import refresh_exchange_info, load_symbol_registry
+from services.crypto_service import init_stream_manager, add_price_listener
+from services.delivery_service import init_delivery
+from services.executor_service import shutdown_executors
+from services.webhook_service import run_webhook
+from services.response_service import CommandDebounceMiddleware
+from services.quote_service import quote_engine
+from services.metrics_service import start_metrics_server, monitor_loop_lag
+from handlers import common_handlers, crypto_handlers, portfolio_handlers, update_handlers, admin_handlers, threshold_handlers, alert_handlers, history_handlers, currency_handlers
+from handlers.update_handlers import mark_price_changed, mark_currency_changed, run_update_scheduler, init_bot as init_update_bot
 
-async def main():
-    """Главная функция приложения"""
-    if not TOKEN:
-        logging.error("BOT_TOKEN not set in environment variables")
-        return
-    
-    logging.basicConfig(level=logging.INFO)
-    
-    load_users_data()
-    logging.info(f"Loaded users data.")
-        
-    bot = Bot(token=TOKEN)
-    dp = Dispatcher()
+def create_bot():
+    """Бот; с TELEGRAM_API_URL запросы идут на указанный Bot API сервер"""
+    if TELEGRAM_API_URL:
+        return Bot(token=TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+    return Bot(token=TOKEN)
 
-    # Инициализация бота в модуле обновлений
-    init_update_bot(bot)
+def create_dispatcher():
+    """Диспетчер со всеми роутерами и командами"""
+    dp = Dispatcher()
+    # Пока идет фоновая загрузка, пользователь чата читается из базы до хендлеров, вне event loop
+    dp.update.outer_middleware(UserLoadMiddleware())
+    # Повторы команд чтения из одного чата сворачиваются до фильтров и хендлеров
+    dp.message.outer_middleware(CommandDebounceMiddleware())
 
     # Регистрация роутеров
     dp.include_router(common_handlers.router)
     dp.include_router(crypto_handlers.router)
     dp.include_router(portfolio_handlers.router)
+    dp.include_router(threshold_handlers.router)
+    dp.include_router(currency_handlers.router)
+    dp.include_router(alert_handlers.router)
+    dp.include_router(history_handlers.router)
     dp.include_router(admin_handlers.router)
+    # Команды /<код> пары - после всех остальных команд
+    dp.include_router(crypto_handlers.code_router)
     
     # Регистрация хендлеров для start/stop updates
     dp.message.register(update_handlers.start_updates_handler, Command('start_updates'))
     dp.message.register(update_handlers.stop_updates_handler, Command('stop_updates'))
+    return dp
+
+async def main(shard=None):
+    """Главная функция приложения
+
+    shard=(index, count) - один из воркеров вебхука за общим портом (launcher.py --webhook):
+    процесс обслуживает только chat_id % count == index.
+    """
+    if not TOKEN:
+        logging.error("BOT_TOKEN not set in environment variables")
+        return
+    
+    logging.basicConfig(level=logging.INFO)
+
+    # Каталог пар: воркеры вебхука читают кэш, который launcher.py обновил до их запуска
+    if shard is None:
+        await refresh_exchange_info()
+    load_symbol_registry()
+    
+    # Менеджер потоков создается до загрузки пользователей, чтобы учесть их выбор пар;
+    # лог тиков пишет один процесс, даже если потоки читают все воркеры вебхука
+    stream_manager = init_stream_manager(mark_price_changed, record=shard is None or shard[0] == 0)
+        
+    bot = create_bot()
+    dp = create_dispatcher()
+
+    # Лимиты Bot API и очередь фоновых отправок
+    delivery_queue = init_delivery(bot, TELEGRAM_GLOBAL_RATE / (shard[1] if shard else 1))
+    
+    # Инициализация бота в модуле обновлений
+    init_update_bot(bot)
+    alert_handlers.init_bot(bot)
+    add_price_listener(alert_handlers.check_alerts)
+    add_price_listener(record_tick)
+    add_price_listener(portfolio_matrix.on_tick)
+    # Тики курсов валют пересчитывают цены пользователей, выбравших эти валюты
+    add_price_listener(quote_engine.on_tick)
+    quote_engine.add_listener(mark_currency_changed)
 
-    # Создаем фоновую задачу для получения цен
-    price_tasks = [asyncio.create_task(get_crypto_price(crypto, update_all_users)) for crypto in SUPPORTED_CRYPTOS]
+    # Все пары читаются через общий пул combined-stream соединений
+    stream_manager.start()
+    delivery_queue.start()
+    # Рассылка обновлений идет отдельным циклом и не блокирует чтение сокетов
+    scheduler_task = asyncio.create_task(run_update_scheduler())
+    lag_task = asyncio.create_task(monitor_loop_lag())
+    # Пользователи загружаются в фоне: цены и команды принимаются сразу, живые сообщения
+    # восстанавливаются постепенно за RESTORE_RAMP_SECONDS
+    load_task = asyncio.create_task(load_users_background(shard, alerts=True))
+    # История цен из лога тиков прошлых запусков тоже восстанавливается в фоне
+    history_task = asyncio.create_task(restore_history())
+    metrics_runner = await start_metrics_server(shard[0] if shard else 0)
     
     try:
-        logging.info("Starting bot polling...")
-        await dp.start_polling(bot)
+        if UPDATE_MODE == "webhook" or shard is not None:
+            await run_webhook(dp, bot, *(shard or (0, 1)))
+        else:
+            logging.info("Starting bot polling...")
+            await bot.delete_webhook()  # getUpdates не работает, пока установлен вебхук
+            await dp.start_polling(bot)
     except Exception as e:
-        logging.error(f"Error in polling: {e}")
+        logging.error(f"Error receiving updates: {e}")
     finally:
         logging.info("Shutting down bot...")
-        save_users_data()
-        for task in price_tasks:
-            task.cancel()
-        await asyncio.gather(*price_tasks, return_exceptions=True)
+        load_task.cancel()
+        history_task.cancel()
+        await asyncio.gather(load_task, history_task, return_exceptions=True)
+        await close_user_store()
+        scheduler_task.cancel()
+        lag_task.cancel()
+        await asyncio.gather(scheduler_task, lag_task, return_exceptions=True)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await stream_manager.stop()
+        await delivery_queue.stop()
         await bot.session.close()
+        shutdown_executors()
         logging.info("Bot shutdown complete")
 
 if __name__ == "__main__":
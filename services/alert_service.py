@@ -0,0 +1,91 @@
+# services/alert_service.py
+import math
+from bisect import bisect_left
+
+ABOVE = "above"
+BELOW = "below"
+
+class Alert:
+    """Ценовое оповещение пользователя"""
+
+    __slots__ = ("alert_id", "chat_id", "crypto", "direction", "threshold")
+
+    def __init__(self, alert_id, chat_id, crypto, direction, threshold):
+        self.alert_id = alert_id
+        self.chat_id = chat_id
+        self.crypto = crypto
+        self.direction = direction
+        self.threshold = threshold
+
+    def describe(self):
+        sign = "≥" if self.direction == ABOVE else "≤"
+        return f"{self.crypto} {sign} €{self.threshold:,.2f}"
+
+def _key(direction, threshold):
+    return -threshold if direction == ABOVE else threshold
+
+class AlertEngine:
+    """Индекс оповещений: по каждой криптовалюте отсортированные списки (ключ, id)
+
+    Ключ "ниже" - порог, ключ "выше" - порог со знаком минус: сработавшие оповещения
+    обоих направлений оказываются в конце списка и снимаются без сдвига остальных,
+    поэтому проверка тика стоит O(log n + k), а при отсутствии пересечений - O(1).
+    Новые оповещения дописываются в конец списка, а список досортировывается
+    при следующем обращении, поэтому массовая загрузка стоит O(n log n).
+    """
+
+    def __init__(self):
+        self.alerts = {}  # alert_id -> Alert
+        self._above = {}  # crypto -> [(-threshold, alert_id)] по возрастанию, то есть пороги по убыванию
+        self._below = {}  # crypto -> [(threshold, alert_id)] по возрастанию
+        self._unsorted = set()  # (направление, crypto) с недосортированными списками
+        self._next_id = 1
+
+    def add(self, chat_id, crypto, threshold, direction):
+        # NaN не сравним ни с одной ценой и, встав в список, закрыл бы срабатывание остальных
+        if not math.isfinite(threshold) or threshold <= 0:
+            raise ValueError(f"Invalid alert threshold: {threshold}")
+        alert = Alert(self._next_id, chat_id, crypto, direction, threshold)
+        self._next_id += 1
+        self.alerts[alert.alert_id] = alert
+        index = self._above if direction == ABOVE else self._below
+        index.setdefault(crypto, []).append((_key(direction, threshold), alert.alert_id))
+        self._unsorted.add((direction, crypto))
+        return alert
+
+    def _index(self, direction, crypto):
+        index = (self._above if direction == ABOVE else self._below).get(crypto)
+        if index is not None and (direction, crypto) in self._unsorted:
+            index.sort()
+            self._unsorted.discard((direction, crypto))
+        return index
+
+    def remove(self, alert_id):
+        alert = self.alerts.pop(alert_id, None)
+        if alert is None:
+            return None
+        index = self._index(alert.direction, alert.crypto)
+        position = bisect_left(index, (_key(alert.direction, alert.threshold), alert_id))
+        if position < len(index) and index[position][1] == alert_id:
+            del index[position]
+        return alert
+
+    def check(self, crypto, price):
+        """Снять и вернуть оповещения, пороги которых пересечены ценой"""
+        fired = []
+        above = self._index(ABOVE, crypto)
+        if above and above[-1][0] >= -price:
+            position = bisect_left(above, (-price, float("-inf")))
+            fired.extend(above[position:])
+            del above[position:]
+        below = self._index(BELOW, crypto)
+        if below and below[-1][0] >= price:
+            position = bisect_left(below, (price, float("-inf")))
+            fired.extend(below[position:])
+            del below[position:]
+        return [self.alerts.pop(alert_id) for _, alert_id in fired]
+
+    def __len__(self):
+        return len(self.alerts)
+
+alert_engine = AlertEngine()
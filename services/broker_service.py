@@ -0,0 +1,99 @@
+# services/broker_service.py
+import asyncio
+import json
+import logging
+import os
+from config import RECONNECTION_DELAY, BROKER_CLIENT_BUFFER
+from services.metrics_service import register_stats
+
+# События между процессами (по одному JSON-объекту на строку):
+# {"type": "tick", "crypto": str, "price": float, "t": float}
+# {"type": "user", "chat_id": int, "record": dict, "portfolio_message_id": int (необязательно)}
+# {"type": "reset", "chat_id": int}
+# {"type": "symbol", "crypto": str, "enabled": bool}
+# {"type": "resync"} - формирует сам клиент после переподключения: события за время разрыва
+# потеряны, и воркер перечитывает состояние своего шарда
+
+broker_stats = {"published": 0, "dropped": 0, "disconnected": 0}
+register_stats("cryptobot_broker", broker_stats, "Tick broker events")
+
+class UnixSocketBroker:
+    """Брокер поверх Unix-сокета: процесс приема цен публикует, воркеры доставки читают"""
+
+    def __init__(self, path):
+        self.path = path
+        self._server = None
+        self._writers = set()
+
+    async def start(self):
+        """Запуск серверной (публикующей) стороны"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._accept, path=self.path)
+        logging.info(f"Tick broker listening on {self.path}")
+        return self
+
+    async def _accept(self, reader, writer):
+        self._writers.add(writer)
+        logging.info(f"Delivery worker connected to broker ({len(self._writers)} total)")
+        try:
+            await reader.read()  # клиенты ничего не пишут; ждем закрытия соединения
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    def publish(self, event):
+        if not self._writers:
+            return
+        line = (json.dumps(event, separators=(",", ":")) + "\n").encode()
+        broker_stats["published"] += 1
+        for writer in list(self._writers):
+            if writer.transport.get_write_buffer_size() > BROKER_CLIENT_BUFFER:
+                # Медленный воркер теряет тики (следующий тик все равно заменит цену), а не тормозит прием
+                if event["type"] == "tick":
+                    broker_stats["dropped"] += 1
+                    continue
+                # Потерянное изменение пользователя или пары не восстановить: воркер отключается
+                # и после переподключения перечитывает свой шард
+                broker_stats["disconnected"] += 1
+                logging.warning(f"Delivery worker is {BROKER_CLIENT_BUFFER} bytes behind, disconnecting it")
+                self._writers.discard(writer)
+                writer.transport.abort()
+                continue
+            writer.write(line)
+
+    async def subscribe(self):
+        """Клиентская сторона: соединение устанавливается до возврата async-итератора событий"""
+        return self._events(await self._connect())
+
+    async def _connect(self):
+        while True:
+            try:
+                return await asyncio.open_unix_connection(self.path, limit=2 ** 20)
+            except OSError as e:
+                logging.warning(f"Broker {self.path} unavailable ({e}). Retrying in {RECONNECTION_DELAY} seconds...")
+                await asyncio.sleep(RECONNECTION_DELAY)
+
+    async def _events(self, connection):
+        while True:
+            reader, writer = connection
+            try:
+                while line := await reader.readline():
+                    yield json.loads(line)
+            finally:
+                writer.close()
+            logging.warning(f"Broker connection closed. Reconnecting in {RECONNECTION_DELAY} seconds...")
+            await asyncio.sleep(RECONNECTION_DELAY)
+            connection = await self._connect()
+            yield {"type": "resync"}
+
+    async def close(self):
+        for writer in list(self._writers):
+            writer.close()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
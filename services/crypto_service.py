@@ -2,37 +2,505 @@
 import time
 import logging
 import json
+import random
+import aiohttp
 import websockets
 import asyncio
-from config import SUPPORTED_CRYPTOS, RECONNECTION_DELAY
+from collections import defaultdict
+from config import (
+    SUPPORTED_CRYPTOS, BINANCE_WS_BASE, BINANCE_WS_FALLBACKS, BINANCE_REST_BASE,
+    STREAMS_PER_CONNECTION, SUBSCRIPTION_FLUSH_INTERVAL, STREAM_ON_DEMAND, TICKER_STREAM,
+    RECONNECT_BACKOFF_BASE, RECONNECT_BACKOFF_MAX, CONNECTION_STALE_AFTER, STREAM_STALE_AFTER,
+    CONNECTION_MAX_AGE, WATCHDOG_INTERVAL, ENDPOINT_FAILOVER_AFTER, REST_SNAPSHOT_INTERVAL, REST_TIMEOUT,
+    TICK_RECORD_FILE, TICK_REPLAY_FILE, TICK_REPLAY_SPEED, TICK_REPLAY_LOOP
+)
+from services.decode_service import ticker_decoder
+from services.symbol_service import symbol_registry, crypto_info
+from services.metrics_service import ticks_total, ws_reconnects_total
+from services.tick_log_service import TickRecorder, read_tick_log
 
 # Глобальные переменные для отслеживания цен
-price_data = {crypto: {"price": None, "last_update": 0} for crypto in SUPPORTED_CRYPTOS}
-
-async def get_crypto_price(crypto, update_callback):
-    """Получение цены конкретной криптовалюты через WebSocket Binance"""
-    crypto_info = SUPPORTED_CRYPTOS[crypto]
-    uri = f"wss://stream.binance.com:9443/ws/{crypto_info['pair']}@ticker"
-    
-    while True:
+# source: "ws" - цена из потока, "rest" - из REST-снимка, пока поток недоступен
+# Запись создается при первом обращении: пары включаются во время работы, а пользователь
+# может оставаться на выключенной паре
+def _empty_price():
+    return {"price": None, "last_update": 0, "source": None}
+
+price_data = defaultdict(_empty_price)
+
+# Синхронные обработчики каждого тика: listener(crypto, price, timestamp)
+price_listeners = []
+
+def add_price_listener(listener):
+    price_listeners.append(listener)
+
+def stream_name(crypto):
+    """Имя потока Binance для криптовалюты"""
+    return f"{crypto_info(crypto)['pair']}@{TICKER_STREAM}"
+
+def update_price(crypto, new_price, current_time, source="ws"):
+    """Запись новой цены и уведомление обработчиков тиков"""
+    data = price_data[crypto]
+    data["price"] = new_price
+    data["last_update"] = current_time
+    data["source"] = source
+    ticks_total.labels(crypto).inc()
+
+    for listener in price_listeners:
+        listener(crypto, new_price, current_time)
+
+    logging.debug(f"Updated {crypto}/EUR price: {new_price}")
+
+def price_age(crypto, now=None):
+    """Секунд с последнего обновления цены (None - цены еще нет)"""
+    last_update = price_data[crypto]["last_update"]
+    return (now or time.time()) - last_update if last_update else None
+
+def is_stale(crypto, now=None):
+    age = price_age(crypto, now)
+    return age is not None and age > STREAM_STALE_AFTER
+
+MAX_AGE_REASON = "connection max age reached"
+
+class Backoff:
+    """Экспоненциальная задержка с полным джиттером: после общего сбоя соединения
+    переподключаются вразнобой, а не одновременно"""
+
+    def __init__(self, base=RECONNECT_BACKOFF_BASE, cap=RECONNECT_BACKOFF_MAX):
+        self.base = base
+        self.cap = cap
+        self.attempt = 0
+
+    def next_delay(self):
+        delay = random.uniform(0, min(self.cap, self.base * 2 ** self.attempt))
+        self.attempt += 1
+        return delay
+
+    def reset(self):
+        self.attempt = 0
+
+class ConnectionSupervisor:
+    """Состояние одного соединения: backoff, счетчик переподключений, переключение адресов"""
+
+    def __init__(self, name, base_urls):
+        self.name = name
+        self.base_urls = base_urls
+        self.endpoint = 0
+        self.backoff = Backoff()
+        self.failures = 0  # неудачных подключений подряд
+        self.reconnects = 0
+        self.state = "connecting"
+        self.connected_at = 0.0
+
+    @property
+    def url(self):
+        return self.base_urls[self.endpoint]
+
+    def connected(self):
+        self.state = "connected"
+        self.connected_at = time.time()
+
+    def healthy(self):
+        """Соединение доставляет кадры: следующий сбой снова начнет с короткой задержки"""
+        self.failures = 0
+        self.backoff.reset()
+
+    async def reconnect(self, reason, failure=True):
+        """Пауза перед переподключением; плановое переподключение (failure=False) - без паузы"""
+        self.state = "reconnecting"
+        self.reconnects += 1
+        ws_reconnects_total.labels(self.name).inc()
+        if not failure:
+            logging.info(f"WebSocket {self.name}: {reason}, reconnecting now")
+            return
+        self.failures += 1
+        if len(self.base_urls) > 1 and self.failures % ENDPOINT_FAILOVER_AFTER == 0:
+            self.endpoint = (self.endpoint + 1) % len(self.base_urls)
+            logging.warning(f"WebSocket {self.name}: failing over to {self.url}")
+        delay = self.backoff.next_delay()
+        logging.warning(f"WebSocket {self.name}: {reason}. Reconnecting in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
+
+async def fetch_rest_snapshot(cryptos, base_url=BINANCE_REST_BASE):
+    """Цены пар одним запросом /api/v3/ticker/price - заполняет пропуск, пока поток недоступен"""
+    symbols = {crypto_info(crypto)["pair"].upper(): crypto for crypto in cryptos}
+    params = {"symbols": json.dumps(list(symbols), separators=(",", ":"))}
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REST_TIMEOUT)) as session:
+        async with session.get(f"{base_url}/api/v3/ticker/price", params=params) as response:
+            response.raise_for_status()
+            items = await response.json()
+    now = time.time()
+    filled = []
+    for item in items:
+        crypto = symbols.get(item["symbol"])
+        if crypto is not None:
+            update_price(crypto, float(item["price"]), now, source="rest")
+            filled.append(crypto)
+    return filled
+
+class StreamShard:
+    """Одно combined-stream соединение Binance с набором потоков"""
+
+    def __init__(self, index, base_urls, update_callback, recorder=None):
+        self.index = index
+        self.supervisor = ConnectionSupervisor(f"shard{index}", base_urls)
+        self.update_callback = update_callback
+        self.recorder = recorder
+        self.streams = {}  # имя потока -> код криптовалюты
+        self.websocket = None
+        self.task = None
+        self.last_frame = 0.0  # время последнего кадра соединения
+        self.last_seen = {}  # имя потока -> время последнего кадра потока
+        self._changed = asyncio.Event()
+        self._pending = {}  # имя потока -> "SUBSCRIBE" / "UNSUBSCRIBE"
+        self._request_id = 0
+        self._resubscribed = {}  # имя потока -> время последней повторной подписки
+        self._close_reason = None
+
+    def add(self, crypto):
+        name = stream_name(crypto)
+        self.streams[name] = crypto
+        self._queue(name, "SUBSCRIBE")
+
+    def remove(self, crypto):
+        name = stream_name(crypto)
+        self.streams.pop(name, None)
+        self.last_seen.pop(name, None)
+        self._queue(name, "UNSUBSCRIBE")
+
+    def _queue(self, name, method):
+        if self.websocket is not None:
+            self._pending[name] = method
+        self._changed.set()
+
+    async def run(self):
+        while True:
+            if not self.streams:
+                self._changed.clear()
+                await self._changed.wait()
+                continue
+
+            connected_streams = set(self.streams)
+            uri = f"{self.supervisor.url}/stream?streams={'/'.join(connected_streams)}"
+            self._close_reason = None
+            try:
+                async with websockets.connect(uri) as websocket:
+                    self.websocket = websocket
+                    self.supervisor.connected()
+                    self.last_frame = self.supervisor.connected_at
+                    # Изменения, пришедшие во время подключения, досылаем через SUBSCRIBE/UNSUBSCRIBE
+                    self._pending = {name: "SUBSCRIBE" for name in self.streams if name not in connected_streams}
+                    self._pending.update({name: "UNSUBSCRIBE" for name in connected_streams if name not in self.streams})
+                    self._changed.set()
+                    logging.info(f"Combined stream #{self.index} connected to {self.supervisor.url} ({len(self.streams)} streams)")
+                    helpers = [asyncio.create_task(self._flush_subscriptions()), asyncio.create_task(self._watchdog(websocket))]
+                    try:
+                        await self._read(websocket)
+                    finally:
+                        for helper in helpers:
+                            helper.cancel()
+                        self.websocket = None
+                reason = self._close_reason or "closed by server"
+            except websockets.exceptions.ConnectionClosed:
+                reason = self._close_reason or "connection closed"
+            except Exception as e:
+                reason = f"error {e}"
+            # Плановое переподключение до 24-часового лимита - сразу, остальные - с backoff
+            planned = self._close_reason == MAX_AGE_REASON
+            await self.supervisor.reconnect(f"combined stream #{self.index} {reason}", failure=not planned)
+
+    async def _read(self, websocket):
+        decode = ticker_decoder.combined
+        last_seen = self.last_seen
+        record = self.recorder.record if self.recorder is not None else None
+        async for message in websocket:
+            now = self.last_frame = time.time()
+            stream, price = decode(message)
+            crypto = self.streams.get(stream)
+            if crypto is None or price is None:
+                # Ответ на SUBSCRIBE/UNSUBSCRIBE или уже отписанный поток
+                continue
+            last_seen[stream] = now
+            if record is not None:
+                record(now, message)
+            update_price(crypto, price, now)
+            self.update_callback(crypto)
+
+    def stale_streams(self, now):
+        """Потоки соединения без кадров дольше STREAM_STALE_AFTER (при разрыве - все потоки)"""
+        if self.websocket is None:
+            return list(self.streams)
+        since = self.supervisor.connected_at
+        return [name for name in self.streams if now - max(self.last_seen.get(name, 0), since) > STREAM_STALE_AFTER]
+
+    async def _watchdog(self, websocket):
+        """Зависшее соединение, замолчавшие потоки и плановое переподключение до лимита Binance"""
+        while True:
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+            now = time.time()
+            if now - self.last_frame > CONNECTION_STALE_AFTER:
+                self._close_reason = f"stalled (no frames for {now - self.last_frame:.0f}s)"
+            elif now - self.supervisor.connected_at > CONNECTION_MAX_AGE:
+                self._close_reason = MAX_AGE_REASON
+            if self._close_reason:
+                await websocket.close()
+                return
+            if self.supervisor.failures and self.last_frame > self.supervisor.connected_at:
+                self.supervisor.healthy()
+
+            # Замолчавший поток при живом соединении - повторная подписка не чаще раза в STREAM_STALE_AFTER
+            for name in self.stale_streams(now):
+                if now - self._resubscribed.get(name, 0) > STREAM_STALE_AFTER:
+                    self._resubscribed[name] = now
+                    logging.warning(f"Combined stream #{self.index}: {name} is stale, resubscribing")
+                    self._queue(name, "SUBSCRIBE")
+
+    async def _flush_subscriptions(self):
+        """Отправка накопленных изменений подписок одним сообщением на метод"""
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            if self._pending:
+                pending, self._pending = self._pending, {}
+                for method in ("SUBSCRIBE", "UNSUBSCRIBE"):
+                    params = [name for name, m in pending.items() if m == method]
+                    if params:
+                        self._request_id += 1
+                        await self.websocket.send(json.dumps({"method": method, "params": params, "id": self._request_id}))
+                        logging.info(f"Combined stream #{self.index}: {method} {params}")
+            await asyncio.sleep(SUBSCRIPTION_FLUSH_INTERVAL)
+
+class StreamManager:
+    """Мультиплексирование всех пар через пул combined-stream соединений"""
+
+    def __init__(self, update_callback, base_url=BINANCE_WS_BASE, streams_per_connection=STREAMS_PER_CONNECTION,
+                 fallback_urls=BINANCE_WS_FALLBACKS, rest_url=BINANCE_REST_BASE, recorder=None):
+        self.update_callback = update_callback
+        self.recorder = recorder  # TickRecorder: сырые кадры всех соединений пишутся в лог тиков
+        self.base_urls = [base_url] + [url for url in fallback_urls if url != base_url]
+        self.rest_url = rest_url
+        self.streams_per_connection = streams_per_connection
+        self.shards = []
+        self._gap_filler = None
+        self._refs = {}  # код криптовалюты -> число подписчиков
+        self._pinned = set()
+        self._shard_of = {}  # код криптовалюты -> шард
+        self._running = False
+
+    def subscribe(self, crypto, pinned=False):
+        """Подписаться на пару (с подсчетом ссылок); поток открывается, только если пара включена
+        или это пара курса валюты"""
+        if pinned:
+            self._pinned.add(crypto)
+        self._refs[crypto] = self._refs.get(crypto, 0) + 1
+        if crypto in SUPPORTED_CRYPTOS or crypto in symbol_registry.conversions:
+            self._open(crypto)
+
+    def _open(self, crypto):
+        if crypto not in self._shard_of:
+            shard = self._pick_shard()
+            shard.add(crypto)
+            self._shard_of[crypto] = shard
+
+    def enable(self, crypto, pinned=False):
+        """Пара включена администратором: открыть поток, если он нужен подписчикам или закреплен"""
+        if pinned:
+            self._pinned.add(crypto)
+        if crypto in self._refs or crypto in self._pinned:
+            self._open(crypto)
+
+    def disable(self, crypto):
+        """Пара выключена: закрыть поток, сохранив подписки до повторного включения"""
+        shard = self._shard_of.pop(crypto, None)
+        if shard is not None:
+            shard.remove(crypto)
+
+    def unsubscribe(self, crypto):
+        """Снять одну подписку; поток закрывается, когда подписчиков не осталось"""
+        count = self._refs.get(crypto, 0) - 1
+        if count > 0:
+            self._refs[crypto] = count
+            return
+        self._refs.pop(crypto, None)
+        if crypto in self._pinned:
+            return
+        shard = self._shard_of.pop(crypto, None)
+        if shard is not None:
+            shard.remove(crypto)
+
+    @property
+    def subscribed(self):
+        return set(self._shard_of)
+
+    def _pick_shard(self):
+        candidates = [s for s in self.shards if len(s.streams) < self.streams_per_connection]
+        if candidates:
+            return min(candidates, key=lambda s: len(s.streams))
+        shard = StreamShard(len(self.shards), self.base_urls, self.update_callback, self.recorder)
+        self.shards.append(shard)
+        if self._running:
+            shard.task = asyncio.create_task(shard.run())
+        return shard
+
+    def start(self):
+        self._running = True
+        if self.recorder is not None:
+            self.recorder.start()
+        for shard in self.shards:
+            if shard.task is None:
+                shard.task = asyncio.create_task(shard.run())
+        if self.rest_url and self._gap_filler is None:
+            self._gap_filler = asyncio.create_task(self._fill_gaps())
+
+    async def _fill_gaps(self):
+        """REST-снимки цен пар, чей поток разорван или замолчал, до восстановления потока"""
+        while True:
+            await asyncio.sleep(REST_SNAPSHOT_INTERVAL)
+            now = time.time()
+            gaps = [shard.streams[name] for shard in self.shards for name in shard.stale_streams(now)]
+            if not gaps:
+                continue
+            try:
+                for crypto in await fetch_rest_snapshot(gaps, self.rest_url):
+                    self.update_callback(crypto)
+                logging.info(f"Filled {len(gaps)} stale pairs from REST snapshot")
+            except Exception as e:
+                logging.warning(f"REST snapshot failed: {e}")
+
+    async def stop(self):
+        self._running = False
+        tasks = [shard.task for shard in self.shards if shard.task is not None]
+        if self._gap_filler is not None:
+            tasks.append(self._gap_filler)
+            self._gap_filler = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for shard in self.shards:
+            shard.task = None
+        if self.recorder is not None:
+            await self.recorder.stop()
+
+class ReplayStreamManager(StreamManager):
+    """Проигрывание лога тиков вместо WebSocket Binance (TICK_REPLAY_FILE)
+
+    Подписки учитываются как у StreamManager, но соединения не открываются: кадры читаются
+    из файла и идут тем же путем decode -> update_price -> update_callback, что и живые.
+    Паузы между кадрами повторяют запись, деленную на speed (0 - без пауз); цены получают
+    текущее время, чтобы рассылка и проверка устаревания работали как с живым потоком.
+    """
+
+    YIELD_EVERY = 1000  # кадров между передачами управления event loop без пауз
+
+    def __init__(self, update_callback, path, speed=TICK_REPLAY_SPEED, loop=TICK_REPLAY_LOOP,
+                 streams_per_connection=STREAMS_PER_CONNECTION):
+        super().__init__(update_callback, f"file://{path}", streams_per_connection, fallback_urls=(), rest_url=None)
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self.frames = 0  # кадров, переданных в update_price
+        self._task = None
+
+    def _pick_shard(self):
+        # Шарды только хранят подписки; их соединения не запускаются
+        candidates = [s for s in self.shards if len(s.streams) < self.streams_per_connection]
+        if candidates:
+            return min(candidates, key=lambda s: len(s.streams))
+        shard = StreamShard(len(self.shards), self.base_urls, self.update_callback)
+        shard.supervisor.state = "replay"
+        self.shards.append(shard)
+        return shard
+
+    def _crypto_of(self, stream):
+        for shard in self.shards:
+            crypto = shard.streams.get(stream)
+            if crypto is not None:
+                return crypto
+        return None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._replay())
+
+    async def _replay(self):
+        decode = ticker_decoder.combined
         try:
-            async with websockets.connect(uri) as websocket:
-                logging.info(f"WebSocket connected to Binance ({crypto}/EUR)")
-                async for message in websocket:
-                    data = json.loads(message)
-                    new_price = float(data['c'])
-                    current_time = time.time()
-                    
-                    price_data[crypto]["price"] = new_price
-                    price_data[crypto]["last_update"] = current_time
-                    
-                    logging.debug(f"Updated {crypto}/EUR price: {new_price}")
-                    
-                    await update_callback()
-                    
-        except websockets.exceptions.ConnectionClosed:
-            logging.warning(f"WebSocket connection closed for {crypto}. Reconnecting in {RECONNECTION_DELAY} seconds...")
-            await asyncio.sleep(RECONNECTION_DELAY)
-        except Exception as e:
-            logging.error(f"Error in WebSocket connection for {crypto}: {e}")
-            await asyncio.sleep(RECONNECTION_DELAY * 2)
+            while True:
+                started = time.monotonic()
+                first = None
+                for count, (recorded_at, message) in enumerate(read_tick_log(self.path)):
+                    if first is None:
+                        first = recorded_at
+                    delay = (recorded_at - first) / self.speed - (time.monotonic() - started) if self.speed else 0
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    elif count % self.YIELD_EVERY == 0:
+                        await asyncio.sleep(0)
+                    stream, price = decode(message)
+                    crypto = self._crypto_of(stream)
+                    if crypto is None or price is None:
+                        continue
+                    update_price(crypto, price, time.time())
+                    self.update_callback(crypto)
+                    self.frames += 1
+                logging.info(f"Replayed {self.path}: {self.frames} frames so far")
+                if not self.loop:
+                    return
+        except (OSError, ValueError) as e:
+            logging.error(f"Error replaying tick log {self.path}: {e}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+stream_manager: StreamManager = None
+
+def init_stream_manager(update_callback, base_url=BINANCE_WS_BASE, record=True):
+    """Создание менеджера потоков; без STREAM_ON_DEMAND подписывается на все пары
+
+    С TICK_REPLAY_FILE цены читаются из лога тиков, с TICK_RECORD_FILE кадры Binance пишутся
+    в лог (record=False - не писать, когда те же потоки читают несколько процессов).
+    """
+    global stream_manager
+    if TICK_REPLAY_FILE:
+        stream_manager = ReplayStreamManager(update_callback, TICK_REPLAY_FILE)
+    else:
+        recorder = TickRecorder(TICK_RECORD_FILE) if TICK_RECORD_FILE and record else None
+        stream_manager = StreamManager(update_callback, base_url, recorder=recorder)
+    if not STREAM_ON_DEMAND:
+        for crypto in SUPPORTED_CRYPTOS:
+            stream_manager.subscribe(crypto, pinned=True)
+    return stream_manager
+
+def _on_symbol_change(crypto, enabled):
+    """Включение и выключение пар реестром: поток подписывается и закрывается без перезапуска"""
+    if stream_manager is None:
+        return
+    if enabled:
+        stream_manager.enable(crypto, pinned=not STREAM_ON_DEMAND)
+    else:
+        stream_manager.disable(crypto)
+
+symbol_registry.add_listener(_on_symbol_change)
+
+def acquire_crypto_stream(crypto):
+    """Пользователь выбрал пару - держим ее поток открытым"""
+    if stream_manager is not None and STREAM_ON_DEMAND:
+        stream_manager.subscribe(crypto)
+
+def release_crypto_stream(crypto):
+    """Пользователь отказался от пары"""
+    if stream_manager is not None and STREAM_ON_DEMAND:
+        stream_manager.unsubscribe(crypto)
+
+def acquire_conversion_stream(code):
+    """Пользователь смотрит цены в другой валюте - нужен поток курса (независимо от STREAM_ON_DEMAND:
+    курсы нужны только тем, кто выбрал валюту)"""
+    if stream_manager is not None:
+        stream_manager.subscribe(code)
+
+def release_conversion_stream(code):
+    if stream_manager is not None:
+        stream_manager.unsubscribe(code)
@@ -0,0 +1,156 @@
+# services/decode_service.py
+import json
+import logging
+from typing import Optional
+from config import JSON_DECODER, TICKER_STREAM
+
+# Необязательные быстрые бэкенды: pip install msgspec (или orjson)
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Из кадра нужна только цена: последняя сделка ("c") для @ticker/@miniTicker,
+# середина спреда ("b"/"a") для @bookTicker
+TICKER_STREAMS = ("ticker", "miniTicker", "bookTicker")
+
+def _price_from_dict(data, stream_type):
+    if stream_type == "bookTicker":
+        return (float(data["b"]) + float(data["a"])) / 2
+    return float(data["c"])
+
+class JsonDecoder:
+    """Полный разбор кадра через json.loads (или orjson.loads) и чтение нужных полей"""
+
+    def __init__(self, stream_type=TICKER_STREAM, loads=json.loads, name="json"):
+        self.stream_type = stream_type
+        self.loads = loads
+        self.name = name
+
+    def frame(self, message):
+        """Цена из кадра одиночного потока (/ws/<stream>)"""
+        data = self.loads(message)
+        try:
+            return _price_from_dict(data, self.stream_type)
+        except KeyError:
+            return None
+
+    def combined(self, message):
+        """(имя потока, цена) из сообщения combined stream; (None, None) для ответов на SUBSCRIBE"""
+        payload = self.loads(message)
+        data = payload.get("data")
+        if data is None:
+            return None, None
+        return payload["stream"], _price_from_dict(data, self.stream_type)
+
+class FieldDecoder:
+    """Разбор без json: поиск нужных полей прямо в тексте кадра
+
+    Binance присылает компактный JSON с фиксированными строковыми полями, поэтому
+    значение "c" (или "b"/"a") и имя потока извлекаются поиском подстроки.
+    """
+
+    name = "fields"
+
+    def __init__(self, stream_type=TICKER_STREAM):
+        self.stream_type = stream_type
+        self._fields = ('"b":"', '"a":"') if stream_type == "bookTicker" else ('"c":"',)
+
+    @staticmethod
+    def _string_field(message, key, start=0):
+        i = message.find(key, start)
+        if i < 0:
+            return None
+        i += len(key)
+        return message[i:message.index('"', i)]
+
+    def _price(self, message, start=0):
+        values = [self._string_field(message, key, start) for key in self._fields]
+        if None in values:
+            return None
+        return sum(map(float, values)) / len(values)
+
+    def frame(self, message):
+        return self._price(message)
+
+    def combined(self, message):
+        stream = self._string_field(message, '"stream":"')
+        if stream is None:
+            return None, None
+        return stream, self._price(message, message.find('"data":'))
+
+if msgspec is not None:
+    # Типизированные структуры: msgspec декодирует только объявленные поля и пропускает остальные
+    class TickerData(msgspec.Struct):
+        c: str
+
+    class BookTickerData(msgspec.Struct):
+        b: str
+        a: str
+
+    class CombinedTicker(msgspec.Struct):
+        stream: str = ""
+        data: Optional[TickerData] = None
+
+    class CombinedBookTicker(msgspec.Struct):
+        stream: str = ""
+        data: Optional[BookTickerData] = None
+
+class MsgspecDecoder:
+    """Декодирование в типизированные msgspec.Struct с чтением только нужных полей"""
+
+    name = "msgspec"
+
+    def __init__(self, stream_type=TICKER_STREAM):
+        self.stream_type = stream_type
+        book = stream_type == "bookTicker"
+        self._frame = msgspec.json.Decoder(BookTickerData if book else TickerData)
+        self._combined = msgspec.json.Decoder(CombinedBookTicker if book else CombinedTicker)
+
+    def _price(self, data):
+        if self.stream_type == "bookTicker":
+            return (float(data.b) + float(data.a)) / 2
+        return float(data.c)
+
+    def frame(self, message):
+        try:
+            return self._price(self._frame.decode(message))
+        except msgspec.ValidationError:
+            return None
+
+    def combined(self, message):
+        payload = self._combined.decode(message)
+        if payload.data is None:
+            return None, None
+        return payload.stream, self._price(payload.data)
+
+def available_decoders():
+    """Имена декодеров, доступных в текущем окружении"""
+    names = ["json", "fields"]
+    if orjson is not None:
+        names.append("orjson")
+    if msgspec is not None:
+        names.append("msgspec")
+    return names
+
+def get_decoder(name=JSON_DECODER, stream_type=TICKER_STREAM):
+    """Декодер по имени; "auto" выбирает msgspec, затем orjson, затем разбор по полям"""
+    if stream_type not in TICKER_STREAMS:
+        raise ValueError(f"Unknown ticker stream type: {stream_type}")
+    if name == "auto":
+        name = "msgspec" if msgspec is not None else "orjson" if orjson is not None else "fields"
+    if name == "msgspec" and msgspec is not None:
+        return MsgspecDecoder(stream_type)
+    if name == "orjson" and orjson is not None:
+        return JsonDecoder(stream_type, orjson.loads, "orjson")
+    if name == "fields":
+        return FieldDecoder(stream_type)
+    if name != "json":
+        logging.warning(f"JSON decoder {name} is not installed, falling back to json")
+    return JsonDecoder(stream_type)
+
+ticker_decoder = get_decoder()
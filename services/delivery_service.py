@@ -0,0 +1,209 @@
+# services/delivery_service.py
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST,
+    DELIVERY_WORKERS, DELIVERY_QUEUE_SIZE, DELIVERY_MAX_RETRIES
+)
+from services.metrics_service import register_stats
+
+# Приоритеты исходящих запросов: ответы на команды идут раньше фоновых правок цены
+PRIORITY_HIGH = 0
+PRIORITY_LOW = 1
+
+# Приоритет текущей задачи; воркеры очереди выставляют PRIORITY_LOW
+request_priority = ContextVar("request_priority", default=PRIORITY_HIGH)
+
+# Счетчики доставки
+delivery_stats = {"sent": 0, "merged": 0, "dropped": 0, "retry_after": 0, "failed": 0}
+register_stats("cryptobot_delivery", delivery_stats, "Delivery queue events")
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не более capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+
+    def wait_time(self, now):
+        """Сколько ждать до появления токена (0 - токен доступен)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.paused_until - now)
+
+    def consume(self):
+        self.tokens -= 1
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class RateLimiter:
+    """Глобальный и поканальный лимиты Bot API с приоритетом для ответов на команды"""
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, chat_rate=TELEGRAM_CHAT_RATE, chat_burst=TELEGRAM_CHAT_BURST,
+                 global_burst=TELEGRAM_GLOBAL_BURST):
+        # Полный бакет на rate токенов дал бы на старте (и после простоя) всплеск сверх лимита
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = {}
+        self._high_waiting = 0
+        self._acquired = 0
+        # Последний TelegramRetryAfter: (chat_id, время окончания паузы)
+        self._flood = (None, 0.0)
+
+    def chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def acquire(self, chat_id, priority=PRIORITY_HIGH):
+        # Сначала токен своего чата: ожидание лимита или паузы retry_after одного чата
+        # не задерживает запросы в другие чаты
+        chat_bucket = self.chat_bucket(chat_id)
+        while True:
+            wait = chat_bucket.wait_time(time.monotonic())
+            if wait <= 0:
+                chat_bucket.consume()
+                break
+            await asyncio.sleep(wait)
+
+        # Ответ на команду считается ожидающим, только пока ждет глобальный токен
+        high = priority == PRIORITY_HIGH
+        if high:
+            self._high_waiting += 1
+        try:
+            while True:
+                if not high and self._high_waiting:
+                    # Фоновые правки уступают глобальные токены ответам на команды
+                    await asyncio.sleep(1 / self.global_bucket.rate)
+                    continue
+                wait = self.global_bucket.wait_time(time.monotonic())
+                if wait <= 0:
+                    self.global_bucket.consume()
+                    break
+                await asyncio.sleep(wait)
+        finally:
+            if high:
+                self._high_waiting -= 1
+
+        self._acquired += 1
+        if self._acquired % 10000 == 0:
+            self._prune(time.monotonic())
+
+    def retry_after(self, chat_id, seconds):
+        """Пауза после TelegramRetryAfter
+
+        Telegram не сообщает, какой лимит превышен. Второй чат, получивший 429, пока не
+        истекла пауза первого, означает глобальный лимит бота: тогда паузу получает и
+        global_bucket, иначе остальные чаты продолжали бы слать запросы во время ожидания.
+        """
+        now = time.monotonic()
+        flood_chat, flood_until = self._flood
+        if flood_chat is not None and flood_chat != chat_id and now < flood_until:
+            self.global_bucket.pause(seconds)
+            logging.warning(f"Flood control in several chats, pausing all requests for {seconds}s")
+        self.chat_bucket(chat_id).pause(seconds)
+        self._flood = (chat_id, now + seconds)
+
+    def _prune(self, now):
+        """Удаление полностью восстановившихся поканальных бакетов"""
+        idle = [chat_id for chat_id, bucket in self.chat_buckets.items()
+                if bucket.wait_time(now) <= 0 and bucket.tokens >= bucket.capacity]
+        for chat_id in idle:
+            del self.chat_buckets[chat_id]
+
+class DeliveryMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: лимиты для запросов в чаты и обработка TelegramRetryAfter"""
+
+    def __init__(self, limiter, max_retries=DELIVERY_MAX_RETRIES):
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        attempt = 0
+        while True:
+            await self.limiter.acquire(chat_id, request_priority.get())
+            try:
+                result = await make_request(bot, method)
+                delivery_stats["sent"] += 1
+                return result
+            except TelegramRetryAfter as e:
+                delivery_stats["retry_after"] += 1
+                self.limiter.retry_after(chat_id, e.retry_after)
+                attempt += 1
+                if attempt > self.max_retries:
+                    delivery_stats["failed"] += 1
+                    raise
+                logging.warning(f"Flood control for {chat_id}, retry in {e.retry_after}s (attempt {attempt})")
+
+class DeliveryQueue:
+    """Очередь фоновых отправок с пулом воркеров и слиянием устаревших задач по ключу"""
+
+    def __init__(self, workers=DELIVERY_WORKERS, maxsize=DELIVERY_QUEUE_SIZE):
+        self.workers = workers
+        self.maxsize = maxsize
+        self._jobs = {}  # ключ -> фабрика корутины
+        self._keys = asyncio.Queue()
+        self._tasks = []
+
+    def submit(self, key, job):
+        """Поставить задачу в очередь; задача с тем же ключом заменяется новой"""
+        if key in self._jobs:
+            self._jobs[key] = job
+            delivery_stats["merged"] += 1
+            return True
+        if len(self._jobs) >= self.maxsize:
+            delivery_stats["dropped"] += 1
+            return False
+        self._jobs[key] = job
+        self._keys.put_nowait(key)
+        return True
+
+    def __len__(self):
+        return len(self._jobs)
+
+    async def _worker(self):
+        request_priority.set(PRIORITY_LOW)
+        while True:
+            key = await self._keys.get()
+            job = self._jobs.pop(key, None)
+            if job is None:
+                continue
+            try:
+                await job()
+            except Exception as e:
+                logging.error(f"Error delivering {key}: {e}")
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+delivery_queue: DeliveryQueue = None
+
+def init_delivery(bot, global_rate=TELEGRAM_GLOBAL_RATE):
+    """Подключение лимитов к сессии бота и создание очереди фоновых отправок"""
+    global delivery_queue
+    bot.session.middleware(DeliveryMiddleware(RateLimiter(global_rate)))
+    delivery_queue = DeliveryQueue()
+    return delivery_queue
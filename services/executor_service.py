@@ -0,0 +1,61 @@
+# services/executor_service.py
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import IO_EXECUTOR_WORKERS, CPU_EXECUTOR_WORKERS
+from services.metrics_service import histogram
+
+# Общие пулы для работы, которая иначе блокировала бы event loop (чтение сокетов и
+# команды): пул потоков для SQLite и файлов и необязательный пул процессов для тяжелых
+# отчетов. Пулы создаются при первом обращении и закрываются shutdown_executors.
+
+executor_seconds = histogram("cryptobot_executor_seconds", "Duration of work offloaded from the event loop", ("pool",))
+
+_io_executor: ThreadPoolExecutor = None
+_cpu_executor: ProcessPoolExecutor = None
+
+def _io_pool():
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=IO_EXECUTOR_WORKERS, thread_name_prefix="cryptobot-io")
+    return _io_executor
+
+def _cpu_pool():
+    """Пул процессов или None, если он отключен (CPU_EXECUTOR_WORKERS=0)"""
+    global _cpu_executor
+    if _cpu_executor is None and CPU_EXECUTOR_WORKERS > 0:
+        # spawn: дочерний процесс не наследует потоки и открытые соединения родителя
+        _cpu_executor = ProcessPoolExecutor(CPU_EXECUTOR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _cpu_executor
+
+async def _run(pool, executor, func, args, kwargs):
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    finally:
+        executor_seconds.labels(pool).observe(time.perf_counter() - started)
+
+async def run_io(func, *args, **kwargs):
+    """Блокирующий ввод-вывод (SQLite, файлы) в пуле потоков; event loop свободен до результата"""
+    return await _run("io", _io_pool(), func, args, kwargs)
+
+async def run_cpu(func, *args, **kwargs):
+    """Тяжелый расчет в пуле процессов; func и аргументы передаются через pickle
+
+    Без пула процессов расчет выполняется в пуле потоков: для NumPy, который отпускает
+    GIL, это тоже снимает нагрузку с event loop.
+    """
+    executor = _cpu_pool()
+    if executor is None:
+        return await _run("cpu_thread", _io_pool(), func, args, kwargs)
+    return await _run("cpu", executor, func, args, kwargs)
+
+def shutdown_executors(wait=True):
+    """Закрытие пулов при остановке; после этого следующий вызов создаст пулы заново"""
+    global _io_executor, _cpu_executor
+    for executor in (_io_executor, _cpu_executor):
+        if executor is not None:
+            executor.shutdown(wait=wait)
+    _io_executor = _cpu_executor = None
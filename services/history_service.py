@@ -0,0 +1,166 @@
+# services/history_service.py
+from array import array
+from config import TICK_HISTORY_SIZE, CANDLE_INTERVALS
+
+class TickRing:
+    """Кольцевой буфер последних тиков фиксированного размера"""
+
+    __slots__ = ("capacity", "times", "prices", "head", "count")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.prices = array("d", bytes(8 * capacity))
+        self.head = -1
+        self.count = 0
+
+    def append(self, price, timestamp):
+        self.head = (self.head + 1) % self.capacity
+        self.times[self.head] = timestamp
+        self.prices[self.head] = price
+        if self.count < self.capacity:
+            self.count += 1
+
+    def last(self, n=None):
+        """Последние n тиков [(timestamp, price)] от старых к новым"""
+        n = self.count if n is None else min(n, self.count)
+        positions = [(self.head - i) % self.capacity for i in range(n - 1, -1, -1)]
+        return [(self.times[i], self.prices[i]) for i in positions]
+
+class CandleRing:
+    """OHLC-свечи одного интервала в кольцевых массивах; текущая свеча обновляется на месте
+
+    Вместо объема в свече хранится число тиков: поток тикера дает только скользящий 24-часовой
+    объем ("v"/"q"), а bookTicker - ни одного, так что объем сделок за интервал из него не получить.
+    """
+
+    __slots__ = ("interval", "capacity", "start", "open", "high", "low", "close", "ticks", "head", "count")
+
+    def __init__(self, interval, capacity):
+        self.interval = interval
+        self.capacity = capacity
+        self.start = array("d", bytes(8 * capacity))
+        self.open = array("d", bytes(8 * capacity))
+        self.high = array("d", bytes(8 * capacity))
+        self.low = array("d", bytes(8 * capacity))
+        self.close = array("d", bytes(8 * capacity))
+        self.ticks = array("q", bytes(8 * capacity))
+        self.head = -1
+        self.count = 0
+
+    def update(self, price, timestamp):
+        bucket = timestamp - timestamp % self.interval
+        head = self.head
+        if self.count and self.start[head] == bucket:
+            if price > self.high[head]:
+                self.high[head] = price
+            elif price < self.low[head]:
+                self.low[head] = price
+            self.close[head] = price
+            self.ticks[head] += 1
+        elif not self.count or bucket > self.start[head]:
+            head = self.head = (head + 1) % self.capacity
+            self.start[head] = bucket
+            self.open[head] = self.high[head] = self.low[head] = self.close[head] = price
+            self.ticks[head] = 1
+            if self.count < self.capacity:
+                self.count += 1
+        # Тики из прошлых интервалов (пришедшие не по порядку) игнорируются
+
+    def merge(self, start, open, high, low, close, ticks):
+        """Дописать готовую свечу; свеча текущего интервала объединяется с ним"""
+        head = self.head
+        if self.count and self.start[head] == start:
+            self.high[head] = max(self.high[head], high)
+            self.low[head] = min(self.low[head], low)
+            self.close[head] = close
+            self.ticks[head] += ticks
+        elif not self.count or start > self.start[head]:
+            head = self.head = (head + 1) % self.capacity
+            self.start[head] = start
+            self.open[head], self.high[head], self.low[head], self.close[head] = open, high, low, close
+            self.ticks[head] = ticks
+            if self.count < self.capacity:
+                self.count += 1
+
+    def candles(self, since=0.0):
+        """Свечи с началом не раньше since [(start, open, high, low, close, ticks)] от старых к новым"""
+        result = []
+        for i in range(self.count):
+            position = (self.head - i) % self.capacity
+            if self.start[position] < since:
+                break
+            result.append((self.start[position], self.open[position], self.high[position],
+                           self.low[position], self.close[position], self.ticks[position]))
+        result.reverse()
+        return result
+
+class PriceHistory:
+    """История цены одной криптовалюты: последние тики и свечи всех интервалов"""
+
+    __slots__ = ("ticks", "candles")
+
+    def __init__(self):
+        self.ticks = TickRing(TICK_HISTORY_SIZE)
+        self.candles = {name: CandleRing(interval, capacity)
+                        for name, (interval, capacity) in CANDLE_INTERVALS.items()}
+
+    def update(self, price, timestamp):
+        self.ticks.append(price, timestamp)
+        for ring in self.candles.values():
+            ring.update(price, timestamp)
+
+    def extend(self, newer):
+        """Дописать более новую историю той же пары (живые тики после восстановления из лога)"""
+        last = self.ticks.last(1)
+        after = last[0][0] if last else float("-inf")
+        for timestamp, price in newer.ticks.last():
+            if timestamp > after:
+                self.ticks.append(price, timestamp)
+        for name, ring in self.candles.items():
+            for candle in newer.candles[name].candles():
+                ring.merge(*candle)
+
+    def summary(self, window, now):
+        """Изменение, максимум и минимум за окно по самому крупному интервалу, покрывающему его"""
+        ring = self._ring_for(window)
+        window_start = now - window
+        candles = ring.candles(window_start - window_start % ring.interval)
+        if not candles:
+            return None
+        first_open = candles[0][1]
+        last_close = candles[-1][4]
+        return {
+            "open": first_open,
+            "close": last_close,
+            "change": last_close - first_open,
+            "change_percent": (last_close - first_open) / first_open * 100 if first_open else 0.0,
+            "high": max(c[2] for c in candles),
+            "low": min(c[3] for c in candles),
+            "covered": now - candles[0][0],
+        }
+
+    def _ring_for(self, window):
+        rings = sorted(self.candles.values(), key=lambda r: r.interval, reverse=True)
+        for ring in rings:
+            if ring.interval <= window / 12 and ring.interval * ring.capacity >= window:
+                return ring
+        return rings[-1]
+
+# История по криптовалютам: {crypto: PriceHistory}
+price_history = {}
+
+def record_tick(crypto, price, timestamp):
+    """Обработчик тика для crypto_service.add_price_listener; O(1) на тик"""
+    history = price_history.get(crypto)
+    if history is None:
+        history = price_history[crypto] = PriceHistory()
+    history.update(price, timestamp)
+
+def merge_history(restored):
+    """Подстановка истории, восстановленной вне event loop, с дописанными к ней живыми тиками"""
+    for crypto, history in restored.items():
+        live = price_history.get(crypto)
+        if live is not None:
+            history.extend(live)
+        price_history[crypto] = history
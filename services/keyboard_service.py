@@ -0,0 +1,94 @@
+# services/keyboard_service.py
+from functools import lru_cache
+from typing import Optional
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from config import SUPPORTED_CRYPTOS, CURRENCIES, KEYBOARD_PAGE_SIZE, KEYBOARD_ROW_WIDTH
+from services.symbol_service import symbol_registry
+
+# Данные кнопок; callback_data ограничена 64 байтами, поэтому префиксы короткие
+
+class CryptoChoice(CallbackData, prefix="sel"):
+    code: str
+
+class CryptoPage(CallbackData, prefix="pg"):
+    page: int
+
+class UpdatesToggle(CallbackData, prefix="upd"):
+    on: bool
+
+class CurrencyChoice(CallbackData, prefix="cur"):
+    code: str
+
+class PortfolioAction(CallbackData, prefix="pf"):
+    action: str  # refresh | live | live_stop | remove
+    code: Optional[str] = None
+
+def _button(text, data):
+    return InlineKeyboardButton(text=text, callback_data=data.pack())
+
+def _rows(buttons, width=KEYBOARD_ROW_WIDTH):
+    return [buttons[i:i + width] for i in range(0, len(buttons), width)]
+
+# Клавиатуры неизменяемы и собираются один раз: одна и та же разметка уходит всем
+# пользователям, а при включении или выключении пары кэш выбора монет сбрасывается
+
+def _page_count():
+    return max(1, -(-len(SUPPORTED_CRYPTOS) // KEYBOARD_PAGE_SIZE))
+
+def crypto_keyboard(page=0):
+    """Выбор монеты: включенные пары постранично, по KEYBOARD_PAGE_SIZE на странице
+
+    Номер страницы приходит из callback data, то есть от клиента, поэтому приводится
+    к существующей странице до обращения к кэшу: в кэше не больше записей, чем страниц.
+    """
+    return _crypto_keyboard(min(max(page, 0), _page_count() - 1))
+
+@lru_cache(maxsize=None)
+def _crypto_keyboard(page):
+    codes = list(SUPPORTED_CRYPTOS)
+    pages = _page_count()
+    chunk = codes[page * KEYBOARD_PAGE_SIZE:(page + 1) * KEYBOARD_PAGE_SIZE]
+    rows = _rows([_button(f"{SUPPORTED_CRYPTOS[code]['symbol']} {code}", CryptoChoice(code=code)) for code in chunk])
+    if pages > 1:
+        navigation = []
+        if page > 0:
+            navigation.append(_button("◀️", CryptoPage(page=page - 1)))
+        navigation.append(_button(f"{page + 1}/{pages}", CryptoPage(page=page)))
+        if page < pages - 1:
+            navigation.append(_button("▶️", CryptoPage(page=page + 1)))
+        rows.append(navigation)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def _on_symbol_change(code, enabled):
+    _crypto_keyboard.cache_clear()
+
+symbol_registry.add_listener(_on_symbol_change)
+
+# Действия с выбранной монетой: включить/выключить обновления, сменить монету, портфель
+SELECTED_KEYBOARD = {
+    active: InlineKeyboardMarkup(inline_keyboard=[
+        [_button("🔕 Остановить обновления", UpdatesToggle(on=False)) if active
+         else _button("🔔 Обновлять в реальном времени", UpdatesToggle(on=True))],
+        [_button("🔁 Другая монета", CryptoPage(page=0)), _button("💼 Портфель", PortfolioAction(action="refresh"))],
+    ])
+    for active in (False, True)
+}
+
+# Выбор валюты цен (/currency)
+CURRENCY_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=_rows(
+    [_button(f"{sign} {code}", CurrencyChoice(code=code)) for code, (sign, _) in CURRENCIES.items()]))
+
+# Живое сообщение с ценой: правки цены отправляются с этой же разметкой, иначе она исчезнет
+LIVE_PRICE_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [_button("🔕 Стоп", UpdatesToggle(on=False)), _button("🔁 Монета", CryptoPage(page=0))],
+])
+
+@lru_cache(maxsize=1024)
+def portfolio_keyboard(codes, live=False):
+    """Действия с портфелем для набора активов codes (кортеж): удаление, обновление, живой режим"""
+    rows = _rows([_button(f"🗑 {code}", PortfolioAction(action="remove", code=code)) for code in codes])
+    rows.append([_button("🔄 Обновить", PortfolioAction(action="refresh")),
+                 _button("🔕 Живой режим: выкл", PortfolioAction(action="live_stop")) if live
+                 else _button("📡 Живой режим", PortfolioAction(action="live"))])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -0,0 +1,238 @@
+# services/metrics_service.py
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from aiohttp import web
+from config import METRICS_HOST, METRICS_PORT, LOOP_LAG_INTERVAL, LOOP_STALL_THRESHOLD
+
+# Метрики обновляются только из потока event loop, поэтому счетчикам и гистограммам
+# не нужны блокировки: инкремент - одна операция над int/list без await
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (кумулятивные значения - при выводе)"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Family:
+    """Набор метрик одного имени с разными значениями меток"""
+
+    def __init__(self, name, help, kind, factory, labels=()):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.factory = factory
+        self.label_names = labels
+        self.children = {}
+        if not labels:
+            self.children[()] = factory()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self.factory()
+        return child
+
+_families = {}
+_stats_sources = []  # (префикс, словарь счетчиков, описание)
+
+def _register(name, help, kind, factory, labels):
+    """Семейство с метками или, без меток, его единственная метрика"""
+    family = _families[name] = Family(name, help, kind, factory, labels)
+    return family if labels else family.children[()]
+
+def counter(name, help, labels=()):
+    return _register(name, help, "counter", Counter, labels)
+
+def gauge(name, help, labels=()):
+    return _register(name, help, "gauge", Gauge, labels)
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    return _register(name, help, "histogram", lambda: Histogram(buckets), labels)
+
+def register_stats(prefix, stats, help):
+    """Экспорт существующего словаря счетчиков (delivery_stats и т.п.) без его изменения"""
+    _stats_sources.append((prefix, stats, help))
+
+# Метрики горячего пути
+ticks_total = counter("cryptobot_ticks_total", "Price ticks received", ("crypto",))
+tick_to_edit_seconds = histogram("cryptobot_tick_to_edit_seconds", "Delay from tick to delivered price message", ("crypto",))
+messages_total = counter("cryptobot_messages_total", "Price messages by Bot API method and result", ("method", "result"))
+fanout_seconds = histogram("cryptobot_fanout_seconds", "Duration of one update_all_users cycle", buckets=FAST_BUCKETS)
+save_seconds = histogram("cryptobot_save_seconds", "Duration of a user store write")
+ws_reconnects_total = counter("cryptobot_ws_reconnects_total", "WebSocket reconnects", ("stream",))
+loop_lag_seconds = histogram("cryptobot_loop_lag_seconds", "Event loop scheduling lag", buckets=FAST_BUCKETS)
+loop_lag_last = gauge("cryptobot_loop_lag_last_seconds", "Most recent event loop lag measurement")
+loop_stalls_total = counter("cryptobot_loop_stalls_total", "Event loop blocked longer than LOOP_STALL_THRESHOLD")
+
+started_at = time.time()
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+def render_metrics():
+    """Текстовый формат экспозиции Prometheus"""
+    lines = []
+    for family in _families.values():
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for values, metric in family.children.items():
+            if family.kind == "histogram":
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float("inf"),), metric.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{family.name}_bucket{_format_labels(family.label_names, values, [('le', le)])} {cumulative}")
+                labels = _format_labels(family.label_names, values)
+                lines.append(f"{family.name}_sum{labels} {metric.sum}")
+                lines.append(f"{family.name}_count{labels} {metric.count}")
+            else:
+                lines.append(f"{family.name}{_format_labels(family.label_names, values)} {metric.value}")
+    for prefix, stats, help in _stats_sources:
+        for key, value in stats.items():
+            lines.append(f"# HELP {prefix}_{key}_total {help}: {key}")
+            lines.append(f"# TYPE {prefix}_{key}_total counter")
+            lines.append(f"{prefix}_{key}_total {value}")
+    lines.append("# TYPE cryptobot_uptime_seconds gauge")
+    lines.append(f"cryptobot_uptime_seconds {time.time() - started_at:.0f}")
+    return "\n".join(lines) + "\n"
+
+class LoopStallWatchdog:
+    """Поток-сторож: находит код, заблокировавший event loop дольше threshold
+
+    Event loop обновляет heartbeat каждые interval секунд (monitor_loop_lag). Если
+    heartbeat не обновлялся дольше interval + threshold, loop занят одним колбэком, и
+    сторож логирует стек потока loop прямо во время блокировки - это и есть виновник.
+    Каждая блокировка логируется один раз. Ловятся блокировки длиннее threshold + interval.
+    """
+
+    def __init__(self, threshold=LOOP_STALL_THRESHOLD, interval=LOOP_LAG_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.heartbeat = time.monotonic()
+        self._loop = None
+        self._loop_thread = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запуск из потока event loop"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch(self):
+        reported = None  # heartbeat, для которого блокировка уже залогирована
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self.heartbeat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked <= self.threshold or beat == reported:
+                continue
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<no frame>\n"
+            logging.warning(f"Event loop blocked for {blocked * 1000:.0f} ms (still running), stack:\n{stack}")
+            # Счетчики меняются только в потоке loop: инкремент выполнится, когда он освободится
+            self._loop.call_soon_threadsafe(loop_stalls_total.inc)
+
+async def monitor_loop_lag(interval=LOOP_LAG_INTERVAL, stall_threshold=LOOP_STALL_THRESHOLD):
+    """Измерение задержки event loop: насколько позже запланированного просыпается sleep
+
+    С stall_threshold замер идет не реже раза в stall_threshold / 2 и служит heartbeat
+    для LoopStallWatchdog, который логирует стек блокирующего кода.
+    """
+    watchdog = None
+    if stall_threshold:
+        interval = min(interval, stall_threshold / 2)
+        watchdog = LoopStallWatchdog(stall_threshold, interval)
+        watchdog.start()
+    try:
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            loop_lag_seconds.observe(lag)
+            loop_lag_last.set(lag)
+            if watchdog is not None:
+                watchdog.heartbeat = now
+    finally:
+        if watchdog is not None:
+            watchdog.stop()
+
+async def _metrics_handler(request):
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+async def start_metrics_server(offset=0, host=METRICS_HOST, port=METRICS_PORT):
+    """Локальный HTTP /metrics; offset разводит порты процессов launcher.py, port=0 отключает сервер"""
+    if not port:
+        return None
+    port += offset
+    app = web.Application()
+    app.router.add_get("/metrics", _metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        logging.error(f"Metrics server not started on {host}:{port}: {e}")
+        await runner.cleanup()
+        return None
+    logging.info(f"Metrics available at http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,149 @@
+# services/portfolio_service.py
+import numpy as np
+from config import SUPPORTED_CRYPTOS
+from services.crypto_service import price_data
+
+class PortfolioMatrix:
+    """Портфели всех пользователей в виде матрицы пользователи × криптовалюты
+
+    Строка выделяется пользователю при первом активе и освобождается, когда портфель
+    пустеет; освобожденные строки обнуляются и переиспользуются. Столбец добавляется при
+    первом владельце криптовалюты, поэтому ширина матрицы - число реально используемых
+    пар, а не всего каталога. Цены хранятся вектором
+    в порядке столбцов, поэтому стоимость всех портфелей - одно матричное умножение,
+    которое выполняется лениво: при первом запросе после изменения цен или активов.
+    """
+
+    def __init__(self, cryptos=SUPPORTED_CRYPTOS, capacity=1024):
+        self.columns = {crypto: column for column, crypto in enumerate(cryptos)}
+        self.holdings = np.zeros((capacity, len(self.columns)))
+        self.chat_ids = np.zeros(capacity, dtype=np.int64)
+        self.prices = np.zeros(len(self.columns))
+        self.rows = {}  # chat_id -> строка
+        self.size = 0  # число использованных строк, включая освобожденные
+        self._free = []
+        self._values = None
+
+    def _grow(self, capacity):
+        holdings = np.zeros((capacity, self.holdings.shape[1]))
+        holdings[:self.size] = self.holdings[:self.size]
+        chat_ids = np.zeros(capacity, dtype=np.int64)
+        chat_ids[:self.size] = self.chat_ids[:self.size]
+        self.holdings, self.chat_ids = holdings, chat_ids
+
+    def _column(self, crypto):
+        column = self.columns.get(crypto)
+        if column is not None:
+            return column
+        column = self.columns[crypto] = len(self.columns)
+        if column == self.holdings.shape[1]:
+            width = max(1, column * 2)
+            holdings = np.zeros((len(self.holdings), width))
+            holdings[:, :column] = self.holdings
+            prices = np.zeros(width)
+            prices[:column] = self.prices
+            self.holdings, self.prices = holdings, prices
+        self.prices[column] = price_data[crypto]["price"] or 0.0
+        return column
+
+    def _row(self, chat_id):
+        row = self.rows.get(chat_id)
+        if row is not None:
+            return row
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self.size == len(self.holdings):
+                self._grow(self.size * 2)
+            row = self.size
+            self.size += 1
+        self.rows[chat_id] = row
+        self.chat_ids[row] = chat_id
+        return row
+
+    def set_portfolio(self, chat_id, portfolio):
+        """Замена всех активов пользователя (загрузка и записи от других процессов)"""
+        self.remove(chat_id)
+        for crypto, amount in portfolio.items():
+            self.set_holding(chat_id, crypto, amount)
+
+    def set_holding(self, chat_id, crypto, amount):
+        """Количество актива пользователя; 0 удаляет актив"""
+        column = self._column(crypto) if amount else self.columns.get(crypto)
+        if amount:
+            row = self._row(chat_id)  # до обращения к holdings: _row может пересоздать массив
+            self.holdings[row, column] = amount
+        elif column is not None and chat_id in self.rows:
+            row = self.rows[chat_id]
+            self.holdings[row, column] = 0
+            if not self.holdings[row].any():
+                self.remove(chat_id)
+        self._values = None
+
+    def remove(self, chat_id):
+        """Освобождение строки пользователя"""
+        row = self.rows.pop(chat_id, None)
+        if row is None:
+            return
+        self.holdings[row] = 0
+        self.chat_ids[row] = 0
+        self._free.append(row)
+        self._values = None
+
+    def set_price(self, crypto, price):
+        column = self.columns.get(crypto)
+        if column is not None:
+            self.prices[column] = price
+            self._values = None
+
+    def on_tick(self, crypto, price, timestamp):
+        """Обработчик тиков для add_price_listener"""
+        self.set_price(crypto, price)
+
+    def values(self):
+        """Стоимость портфеля каждой строки (массив длины size)"""
+        if self._values is None:
+            self._values = self.holdings[:self.size] @ self.prices
+        return self._values
+
+    def value(self, chat_id):
+        row = self.rows.get(chat_id)
+        return float(self.values()[row]) if row is not None else 0.0
+
+    def count(self):
+        return len(self.rows)
+
+    def total(self):
+        return float(self.values().sum())
+
+    def top(self, n=10):
+        """[(chat_id, стоимость)] n самых дорогих портфелей по убыванию"""
+        return _top(self.values(), self.chat_ids, n)
+
+    def report_args(self):
+        """Аргументы portfolio_report: представления массивов без копирования
+
+        В пуле потоков расчет идет по живым массивам (строка, измененная во время
+        расчета, может войти в отчет со старым или новым значением); в пул процессов
+        массивы уходят копией через pickle.
+        """
+        return self.holdings[:self.size], self.prices.copy(), self.chat_ids[:self.size]
+
+def _top(values, chat_ids, n):
+    n = min(n, len(values))
+    if not n:
+        return []
+    rows = np.argpartition(values, -n)[-n:]
+    rows = rows[np.argsort(values[rows])[::-1]]
+    return [(int(chat_ids[row]), float(values[row])) for row in rows if values[row] > 0]
+
+def portfolio_report(holdings, prices, chat_ids, n=5):
+    """Общая стоимость и n самых дорогих портфелей: (total, [(chat_id, стоимость)])
+
+    Чистая функция над массивами, чтобы отчет можно было считать вне event loop
+    (executor_service.run_cpu), не трогая кэш стоимостей матрицы.
+    """
+    values = holdings @ prices
+    return float(values.sum()), _top(values, chat_ids, n)
+
+portfolio_matrix = PortfolioMatrix()
@@ -0,0 +1,93 @@
+# services/quote_service.py
+from config import QUOTE_ASSET, CONVERSION_HUB, CURRENCIES
+from services.crypto_service import price_data, acquire_conversion_stream, release_conversion_stream
+from services.symbol_service import symbol_registry
+
+class QuoteEngine:
+    """Цены в валютах пользователей из одной котировки на монету и курсов валют к хабу
+
+    Монеты приходят только в base (QUOTE_ASSET), а для каждой валюты есть один поток курса
+    к hub (например EURUSDT, GBPUSDT). Тик курса пересчитывает множители base -> валюта:
+    тик самой base меняет все множители, тик другой валюты - только ее. Цена монеты в
+    валюте - цена в base, умноженная на готовый множитель, то есть O(1) на получателя.
+    """
+
+    def __init__(self, base=QUOTE_ASSET, hub=CONVERSION_HUB, currencies=CURRENCIES):
+        self.base = base
+        self.hub = hub
+        self.currencies = currencies
+        # Пара курса -> (валюта, True - котировка пары в валюте, то есть хаб - базовый актив)
+        self.pairs = {}
+        self.conversion = {}  # валюта -> код пары курса
+        for currency, (_, pair) in currencies.items():
+            if pair:
+                code = symbol_registry.add_conversion(pair)
+                self.pairs[code] = (currency, code.startswith(hub))
+                self.conversion[currency] = code
+        self.hub_rates = {hub: 1.0}  # единиц хаба за единицу валюты
+        self.factors = {base: 1.0}  # цена в валюте = цена в base × множитель
+        # Обработчики изменения курсов: listener(currencies)
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def normalize(self, currency):
+        """Код валюты для хранения в состоянии пользователя: None - base; ValueError - валюта не поддерживается"""
+        currency = currency.upper() if currency else self.base
+        if currency not in self.currencies:
+            raise ValueError(currency)
+        return None if currency == self.base else currency
+
+    def code(self, currency):
+        return currency or self.base
+
+    def sign(self, currency):
+        return self.currencies[currency or self.base][0]
+
+    def streams(self, currency):
+        """Пары курсов, нужные для цен в валюте: ее собственная и курс base к хабу"""
+        if currency is None or currency == self.base:
+            return ()
+        return tuple(code for code in (self.conversion.get(currency), self.conversion.get(self.base)) if code)
+
+    def on_tick(self, code, price, timestamp):
+        """Обработчик тиков для add_price_listener; тики монет пропускаются за один поиск в словаре"""
+        pair = self.pairs.get(code)
+        if pair is None or not price:
+            return
+        currency, inverted = pair
+        self.hub_rates[currency] = 1 / price if inverted else price
+        changed = [c for c in self.currencies if c != self.base] if currency == self.base else [currency]
+        base_rate = self.hub_rates.get(self.base)
+        for c in changed:
+            rate = self.hub_rates.get(c)
+            if base_rate is not None and rate is not None:
+                self.factors[c] = base_rate / rate
+        for listener in self.listeners:
+            listener(changed)
+
+    def factor(self, currency):
+        """Множитель base -> валюта; None - курс еще не получен"""
+        return self.factors.get(currency or self.base)
+
+    def convert(self, price, currency):
+        if currency is None or price is None:
+            return price
+        factor = self.factors.get(currency)
+        return price * factor if factor is not None else None
+
+    def price(self, crypto, currency):
+        """Текущая цена криптовалюты в валюте; None - нет цены или курса"""
+        return self.convert(price_data[crypto]["price"], currency)
+
+quote_engine = QuoteEngine()
+
+def acquire_currency(currency):
+    """Пользователь перешел на валюту - держим открытыми ее потоки курсов"""
+    for code in quote_engine.streams(currency):
+        acquire_conversion_stream(code)
+
+def release_currency(currency):
+    for code in quote_engine.streams(currency):
+        release_conversion_stream(code)
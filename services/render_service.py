@@ -0,0 +1,75 @@
+# services/render_service.py
+from datetime import datetime
+from services.crypto_service import price_data
+from services.symbol_service import crypto_info
+from services.quote_service import quote_engine
+
+# Шаблоны текстов, зависящих только от цены криптовалюты и валюты
+PRICE_TEMPLATES = {
+    "live": "💰 <b>{crypto}/{quote}</b>: {sign}{price}\n🔄 Обновлено: {time} (Реальное время)",
+    "check": "💰 <b>{crypto}/{quote}</b>: {sign}{price}\n"
+             "📊 Данные получены через WebSocket Binance\n"
+             "🔄 Последнее обновление: {time}",
+    "check_short": "💰 <b>{crypto}/{quote}</b>: {sign}{price}\n📊 Данные получены через WebSocket Binance",
+    "status": "💰 Цена {crypto}: {sign}{price}",
+}
+
+# Последний отрендеренный текст: {(шаблон, crypto, валюта): (price, last_update, множитель, text)}
+# Хранится одна запись на шаблон/криптовалюту/валюту, поэтому размер кэша ограничен
+_render_cache = {}
+
+def render_price_text(crypto, template="live", currency=None):
+    """Текст с текущей ценой; рендерится один раз на тик и переиспользуется всеми получателями
+
+    currency - валюта пользователя (None - QUOTE_ASSET); пока курс валюты не получен,
+    цена показывается в QUOTE_ASSET.
+    """
+    data = price_data[crypto]
+    price, last_update = data["price"], data["last_update"]
+    factor = quote_engine.factor(currency)
+    if factor is None:
+        currency, factor = None, 1.0
+    key = (template, crypto, currency)
+    cached = _render_cache.get(key)
+    if cached is not None and cached[0] == price and cached[1] == last_update and cached[2] == factor:
+        return cached[3]
+
+    update_time = datetime.fromtimestamp(last_update).strftime("%H:%M:%S") if last_update else ""
+    text = PRICE_TEMPLATES[template].format(crypto=crypto, quote=quote_engine.code(currency),
+                                            sign=quote_engine.sign(currency), price=f"{price * factor:,.2f}",
+                                            time=update_time)
+    _render_cache[key] = (price, last_update, factor, text)
+    return text
+
+def format_money(value, currency=None):
+    """Сумма со знаком валюты: €1,234.50"""
+    return f"{quote_engine.sign(currency)}{value:,.2f}"
+
+def portfolio_row(crypto, amount, currency=None):
+    """Стоимость актива в валюте пользователя и строка портфеля"""
+    price = quote_engine.price(crypto, currency)
+    symbol = crypto_info(crypto)["symbol"]
+    if price is None:
+        return 0.0, f"• <b>{crypto}</b>: {amount} ({symbol}) - <i>Цена загружается...</i>"
+    value = amount * price
+    return value, f"• <b>{crypto}</b>: {amount} ({symbol}) - <b>{format_money(value, currency)}</b>"
+
+def render_portfolio_text(portfolio, live, currency=None):
+    """Текст живого портфеля: пересчитываются только строки из live.changed и новые активы"""
+    rows = live.rows
+    for crypto in list(rows):
+        if crypto not in portfolio:
+            del rows[crypto]
+    for crypto, amount in portfolio.items():
+        if crypto in live.changed or crypto not in rows:
+            rows[crypto] = portfolio_row(crypto, amount, currency)
+    live.changed.clear()
+
+    if not rows:
+        return "📭 Ваш портфель пуст.\n\nИспользуйте /portfolio_add [КОД] [КОЛ-ВО], чтобы добавить актив."
+    total = sum(value for value, _ in rows.values())
+    lines = "\n".join(line for _, line in rows.values())
+    return f"💼 <b>Ваш портфель (реальное время):</b>\n\n{lines}\n"\
+           f"\n----------------------------------\n"\
+           f"💰 <b>Общая стоимость: {format_money(total, currency)}</b>\n"\
+           f"🔄 Обновлено: {datetime.now().strftime('%H:%M:%S')}"
@@ -0,0 +1,104 @@
+# services/response_service.py
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+from config import RESPONSE_CACHE_TTL, COMMAND_DEBOUNCE_WINDOW, HOT_READ_COMMANDS
+from services.crypto_service import price_data
+from services.user_service import add_user_listener
+from services.quote_service import quote_engine
+from services.metrics_service import register_stats
+
+# Счетчики кэша ответов и свернутых повторов команд
+response_stats = {"hit": 0, "miss": 0, "collapsed": 0}
+register_stats("cryptobot_responses", response_stats, "Read command responses")
+
+class ResponseCache:
+    """Отрендеренные ответы на команды чтения: {(chat_id, команда): (истекает, зависимости, ответ)}
+
+    Ответ живет не дольше ttl и устаревает раньше, если по любой из его криптовалют
+    пришел тик (зависимости - время последнего тика на момент рендера, проверяются при
+    чтении) или изменилось состояние пользователя (invalidate_chat). Время жизни у всех
+    записей одинаковое, поэтому порядок вставки совпадает с порядком истечения и
+    устаревшие записи убираются с начала OrderedDict за O(1) каждая.
+    """
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, commands=HOT_READ_COMMANDS):
+        self.ttl = ttl
+        self.commands = commands
+        self.entries = OrderedDict()
+
+    def _expire(self, now):
+        entries = self.entries
+        while entries and entries[next(iter(entries))][0] <= now:
+            entries.popitem(last=False)
+
+    def get(self, chat_id, command):
+        now = time.monotonic()
+        self._expire(now)
+        entry = self.entries.get((chat_id, command))
+        if entry is not None and all(price_data[crypto]["last_update"] == ticked for crypto, ticked in entry[1]):
+            response_stats["hit"] += 1
+            return entry[2]
+        response_stats["miss"] += 1
+        return None
+
+    def put(self, chat_id, command, response, cryptos=(), currency=None):
+        """Сохранить ответ; cryptos - криптовалюты, цены которых в нем показаны в валюте currency
+
+        Ответ в валюте, отличной от QUOTE_ASSET, зависит еще и от тиков курсов этой валюты.
+        """
+        key = (chat_id, command)
+        self.entries.pop(key, None)
+        deps = tuple((code, price_data[code]["last_update"])
+                     for code in (*cryptos, *quote_engine.streams(currency)))
+        self.entries[key] = (time.monotonic() + self.ttl, deps, response)
+        return response
+
+    def invalidate_chat(self, chat_id):
+        for command in self.commands:
+            self.entries.pop((chat_id, command), None)
+
+    def clear(self):
+        self.entries.clear()
+
+response_cache = ResponseCache()
+
+# Любое сохраненное изменение пользователя (выбор монеты, портфель, подписка) сбрасывает его ответы
+add_user_listener(lambda chat_id, kind: response_cache.invalidate_chat(chat_id))
+
+def command_name(text):
+    """Имя команды без / и @бота; None - сообщение не команда"""
+    if not text or text[0] != "/":
+        return None
+    words = text[1:].split(maxsplit=1)
+    # "/" без имени команды
+    return words[0].split("@", 1)[0] if words else None
+
+class CommandDebounceMiddleware(BaseMiddleware):
+    """Сворачивание повторов: та же команда чтения из того же чата чаще раза в window секунд
+    не обрабатывается - предыдущий ответ уже отправлен или отправляется"""
+
+    def __init__(self, window=COMMAND_DEBOUNCE_WINDOW, commands=HOT_READ_COMMANDS):
+        self.window = window
+        self.commands = frozenset(commands)
+        # {(chat_id, текст команды): время приема}, в порядке приема
+        self.recent = OrderedDict()
+
+    async def __call__(self, handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]], event: Message,
+                       data: Dict[str, Any]) -> Any:
+        text = event.text
+        if command_name(text) not in self.commands:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        recent = self.recent
+        while recent and now - recent[next(iter(recent))] >= self.window:
+            recent.popitem(last=False)
+        key = (event.chat.id, text.strip())
+        if key in self.recent:
+            response_stats["collapsed"] += 1
+            return None
+        self.recent[key] = now
+        return await handler(event, data)
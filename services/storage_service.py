@@ -0,0 +1,110 @@
+# services/storage_service.py
+import json
+import logging
+import sqlite3
+import threading
+from config import USERS_DB_MMAP_SIZE
+
+class UserStore:
+    """Хранилище пользователей в SQLite (WAL): одна строка на chat_id, запись пакетами в транзакции
+
+    Идентификаторы живых сообщений лежат в отдельных столбцах: они меняются при каждой
+    новой отправке, пишутся воркерами доставки и не должны затирать настройки (data),
+    которыми владеет процесс приема команд.
+    """
+
+    def __init__(self, path, mmap_size=USERS_DB_MMAP_SIZE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Чтение страниц базы через mmap вместо read() с копированием в буфер
+        self._conn.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS users (chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL, "
+                           "message_id INTEGER, portfolio_message_id INTEGER)")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(users)")}
+        for column in ("message_id", "portfolio_message_id"):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE users ADD COLUMN {column} INTEGER")
+
+    def is_empty(self):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def load(self, chat_id):
+        """Одна запись: (dict, message_id, portfolio_message_id) или None"""
+        with self._lock:
+            row = self._conn.execute("SELECT data, message_id, portfolio_message_id FROM users WHERE chat_id = ?",
+                                     (chat_id,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1], row[2]
+
+    def iter_batches(self, size=1000, shard=None):
+        """Записи пакетами по size: [(chat_id, dict, message_id, portfolio_message_id)]
+
+        Пакеты читаются по ключу (chat_id > последнего прочитанного), блокировка держится
+        только на время одного пакета, поэтому запись изменений идет между пакетами.
+        shard=(index, count) отбирает chat_id % count == index до разбора JSON.
+        """
+        last = -2 ** 63
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT chat_id, data, message_id, portfolio_message_id FROM users "
+                    "WHERE chat_id > ? ORDER BY chat_id LIMIT ?", (last, size)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [(chat_id, json.loads(data), message_id, portfolio_message_id)
+                   for chat_id, data, message_id, portfolio_message_id in rows
+                   if shard is None or chat_id % shard[1] == shard[0]]
+
+    def write(self, records, messages=None):
+        """Атомарная запись пакета {chat_id: dict | None}; None удаляет запись
+
+        messages={chat_id: (message_id, portfolio_message_id)} обновляет только идентификаторы
+        сообщений; строка без настроек создается с пустой записью.
+        """
+        upserts = [(chat_id, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+                   for chat_id, data in records.items() if data is not None]
+        deletes = [(chat_id,) for chat_id, data in records.items() if data is None]
+        message_ids = [(chat_id, *ids) for chat_id, ids in (messages or {}).items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT INTO users (chat_id, data) VALUES (?, ?) "
+                        "ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data", upserts)
+                if message_ids:
+                    self._conn.executemany(
+                        "INSERT INTO users (chat_id, data, message_id, portfolio_message_id) VALUES (?, '{}', ?, ?) "
+                        "ON CONFLICT(chat_id) DO UPDATE SET message_id = excluded.message_id, "
+                        "portfolio_message_id = excluded.portfolio_message_id", message_ids)
+                if deletes:
+                    self._conn.executemany("DELETE FROM users WHERE chat_id = ?", deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def import_legacy_json(self, path):
+        """Импорт старого users_data.json; возвращает число импортированных записей"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved_data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        self.write({int(chat_id): data for chat_id, data in saved_data.items()})
+        logging.info(f"Imported {len(saved_data)} users from legacy {path}")
+        return len(saved_data)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,78 @@
+# services/suppression_service.py
+import math
+import time
+from typing import NamedTuple
+from config import DEFAULT_EDIT_THRESHOLD, CRYPTO_EDIT_THRESHOLDS
+from services.metrics_service import register_stats
+
+class EditThreshold(NamedTuple):
+    """Минимальное изменение цены (в € и в %) и минимальный интервал между правками (сек)"""
+    absolute: float = 0.0
+    percent: float = 0.0
+    interval: float = 0.0
+
+    def describe(self):
+        parts = []
+        if self.absolute:
+            parts.append(f"€{self.absolute:g}")
+        if self.percent:
+            parts.append(f"{self.percent:g}%")
+        if self.interval:
+            parts.append(f"{self.interval:g}s")
+        return " / ".join(parts) or "любое изменение"
+
+_default_threshold = EditThreshold(**DEFAULT_EDIT_THRESHOLD)
+_crypto_thresholds = {crypto: _default_threshold._replace(**values)
+                      for crypto, values in CRYPTO_EDIT_THRESHOLDS.items()}
+
+# Счетчики правок сообщений с ценой
+edit_stats = {"sent": 0, "suppressed": 0}
+register_stats("cryptobot_edits", edit_stats, "Price message edits")
+
+def get_threshold(user_data, crypto):
+    """Порог пользователя для криптовалюты или порог по умолчанию для нее"""
+    if user_data.thresholds and crypto in user_data.thresholds:
+        return user_data.thresholds[crypto]
+    return _crypto_thresholds.get(crypto, _default_threshold)
+
+def parse_threshold(args, crypto):
+    """Разбор значений вида 5 (в €), 0.5% и 30s; неуказанные части берутся по умолчанию"""
+    values = {}
+    for arg in args:
+        if arg.endswith("%"):
+            values["percent"] = float(arg[:-1])
+        elif arg.lower().endswith("s"):
+            values["interval"] = float(arg[:-1])
+        else:
+            values["absolute"] = float(arg.lstrip("€"))
+    # nan и inf float() принимает, но бесконечный порог навсегда заморозил бы сообщение
+    if not values or not all(math.isfinite(v) and v >= 0 for v in values.values()):
+        raise ValueError
+    return _crypto_thresholds.get(crypto, _default_threshold)._replace(**values)
+
+def should_send_edit(user_data, crypto, price, now=None, factor=1.0):
+    """O(1) решение: достаточно ли изменилась цена с последней отправленной правки
+
+    price - цена в валюте пользователя, factor - ее курс к €: абсолютный порог задан в €.
+    """
+    last_price = user_data.last_price
+    if last_price is None:
+        return True
+
+    threshold = get_threshold(user_data, crypto)
+    if now is None:
+        now = time.monotonic()
+    delta = abs(price - last_price)
+    if (delta < threshold.absolute * factor
+            or delta * 100 < threshold.percent * last_price
+            or now - user_data.last_sent < threshold.interval
+            or delta == 0):
+        edit_stats["suppressed"] += 1
+        return False
+    return True
+
+def record_edit_sent(user_data, price, now=None):
+    """Запомнить цену и время отправленной правки"""
+    user_data.last_price = price
+    user_data.last_sent = time.monotonic() if now is None else now
+    edit_stats["sent"] += 1
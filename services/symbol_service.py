@@ -0,0 +1,164 @@
+# services/symbol_service.py
+import json
+import logging
+import os
+import sys
+import time
+import aiohttp
+from config import (
+    SUPPORTED_CRYPTOS, QUOTE_ASSET, EXCHANGE_INFO_FILE, EXCHANGE_INFO_FALLBACK, EXCHANGE_INFO_MAX_AGE,
+    ENABLED_CRYPTOS_FILE, BINANCE_REST_BASE, REST_TIMEOUT
+)
+from services.executor_service import run_io
+
+# Отображаемые имена и значки известных монет; остальные пары показываются по коду
+DISPLAY_INFO = {code: {"name": info["name"], "symbol": info["symbol"]} for code, info in SUPPORTED_CRYPTOS.items()}
+
+class SymbolRegistry:
+    """Каталог пар с котировкой в quote и набор включенных пар
+
+    catalogue - все известные пары (тысячи), enabled - словарь SUPPORTED_CRYPTOS из config,
+    который меняется на месте: проверки `code in SUPPORTED_CRYPTOS` по всему коду остаются
+    O(1) и сразу видят включение и выключение пар без перезапуска.
+    """
+
+    def __init__(self, enabled=SUPPORTED_CRYPTOS, quote=QUOTE_ASSET):
+        self.quote = quote
+        self.enabled = enabled
+        self.catalogue = dict(enabled)
+        # Пары курсов валют (services/quote_service.py): не монеты, в каталог и списки не попадают
+        self.conversions = {}
+        # Обработчики включения/выключения: listener(code, enabled)
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def load_exchange_info(self, info):
+        """Торгуемые пары с котировкой в quote из ответа /api/v3/exchangeInfo; возвращает их число"""
+        count = 0
+        for symbol in info.get("symbols", ()):
+            if symbol.get("quoteAsset") != self.quote or symbol.get("status", "TRADING") != "TRADING":
+                continue
+            code = sys.intern(symbol["baseAsset"])
+            display = DISPLAY_INFO.get(code) or {"name": code, "symbol": code}
+            self.catalogue[code] = {**display, "pair": symbol["symbol"].lower()}
+            count += 1
+        return count
+
+    def info(self, code):
+        """Описание пары из каталога (в том числе выключенной)"""
+        info = self.catalogue.get(code) or self.conversions.get(code)
+        if info is None:
+            info = {"name": code, "symbol": code, "pair": f"{code}{self.quote}".lower()}
+        return info
+
+    def add_conversion(self, symbol):
+        """Пара курса валюты (например EURUSDT): код в price_data совпадает с символом Binance"""
+        code = sys.intern(symbol.upper())
+        self.conversions[code] = {"name": code, "symbol": code, "pair": code.lower()}
+        return code
+
+    def search(self, prefix, limit=20):
+        prefix = prefix.upper()
+        return sorted(code for code in self.catalogue if code.startswith(prefix))[:limit]
+
+    def _notify(self, code, enabled):
+        for listener in self.listeners:
+            listener(code, enabled)
+
+    def enable(self, code):
+        """Включить пару из каталога; False - пары нет в каталоге или она уже включена"""
+        if code not in self.catalogue or code in self.enabled:
+            return False
+        self.enabled[code] = self.catalogue[code]
+        self._notify(code, True)
+        return True
+
+    def disable(self, code):
+        """Выключить пару; False - пара не была включена"""
+        if self.enabled.pop(code, None) is None:
+            return False
+        self._notify(code, False)
+        return True
+
+    def set_enabled(self, codes):
+        """Замена набора включенных пар (загрузка сохраненного списка при старте)"""
+        codes = [code for code in codes if code in self.catalogue]
+        for code in [code for code in self.enabled if code not in codes]:
+            self.disable(code)
+        for code in codes:
+            self.enable(code)
+
+    def save_enabled(self, path=ENABLED_CRYPTOS_FILE, codes=None):
+        """Запись списка включенных пар; codes - снимок списка, если запись идет вне event loop"""
+        codes = list(self.enabled) if codes is None else codes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(codes, f)
+
+symbol_registry = SymbolRegistry()
+
+def crypto_info(code):
+    """Имя, значок и пара криптовалюты (включенной или нет)"""
+    return symbol_registry.info(code)
+
+def _write_snapshot(path, snapshot):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+
+def _snapshot_fresh(path, max_age):
+    return os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age
+
+async def refresh_exchange_info(base_url=BINANCE_REST_BASE, path=EXCHANGE_INFO_FILE, max_age=EXCHANGE_INFO_MAX_AGE):
+    """Обновление кэша exchangeInfo, если он старше max_age (max_age=0 - не обращаться к Binance)"""
+    if not max_age or _snapshot_fresh(path, max_age):
+        return False
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=REST_TIMEOUT)) as session:
+            async with session.get(f"{base_url}/api/v3/exchangeInfo", params={"permissions": "SPOT"}) as response:
+                response.raise_for_status()
+                info = await response.json()
+    except Exception as e:
+        logging.warning(f"Could not refresh exchangeInfo from {base_url}: {e}")
+        return False
+
+    # Кэшируются только поля, которые читает реестр: полный ответ весит мегабайты
+    fields = ("symbol", "status", "baseAsset", "quoteAsset")
+    snapshot = {"serverTime": info.get("serverTime"),
+                "symbols": [{key: symbol[key] for key in fields} for symbol in info.get("symbols", ())]}
+    await run_io(_write_snapshot, path, snapshot)
+    logging.info(f"Cached exchangeInfo with {len(snapshot['symbols'])} symbols to {path}")
+    return True
+
+def read_enabled(path=ENABLED_CRYPTOS_FILE):
+    """Сохраненный список включенных пар; None - списка нет или он не читается"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error loading enabled pairs from {path}: {e}")
+        return None
+
+def load_symbol_registry(path=EXCHANGE_INFO_FILE, fallback=EXCHANGE_INFO_FALLBACK, enabled_path=ENABLED_CRYPTOS_FILE):
+    """Загрузка каталога из кэша exchangeInfo (или локальной заглушки) и списка включенных пар"""
+    source = path if os.path.exists(path) else fallback
+    try:
+        with open(source, encoding="utf-8") as f:
+            count = symbol_registry.load_exchange_info(json.load(f))
+        logging.info(f"Loaded {count} {symbol_registry.quote} pairs from {source}")
+    except (OSError, ValueError) as e:
+        logging.error(f"Error loading exchangeInfo snapshot {source}: {e}")
+
+    codes = read_enabled(enabled_path)
+    if codes is not None:
+        symbol_registry.set_enabled(codes)
+    logging.info(f"Enabled pairs: {len(symbol_registry.enabled)} of {len(symbol_registry.catalogue)}")
+    return symbol_registry
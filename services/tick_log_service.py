@@ -0,0 +1,196 @@
+# services/tick_log_service.py
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from config import TICK_RECORD_FILE, TICK_RECORD_FLUSH_INTERVAL, CANDLE_INTERVALS
+from services.decode_service import ticker_decoder
+from services.executor_service import run_io
+from services.history_service import PriceHistory, merge_history
+from services.metrics_service import counter
+from services.symbol_service import symbol_registry
+
+# Формат лога: заголовок MAGIC, затем блоки по одному на сброс буфера:
+#   [время первой записи: float64][время последней: float64][длина: uint32][записи, сжатые zlib]
+# запись внутри блока - [время приема: float64][длина: uint32][кадр в UTF-8].
+# Кадры хранятся как пришли от Binance, поэтому проигрываются тем же декодером, что и живой поток;
+# соседние кадры тикера почти совпадают и сжимаются в несколько раз. По времени в заголовке
+# старые блоки пропускаются без распаковки. Файл только дописывается, блок, оборванный при
+# остановке процесса, при чтении пропускается.
+MAGIC = b"CBTICKS2"
+CHUNK = struct.Struct("<ddI")
+RECORD = struct.Struct("<dI")
+COMPRESS_LEVEL = 1  # быстрое сжатие: блок сжимается в пуле потоков за время сброса
+
+ticks_recorded_total = counter("cryptobot_ticks_recorded_total", "Raw ticker frames appended to the tick log")
+
+class TickRecorder:
+    """Запись сырых кадров в лог тиков
+
+    record() вызывается из чтения сокета и только дописывает кадр в буфер в памяти;
+    раз в flush_interval буфер сжимается и уходит на диск одним блоком в пуле потоков.
+    """
+
+    def __init__(self, path, flush_interval=TICK_RECORD_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.frames = 0
+        self._buffer = bytearray()
+        self._pending = 0  # кадров в буфере
+        self._first = self._last = 0.0  # время первого и последнего кадра буфера
+        self._checked = False  # хвост файла прошлого запуска проверен
+        self._closing = None
+        self._task = None
+
+    def record(self, timestamp, message):
+        data = message.encode() if isinstance(message, str) else message
+        if not self._pending:
+            self._first = timestamp
+        self._last = timestamp
+        self._buffer += RECORD.pack(timestamp, len(data))
+        self._buffer += data
+        self._pending += 1
+
+    def _write(self, chunk, first, last):
+        chunk = zlib.compress(chunk, COMPRESS_LEVEL)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "ab") as f:
+            if not self._checked:
+                # Блок, оборванный падением прошлого запуска, отрезается - иначе новые блоки за ним не прочитать
+                f.truncate(_complete_length(f.name))
+                self._checked = True
+            if f.tell() == 0:
+                f.write(MAGIC)
+            f.write(CHUNK.pack(first, last, len(chunk)) + chunk)
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        chunk, self._buffer = self._buffer, bytearray()
+        count, self._pending = self._pending, 0
+        await run_io(self._write, chunk, self._first, self._last)
+        self.frames += count
+        ticks_recorded_total.inc(count)
+
+    def start(self):
+        self._closing = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logging.info(f"Recording ticker frames to {self.path}")
+
+    async def _run(self):
+        # Задача не отменяется, а дожидается stop(): записи идут строго по очереди,
+        # и последний буфер попадает в файл
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except (OSError, ValueError) as e:
+                logging.error(f"Error writing tick log {self.path}: {e}")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._closing.set()
+        await self._task
+        self._task = None
+        logging.info(f"Tick log {self.path}: {self.frames} frames recorded")
+
+def _complete_length(path):
+    """Длина файла до конца последнего целого блока (0 - пустой файл)"""
+    size = os.path.getsize(path)
+    if size < len(MAGIC):
+        return 0
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a tick log")
+        offset = len(MAGIC)
+        while offset + CHUNK.size <= size:
+            _, _, length = CHUNK.unpack(f.read(CHUNK.size))
+            if offset + CHUNK.size + length > size:
+                break
+            offset += CHUNK.size + length
+            f.seek(offset)
+    return offset
+
+def read_tick_log(path, since=0.0):
+    """Записи лога (время приема, кадр) по порядку; файл читается через mmap без загрузки в память
+
+    Блоки, все записи которых старше since, пропускаются по заголовку без распаковки.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            if view[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a tick log")
+            offset, end = len(MAGIC), len(view)
+            while offset + CHUNK.size <= end:
+                _, last, length = CHUNK.unpack_from(view, offset)
+                offset += CHUNK.size
+                if offset + length > end:
+                    break
+                if last < since:
+                    offset += length
+                    continue
+                try:
+                    records = zlib.decompress(view[offset:offset + length])
+                except zlib.error as e:
+                    raise ValueError(f"{path}: corrupt block at offset {offset}: {e}")
+                offset += length
+                position = 0
+                while position < len(records):
+                    timestamp, size = RECORD.unpack_from(records, position)
+                    position += RECORD.size
+                    yield timestamp, records[position:position + size].decode()
+                    position += size
+
+def backfill_history(path, since=0.0):
+    """История цен из лога тиков без обращения к сети: ({crypto: PriceHistory}, число тиков)
+
+    История собирается в собственных объектах, а не в общей price_history, поэтому функция
+    может работать в пуле потоков, пока event loop принимает живые тики.
+    """
+    pairs = {info["pair"]: code for code, info in symbol_registry.catalogue.items()}
+    decode = ticker_decoder.combined
+    histories = {}
+    count = 0
+    for recorded_at, message in read_tick_log(path, since):
+        if recorded_at < since:
+            continue
+        stream, price = decode(message)
+        crypto = pairs.get(stream.partition("@")[0]) if stream else None
+        if crypto is None or price is None:
+            continue
+        history = histories.get(crypto)
+        if history is None:
+            history = histories[crypto] = PriceHistory()
+        history.update(price, recorded_at)
+        count += 1
+    return histories, count
+
+async def restore_history(path=TICK_RECORD_FILE):
+    """Заполнение истории (/history, свечи) из лога прошлых запусков в фоне
+
+    Лог читается в пуле потоков, пока бот уже работает; готовая история подставляется
+    в event loop, и живые тики, пришедшие за время чтения, дописываются к ней.
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    since = time.time() - max(interval * capacity for interval, capacity in CANDLE_INTERVALS.values())
+    started = time.perf_counter()
+    try:
+        histories, count = await run_io(backfill_history, path, since)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error reading tick log {path}: {e}")
+        return 0
+    merge_history(histories)
+    logging.info(f"Restored {count} ticks of price history from {path} in {time.perf_counter() - started:.1f}s")
+    return count
@@ -1,58 +1,615 @@
 # services/user_service.py
-import json
+import asyncio
 import logging
-from config import USERS_DATA_FILE
+import math
+import sys
+import time
+from collections import deque
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+from config import USERS_DATA_FILE, USERS_DB_FILE, SAVE_DEBOUNCE_DELAY, USERS_LOAD_BATCH, RESTORE_RAMP_SECONDS, RESTORE_STEP
+from services.storage_service import UserStore
+from services.suppression_service import EditThreshold
+from services.alert_service import alert_engine
+from services.portfolio_service import portfolio_matrix
+from services.crypto_service import acquire_crypto_stream, release_crypto_stream
+from services.quote_service import acquire_currency, release_currency
+from services.metrics_service import save_seconds, register_stats
+from services.executor_service import run_io
 
-# Словарь для хранения активных пользователей и их сообщений
-# Структура: {chat_id: {"crypto": str, "message_id": int, "active": bool, "portfolio": {}}}
+# Общий неизменяемый пустой портфель: у большинства пользователей портфеля нет
+EMPTY_PORTFOLIO = MappingProxyType({})
+
+class LivePortfolio:
+    """Живое сообщение с портфелем (/portfolio_live)"""
+
+    __slots__ = ("message_id", "rows", "changed", "queued_at")
+
+    def __init__(self, message_id=None):
+        self.message_id = message_id
+        # Отрендеренные строки по активам: {crypto: (стоимость, текст строки)}
+        self.rows = {}
+        # Активы, цена или количество которых изменились после последнего рендера
+        self.changed = set()
+        self.queued_at = 0.0
+
+class UserState:
+    """Состояние пользователя (компактная замена словаря с теми же полями)"""
+
+    __slots__ = ("crypto", "active", "message_id", "last_price", "last_sent", "portfolio", "thresholds", "alerts",
+                 "live_portfolio", "currency")
+
+    def __init__(self, crypto="BTC", active=False, message_id=None, last_price=None, portfolio=None, thresholds=None):
+        self.crypto = sys.intern(crypto)
+        self.active = active
+        self.message_id = message_id
+        self.last_price = last_price
+        self.last_sent = 0.0
+        self.portfolio = {sys.intern(code): amount for code, amount in portfolio.items()} if portfolio else EMPTY_PORTFOLIO
+        # Пользовательские пороги правок: {crypto: EditThreshold} или None
+        self.thresholds = thresholds or None
+        # Ценовые оповещения пользователя: [Alert] или None
+        self.alerts = None
+        # Живое сообщение с портфелем: LivePortfolio или None
+        self.live_portfolio = None
+        # Валюта цен (/currency): код из CURRENCIES или None - QUOTE_ASSET
+        self.currency = None
+
+    def add_holding(self, crypto, amount):
+        if not self.portfolio:
+            self.portfolio = {}
+        self.portfolio[crypto] = self.portfolio.get(crypto, 0) + amount
+
+    def remove_holding(self, crypto):
+        del self.portfolio[crypto]
+        if not self.portfolio:
+            self.portfolio = EMPTY_PORTFOLIO
+
+    def set_threshold(self, crypto, threshold):
+        if self.thresholds is None:
+            self.thresholds = {}
+        if threshold is None:
+            self.thresholds.pop(crypto, None)
+        else:
+            self.thresholds[crypto] = threshold
+        if not self.thresholds:
+            self.thresholds = None
+
+    def __repr__(self):
+        return f"UserState(crypto={self.crypto!r}, active={self.active}, message_id={self.message_id}, portfolio={dict(self.portfolio)})"
+
+# Словарь для хранения пользователей и их сообщений: {chat_id: UserState}
 active_users = {}
 
-def save_users_data():
-    """Сохранение данных пользователей в файл"""
+# Обратный индекс активных подписок: {crypto: set(chat_id)}
+# Поддерживается activate_user / deactivate_user / set_crypto и загрузкой пользователей
+subscribers = {}
+active_count = 0
+
+# Пользователи с живым портфелем по активам, которыми они владеют: {crypto: set(chat_id)}
+portfolio_watchers = {}
+
+# Пользователи, смотрящие цены не в QUOTE_ASSET: {currency: set(chat_id)}
+# Тик курса валюты обновляет только их сообщения
+currency_users = {}
+
+# Хранилище и отложенная запись измененных пользователей
+store: UserStore = None
+_dirty = set()
+# Пользователи с новым message_id: идентификаторы пишутся отдельно от настроек
+_dirty_messages = set()
+_flush_handle = None
+_flush_task = None
+
+# Обработчики изменений пользователей (используются многопроцессным режимом)
+user_listeners = []
+
+# Фоновая загрузка при старте: пока она идет, load_user читает незагруженного пользователя из базы
+loading = False
+_load_alerts = False
+# False - message_id принадлежат воркерам доставки, и процесс не пишет их в базу
+_save_messages = True
+startup_stats = {"loaded": 0, "restored": 0}
+register_stats("cryptobot_startup_users", startup_stats, "Users loaded and restored at startup")
+
+def _index_add(chat_id, crypto):
+    global active_count
+    chat_ids = subscribers.setdefault(crypto, set())
+    # Повторное добавление возможно, пока восстановленный пользователь ждет своей очереди на подключение
+    if chat_id not in chat_ids:
+        chat_ids.add(chat_id)
+        active_count += 1
+
+def _index_remove(chat_id, crypto):
+    global active_count
+    chat_ids = subscribers.get(crypto)
+    if chat_ids is not None and chat_id in chat_ids:
+        chat_ids.remove(chat_id)
+        active_count -= 1
+        if not chat_ids:
+            del subscribers[crypto]
+
+def get_subscribers(crypto):
+    """Активные chat_id, подписанные на криптовалюту"""
+    return subscribers.get(crypto, ())
+
+def _watch_portfolio(chat_id, cryptos):
+    for crypto in cryptos:
+        portfolio_watchers.setdefault(crypto, set()).add(chat_id)
+
+def _unwatch_portfolio(chat_id, cryptos):
+    for crypto in cryptos:
+        chat_ids = portfolio_watchers.get(crypto)
+        if chat_ids is not None:
+            chat_ids.discard(chat_id)
+            if not chat_ids:
+                del portfolio_watchers[crypto]
+
+def _currency_add(chat_id, currency):
+    currency_users.setdefault(currency, set()).add(chat_id)
+
+def _currency_remove(chat_id, currency):
+    chat_ids = currency_users.get(currency)
+    if chat_ids is not None:
+        chat_ids.discard(chat_id)
+        if not chat_ids:
+            del currency_users[currency]
+
+def get_portfolio_watchers(crypto):
+    """chat_id с живым портфелем, в котором есть криптовалюта"""
+    return portfolio_watchers.get(crypto, ())
+
+def get_currency_users(currency):
+    """chat_id пользователей, выбравших валюту"""
+    return currency_users.get(currency, ())
+
+def get_active_count():
+    """Число активных подписок за O(1)"""
+    return active_count
+
+def get_crypto_counts():
+    """Число активных подписчиков по каждой криптовалюте"""
+    return {crypto: len(chat_ids) for crypto, chat_ids in subscribers.items()}
+
+def serialize_user(user_data):
+    """Сохраняемая часть записи пользователя"""
+    record = {
+        "active": user_data.active,
+        "crypto": user_data.crypto,
+        "portfolio": dict(user_data.portfolio)
+    }
+    if user_data.alerts:
+        record["alerts"] = [[alert.crypto, alert.direction, alert.threshold] for alert in user_data.alerts]
+    if user_data.live_portfolio is not None:
+        record["portfolio_live"] = True
+    if user_data.currency:
+        record["currency"] = user_data.currency
+    if user_data.thresholds:
+        record["thresholds"] = {crypto: list(threshold) for crypto, threshold in user_data.thresholds.items()}
+    return record
+
+def _message_ids(user_data):
+    live = user_data.live_portfolio
+    return user_data.message_id, live.message_id if live is not None else None
+
+def _collect_dirty():
+    records = {chat_id: serialize_user(active_users[chat_id]) if chat_id in active_users else None
+               for chat_id in _dirty}
+    messages = {chat_id: _message_ids(active_users[chat_id]) for chat_id in _dirty_messages if chat_id in active_users}
+    _dirty.clear()
+    _dirty_messages.clear()
+    return records, messages
+
+def add_user_listener(listener):
+    """Подписка на изменения пользователей: listener(chat_id, kind), где kind - state, reset или message"""
+    user_listeners.append(listener)
+
+def save_user(chat_id):
+    """Пометить пользователя как измененного; запись произойдет пакетом после SAVE_DEBOUNCE_DELAY"""
+    _dirty.add(chat_id)
+    _schedule_flush()
+    for listener in user_listeners:
+        listener(chat_id, "state")
+
+def _mark_messages(chat_id):
+    if _save_messages:
+        _dirty_messages.add(chat_id)
+        _schedule_flush()
+
+def save_message_id(chat_id):
+    """Сохранить текущие message_id пользователя: после перезапуска сообщения правятся, а не отправляются заново
+
+    Обработчики получают kind="message": процесс приема так передает воркеру-владельцу
+    сообщение, принятое кнопкой живого портфеля.
+    """
+    _mark_messages(chat_id)
+    for listener in user_listeners:
+        listener(chat_id, "message")
+
+def reset_message(chat_id):
+    """Забыть сообщение с ценой: следующее обновление отправит новое сообщение"""
+    user_data = get_user(chat_id)
+    user_data.last_price = None
+    user_data.message_id = None
+    _mark_messages(chat_id)
+    for listener in user_listeners:
+        listener(chat_id, "reset")
+    return user_data
+
+def _schedule_flush():
+    global _flush_handle
+    if store is None or _flush_handle is not None or _flush_task is not None:
+        return
     try:
-        with open(USERS_DATA_FILE, 'w', encoding='utf-8') as f:
-            data_to_save = {}
-            for chat_id, user_data in active_users.items():
-                data_to_save[str(chat_id)] = {
-                    "active": user_data.get("active", False),
-                    "crypto": user_data.get("crypto", "BTC"),
-                    "portfolio": user_data.get("portfolio", {})
-                }
-            json.dump(data_to_save, f, ensure_ascii=False, indent=2)
-        
-        active_count = len([u for u in active_users.values() if u.get("active", False)])
-        logging.info(f"Saved {len(data_to_save)} users ({active_count} active) to {USERS_DATA_FILE}")
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _flush_handle = loop.call_later(SAVE_DEBOUNCE_DELAY, _start_flush)
+
+def _start_flush():
+    global _flush_handle, _flush_task
+    _flush_handle = None
+    _flush_task = asyncio.create_task(_flush())
+
+async def _flush():
+    """Запись накопленных изменений в пуле потоков, не блокируя event loop"""
+    global _flush_task
+    records, messages = _collect_dirty()
+    try:
+        started = time.perf_counter()
+        await run_io(store.write, records, messages)
+        save_seconds.observe(time.perf_counter() - started)
+        logging.debug(f"Saved {len(records)} changed users and {len(messages)} message ids to {USERS_DB_FILE}")
     except Exception as e:
         logging.error(f"Error saving users data: {e}")
+        _dirty.update(records)
+        _dirty_messages.update(messages)
+    finally:
+        _flush_task = None
+        if _dirty or _dirty_messages:
+            _schedule_flush()
+
+async def save_users_data():
+    """Запись всех несохраненных изменений; сериализация и SQLite - в пуле потоков"""
+    if store is None:
+        return
+    try:
+        records, messages = _collect_dirty()
+        if not records and not messages:
+            return
+        started = time.perf_counter()
+        await run_io(store.write, records, messages)
+        save_seconds.observe(time.perf_counter() - started)
+        logging.info(f"Saved {len(records)} changed users ({active_count} active) to {USERS_DB_FILE}")
+    except Exception as e:
+        logging.error(f"Error saving users data: {e}")
+
+async def close_user_store():
+    """Дождаться фоновой записи, сохранить остаток и закрыть хранилище"""
+    global store, _flush_handle
+    if store is None:
+        return
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    if _flush_task is not None:
+        await asyncio.gather(_flush_task, return_exceptions=True)
+    await save_users_data()
+    await run_io(store.close)
+    store = None
+
+def _thresholds_from_record(record):
+    # Пороги nan/inf, сохраненные до проверки в parse_threshold, отбрасываются
+    return {crypto: EditThreshold(*values) for crypto, values in record.get("thresholds", {}).items()
+            if all(math.isfinite(value) for value in values)}
+
+def _open_store(shard):
+    global store
+    store = UserStore(USERS_DB_FILE)
+    if shard is None and store.is_empty():
+        store.import_legacy_json(USERS_DATA_FILE)
+
+def _restore_user(chat_id, record, message_id=None, portfolio_message_id=None, connect=True):
+    """Состояние пользователя из сохраненной записи
+
+    connect=False не подключает пользователя к рассылке (индексы подписчиков и валют, живой
+    портфель): это делает _connect_user, когда до пользователя доходит очередь.
+    """
+    user = active_users[chat_id] = UserState(
+        crypto=record.get("crypto", "BTC"),
+        active=record.get("active", False),
+        message_id=message_id,
+        portfolio=record.get("portfolio"),
+        thresholds=_thresholds_from_record(record)
+    )
+    if _load_alerts:
+        for crypto, direction, threshold in record.get("alerts", ()):
+            try:
+                add_alert(chat_id, crypto, threshold, direction)
+            except ValueError as e:
+                logging.warning(f"Skipping alert of user {chat_id}: {e}")
+    if user.portfolio:
+        portfolio_matrix.set_portfolio(chat_id, user.portfolio)
+    if record.get("portfolio_live"):
+        user.live_portfolio = LivePortfolio(portfolio_message_id)
+    acquire_crypto_stream(user.crypto)
+    for crypto in user.portfolio:
+        acquire_crypto_stream(crypto)
+    if record.get("currency"):
+        # Поток курса нужен сразу, а в индекс валют пользователь попадает при подключении:
+        # иначе первый тик курса правил бы сообщения, до которых не дошла растяжка
+        user.currency = sys.intern(record["currency"])
+        acquire_currency(user.currency)
+    startup_stats["loaded"] += 1
+    if connect:
+        _connect_user(chat_id)
+    return user
+
+def _connect_user(chat_id):
+    """Подключение восстановленного пользователя к рассылке цены и живого портфеля"""
+    user = active_users.get(chat_id)
+    if user is None:
+        return
+    if user.active:
+        _index_add(chat_id, user.crypto)
+    if user.live_portfolio is not None:
+        _watch_portfolio(chat_id, user.portfolio)
+    if user.currency is not None:
+        _currency_add(chat_id, user.currency)
+    if user.active or user.live_portfolio is not None:
+        startup_stats["restored"] += 1
+
+async def load_users_background(shard=None, alerts=None, ramp=RESTORE_RAMP_SECONDS, batch_size=USERS_LOAD_BATCH,
+                                messages=True):
+    """Загрузка пользователей в фоне, пока бот уже принимает команды и цены
+
+    Пакеты читаются и разбираются в отдельном потоке, между пакетами event loop свободен.
+    Пользователь, написавший до своей очереди, читается из базы сразу (см. get_user), а
+    пакетная загрузка его пропускает. Живые сообщения подключаются к рассылке не сразу, а
+    равномерно за ramp секунд: после перезапуска первые правки расходятся по времени
+    вместо одновременного всплеска для всех пользователей. Пока база читается, темп
+    считается по уже прочитанным живым сообщениям (с запасом вниз), а после чтения
+    остаток очереди распределяется по оставшемуся времени. messages=False - сообщения
+    отправляют воркеры доставки: их message_id в базе не затираются устаревшими из этого процесса.
+    """
+    global loading, _load_alerts, _save_messages
+    _load_alerts = shard is None if alerts is None else alerts
+    _save_messages = messages
+    loading = True
+    started = time.monotonic()
+    pending = deque()  # chat_id, ждущие подключения
+    live = position = 0
+
+    def connect(count):
+        for _ in range(min(count, len(pending))):
+            _connect_user(pending.popleft())
 
-def load_users_data():
-    """Загрузка данных пользователей из файла"""
     try:
-        with open(USERS_DATA_FILE, 'r', encoding='utf-8') as f:
-            saved_data = json.load(f)
-            for chat_id_str, user_data in saved_data.items():
-                chat_id = int(chat_id_str)
-                active_users[chat_id] = {
-                    "message_id": None,
-                    "active": user_data.get("active", False),
-                    "crypto": user_data.get("crypto", "BTC"),
-                    "last_price": None,
-                    "portfolio": user_data.get("portfolio", {})
-                }
-        logging.info(f"Loaded {len(saved_data)} users from {USERS_DATA_FILE}")
-    except FileNotFoundError:
-        logging.info("No saved users data found. Starting fresh.")
+        await run_io(_open_store, shard)
+
+        batches = store.iter_batches(batch_size, shard)
+        while (batch := await run_io(next, batches, None)) is not None:
+            for chat_id, record, message_id, portfolio_message_id in batch:
+                position += 1
+                if chat_id in active_users:
+                    continue
+                user = _restore_user(chat_id, record, message_id, portfolio_message_id, connect=False)
+                if user.active or user.live_portfolio is not None:
+                    pending.append(chat_id)
+                    live += 1
+                else:
+                    _connect_user(chat_id)  # живых сообщений нет, растягивать нечего
+            elapsed = time.monotonic() - started
+            connect(int(live * elapsed / ramp) - (live - len(pending)) if ramp and elapsed < ramp else len(pending))
+            await asyncio.sleep(0)
+        loading = False
+        logging.info(f"Loaded {position} users from {USERS_DB_FILE} in {time.monotonic() - started:.1f}s, "
+                     f"{len(pending)} live messages wait for the restore ramp")
+
+        ramp_end = started + ramp
+        while pending:
+            await asyncio.sleep(RESTORE_STEP)
+            left = ramp_end - time.monotonic()
+            connect(len(pending) if left <= RESTORE_STEP else math.ceil(len(pending) * RESTORE_STEP / left))
+        logging.info(f"Restored {live} live messages in {time.monotonic() - started:.1f}s")
     except Exception as e:
         logging.error(f"Error loading users data: {e}")
+        # Уже загруженные пользователи не должны остаться без рассылки
+        while pending:
+            _connect_user(pending.popleft())
+    finally:
+        loading = False
+
+async def reload_users(shard, batch_size=USERS_LOAD_BATCH):
+    """Повторное применение сохраненных записей шарда (после потерянных событий брокера);
+    возвращает chat_id перечитанных пользователей"""
+    if store is None:
+        return []
+    chat_ids = []
+    batches = store.iter_batches(batch_size, shard)
+    while (batch := await run_io(next, batches, None)) is not None:
+        for chat_id, record, _, _ in batch:
+            apply_user_record(chat_id, record)
+            chat_ids.append(chat_id)
+    return chat_ids
+
+def apply_user_record(chat_id, record, portfolio_message_id=None):
+    """Применение записи пользователя, полученной от другого процесса (без сохранения настроек)
+
+    portfolio_message_id - сообщение, которое процесс приема сделал живым портфелем: оно
+    правится дальше вместо отправки нового и сохраняется здесь, у владельца сообщений.
+    """
+    user_data = set_crypto(chat_id, record.get("crypto", "BTC"))
+    if record.get("active"):
+        activate_user(chat_id)
+    else:
+        deactivate_user(chat_id)
+    live = user_data.live_portfolio
+    if live is not None:
+        _unwatch_portfolio(chat_id, user_data.portfolio)
+    previous = user_data.portfolio
+    user_data.portfolio = UserState(portfolio=record.get("portfolio")).portfolio
+    # Потоки держатся по числу владельцев монеты, как в add_holding / remove_holding
+    for crypto in user_data.portfolio.keys() - previous.keys():
+        acquire_crypto_stream(crypto)
+    for crypto in previous.keys() - user_data.portfolio.keys():
+        release_crypto_stream(crypto)
+    portfolio_matrix.set_portfolio(chat_id, user_data.portfolio)
+    if not record.get("portfolio_live"):
+        disable_live_portfolio(chat_id)
+    elif live is None:
+        enable_live_portfolio(chat_id)
+    else:
+        _watch_portfolio(chat_id, user_data.portfolio)
+        live.changed.update(user_data.portfolio)
+    if portfolio_message_id is not None and user_data.live_portfolio is not None:
+        user_data.live_portfolio.message_id = portfolio_message_id
+        save_message_id(chat_id)
+    user_data.thresholds = _thresholds_from_record(record) or None
+    set_currency(chat_id, record.get("currency"))
+    return user_data
+
+async def load_user(chat_id):
+    """Пользователь, до которого фоновая загрузка еще не дошла, читается из базы в пуле потоков
+
+    Вызывается до хендлеров (UserLoadMiddleware) и до событий брокера: дальше синхронный
+    get_user находит пользователя в памяти. Чтение ждет блокировку хранилища, пока идет запись
+    пакета, поэтому оно не выполняется в event loop.
+    """
+    if chat_id not in active_users and loading and store is not None:
+        saved = await run_io(store.load, chat_id)
+        # Пока шло чтение, пользователя мог загрузить пакет или создать другой обработчик
+        if saved is not None and chat_id not in active_users:
+            return _restore_user(chat_id, *saved)
+    return get_user(chat_id)
+
+class UserLoadMiddleware(BaseMiddleware):
+    """Outer middleware апдейтов: пользователь чата загружен до фильтров и хендлеров"""
+
+    async def __call__(self, handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]], event: Update,
+                       data: Dict[str, Any]) -> Any:
+        chat = data.get("event_chat")
+        if chat is not None and loading:
+            await load_user(chat.id)
+        return await handler(event, data)
 
 def get_user(chat_id):
-    """Получение данных пользователя или создание нового"""
+    """Получение данных пользователя или создание нового (незагруженного - см. load_user)"""
     if chat_id not in active_users:
-        active_users[chat_id] = {
-            "message_id": None,
-            "active": False,
-            "crypto": "BTC",
-            "last_price": None,
-            "portfolio": {}
-        }
+        active_users[chat_id] = UserState()
+        acquire_crypto_stream("BTC")
     return active_users[chat_id]
+
+def set_crypto(chat_id, crypto):
+    """Смена выбранной криптовалюты пользователя"""
+    user_data = get_user(chat_id)
+    if user_data.crypto != crypto:
+        acquire_crypto_stream(crypto)
+        release_crypto_stream(user_data.crypto)
+        if user_data.active:
+            _index_remove(chat_id, user_data.crypto)
+            _index_add(chat_id, crypto)
+        # Живое сообщение остается тем же, но следующая правка обязана показать новую монету
+        user_data.last_price = None
+    user_data.crypto = crypto
+    return user_data
+
+def set_currency(chat_id, currency):
+    """Смена валюты цен пользователя (None - QUOTE_ASSET); потоки курсов держатся по числу пользователей"""
+    user_data = get_user(chat_id)
+    previous = user_data.currency
+    if previous == currency:
+        return user_data
+    if previous is not None:
+        release_currency(previous)
+        _currency_remove(chat_id, previous)
+    if currency is not None:
+        currency = sys.intern(currency)
+        acquire_currency(currency)
+        _currency_add(chat_id, currency)
+    user_data.currency = currency
+    # Следующая правка обязана показать цену в новой валюте, а живой портфель - пересчитать все строки
+    user_data.last_price = None
+    if user_data.live_portfolio is not None:
+        user_data.live_portfolio.changed.update(user_data.portfolio)
+    return user_data
+
+def add_holding(chat_id, crypto, amount):
+    """Добавление актива в портфель пользователя и в матрицу оценки"""
+    user_data = get_user(chat_id)
+    if crypto not in user_data.portfolio:
+        acquire_crypto_stream(crypto)
+    user_data.add_holding(crypto, amount)
+    portfolio_matrix.set_holding(chat_id, crypto, user_data.portfolio[crypto])
+    if user_data.live_portfolio is not None:
+        _watch_portfolio(chat_id, (crypto,))
+        user_data.live_portfolio.changed.add(crypto)
+    return user_data
+
+def remove_holding(chat_id, crypto):
+    """Удаление актива из портфеля пользователя и из матрицы оценки"""
+    user_data = get_user(chat_id)
+    user_data.remove_holding(crypto)
+    portfolio_matrix.set_holding(chat_id, crypto, 0)
+    if user_data.live_portfolio is not None:
+        _unwatch_portfolio(chat_id, (crypto,))
+        user_data.live_portfolio.changed.add(crypto)
+    release_crypto_stream(crypto)
+    return user_data
+
+def enable_live_portfolio(chat_id):
+    """Включение живого портфеля; сообщение будет отправлено заново"""
+    user_data = get_user(chat_id)
+    if user_data.live_portfolio is None:
+        _watch_portfolio(chat_id, user_data.portfolio)
+    if user_data.currency is not None:
+        _currency_add(chat_id, user_data.currency)
+    user_data.live_portfolio = LivePortfolio()
+    return user_data
+
+def disable_live_portfolio(chat_id):
+    """Отключение живого портфеля"""
+    user_data = get_user(chat_id)
+    if user_data.live_portfolio is not None:
+        _unwatch_portfolio(chat_id, user_data.portfolio)
+        user_data.live_portfolio = None
+    return user_data
+
+def add_alert(chat_id, crypto, threshold, direction):
+    """Создание оповещения пользователя"""
+    user_data = get_user(chat_id)
+    alert = alert_engine.add(chat_id, crypto, threshold, direction)
+    if user_data.alerts is None:
+        user_data.alerts = []
+    user_data.alerts.append(alert)
+    acquire_crypto_stream(crypto)
+    return alert
+
+def remove_alert(chat_id, alert):
+    """Удаление оповещения пользователя (в том числе сработавшего)"""
+    user_data = get_user(chat_id)
+    alert_engine.remove(alert.alert_id)
+    user_data.alerts.remove(alert)
+    if not user_data.alerts:
+        user_data.alerts = None
+    release_crypto_stream(alert.crypto)
+
+def activate_user(chat_id):
+    """Включение автообновлений пользователя"""
+    user_data = get_user(chat_id)
+    user_data.active = True
+    # Без проверки active: пользователь, ждущий восстановления, подключается сразу
+    _index_add(chat_id, user_data.crypto)
+    if user_data.currency is not None:
+        _currency_add(chat_id, user_data.currency)
+    return user_data
+
+def deactivate_user(chat_id):
+    """Отключение автообновлений пользователя"""
+    user_data = get_user(chat_id)
+    if user_data.active:
+        user_data.active = False
+        _index_remove(chat_id, user_data.crypto)
+    return user_data
@@ -0,0 +1,113 @@
+# services/webhook_service.py
+import asyncio
+import json
+import logging
+import os
+import aiohttp
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from config import (
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    WEBHOOK_MAX_CONNECTIONS, WEBHOOK_KEEPALIVE, WEBHOOK_SOCKET_DIR
+)
+from services.metrics_service import register_stats
+
+webhook_stats = {"received": 0, "forwarded": 0, "rejected": 0}
+register_stats("cryptobot_webhook", webhook_stats, "Webhook requests")
+
+def update_chat_id(update):
+    """chat_id сырого Update (сообщение, callback, участник чата...) или None"""
+    for value in update.values():
+        if isinstance(value, dict):
+            chat = value.get("chat") or (value.get("message") or {}).get("chat") or value.get("from")
+            if chat:
+                return chat["id"]
+    return None
+
+def worker_socket_path(index):
+    return os.path.join(WEBHOOK_SOCKET_DIR, f"webhook-{index}.sock")
+
+class ShardedRequestHandler(SimpleRequestHandler):
+    """Обработчик вебхука для одного из N воркеров за общим портом
+
+    Воркер обрабатывает только свой шард chat_id (chat_id % N == index), как воркеры
+    доставки в launcher.py; чужие обновления пересылаются владельцу шарда через его
+    Unix-сокет по постоянному keep-alive соединению.
+    """
+
+    def __init__(self, dispatcher, bot, secret_token=WEBHOOK_SECRET, index=0, workers=1):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token or None)
+        self.index = index
+        self.workers = workers
+        self._peers = {}  # номер воркера -> aiohttp.ClientSession
+
+    async def handle(self, request):
+        if not self.verify_secret(request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), self.bot):
+            webhook_stats["rejected"] += 1
+            return web.Response(body="Unauthorized", status=401)
+        body = await request.read()
+        update = json.loads(body)
+        webhook_stats["received"] += 1
+
+        chat_id = update_chat_id(update)
+        owner = self.index if chat_id is None else chat_id % self.workers
+        if owner != self.index:
+            return await self._forward(owner, body)
+
+        task = asyncio.create_task(self._background_feed_update(self.bot, update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({})
+
+    async def _forward(self, owner, body):
+        session = self._peers.get(owner)
+        if session is None:
+            session = self._peers[owner] = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=worker_socket_path(owner), force_close=False))
+        headers = {"X-Telegram-Bot-Api-Secret-Token": self.secret_token or "", "Content-Type": "application/json"}
+        try:
+            async with session.post(f"http://worker{WEBHOOK_PATH}", data=body, headers=headers) as response:
+                webhook_stats["forwarded"] += 1
+                return web.Response(status=response.status)
+        except aiohttp.ClientError as e:
+            # 5xx: Telegram повторит доставку обновления позже
+            logging.error(f"Error forwarding update to webhook worker {owner}: {e}")
+            return web.Response(status=503)
+
+    async def close(self):
+        for session in self._peers.values():
+            await session.close()
+        self._peers = {}
+        await super().close()
+
+def create_webhook_app(dp, bot, index=0, workers=1, secret_token=WEBHOOK_SECRET):
+    """aiohttp-приложение с маршрутом вебхука и хуками startup/shutdown диспетчера"""
+    app = web.Application()
+    ShardedRequestHandler(dp, bot, secret_token, index, workers).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(dp, bot, index=0, workers=1, host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+    """Запуск сервера вебхука; при workers > 1 порт делится через SO_REUSEPORT"""
+    app = create_webhook_app(dp, bot, index, workers)
+    runner = web.AppRunner(app, keepalive_timeout=WEBHOOK_KEEPALIVE, access_log=None)
+    await runner.setup()
+    sites = [web.TCPSite(runner, host, port, reuse_port=workers > 1)]
+    if workers > 1:
+        path = worker_socket_path(index)
+        if os.path.exists(path):
+            os.unlink(path)
+        sites.append(web.UnixSite(runner, path))
+    for site in sites:
+        await site.start()
+
+    if index == 0 and WEBHOOK_URL:
+        await bot.set_webhook(WEBHOOK_URL, secret_token=WEBHOOK_SECRET or None,
+                              max_connections=WEBHOOK_MAX_CONNECTIONS,
+                              allowed_updates=dp.resolve_used_update_types())
+        logging.info(f"Webhook set to {WEBHOOK_URL}")
+    logging.info(f"Webhook worker {index}/{workers} listening on {host}:{port}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()